@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+# python hfamDiff.py -a <homology_table_or_file> -b <homology_table_or_file> -odir <output_dir> [-host <host> -user <user> -passwd <passwd>]
+
+# DESCRIPTION:
+# This program compares the protein families (hfams) of two homology tables, e.g. a table made with a new
+# clustering cutoff against the existing one. The hfam numbers of the two tables do not have to match.
+# Every family is hashed from its members independent of their order (number of members, sum and xor of a
+# 64 bit hash per protein), so identical families are found with one dictionary lookup instead of a self join.
+# Only the families which are not identical are compared protein by protein. Everything is linear in the
+# number of proteins. The exit status is 0 when the two partitions are identical and 1 otherwise.
+
+# INPUT:
+# -a and -b are either tables in the database or tab separated files, e.g. from
+# mysql -e "SELECT * FROM homology_table" > homology_table.tsv
+# Files have the columns of the homology table (hfam, org_id, org_name, protein_id) or only hfam, org_name, protein_id.
+# A header line is skipped.
+
+# OUTPUT:
+# 1. hfamDiff_identical.tsv
+# hfam_a   hfam_b  for the families with the same members
+# 2. hfamDiff_families.tsv
+# hfam_a   hfam_b   proteins  for the families which are not identical, the number of proteins they share.
+# An empty hfam means the proteins are only in the other table.
+# 3. hfamDiff_moved.tsv
+# org_name   protein_id   hfam_a   hfam_b  for proteins which did not go to the b family most of their a family went to,
+# and proteins that are only in one of the tables.
+# 4. hfamDiff_split.tsv
+# hfam_a   parts   hfam_b  for the families of a whose proteins went to several families of b, hfam_b lists them
+# (comma separated). Proteins only in a are not counted as a part.
+# 5. hfamDiff_merged.tsv
+# hfam_b   parts   hfam_a  for the families of b with proteins from several families of a, hfam_a lists them.
+# 6. hfamDiff.log
+# A log file with the summary - located in the output directory
+
+#--------------------------------------------------------
+# IMPORTS
+#--------------------------------------------------------
+from __future__ import print_function
+
+import os, datetime, getpass
+import sys
+import errno
+import argparse
+import logging
+
+mdb = None # MySQLdb, only imported when reading from the database
+
+MASK = (1 << 64) - 1
+
+#--------------------------------------------------------
+# SUBFUNCTIONS
+#--------------------------------------------------------
+def connect_db(args):
+	global mdb
+	if mdb is None:
+		import MySQLdb as mdb
+		import MySQLdb.cursors
+	if not args.host or not args.user:
+		sys.exit("# ERROR: -host, -user and -passwd are needed to read tables from the database")
+	try:
+		db = mdb.connect(host=args.host, user=args.user, passwd=args.passwd, db=args.dbname)
+		cursor = db.cursor(mdb.cursors.SSCursor)
+	except mdb.Error as e:
+		sys.exit("# ERROR %d: %s" % (e.args[0],e.args[1]))
+	return db, cursor
+
+""" HASH OF ONE PROTEIN """
+def memberHash(key):
+	# splitmix64 finalizer, spreads the bits of org code and protein_id over the whole 64 bits
+	z = (key + 0x9E3779B97F4A7C15) & MASK
+	z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+	z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+	return z ^ (z >> 31)
+
+""" READ hfam, org_name, protein_id FROM A TABLE OR FILE """
+def readMembers(args, source):
+	if os.path.isfile(source):
+		with open(source) as infile:
+			for line in infile:
+				fields = line.rstrip("\r\n").split("\t")
+				if len(fields) < 3 or not fields[0].strip().isdigit():
+					continue 	# header or empty line
+				if len(fields) == 3:
+					yield int(fields[0]), fields[1], int(fields[2])
+				else:
+					yield int(fields[0]), fields[2], int(fields[3])
+	else:
+		db, cursor = connect_db(args)
+		try:
+			cursor.execute("SELECT hfam, org_name, protein_id FROM %s;" % source)
+			rows = cursor.fetchmany(100000)
+			while rows:
+				for row in rows:
+					yield int(row[0]), row[1], int(row[2])
+				rows = cursor.fetchmany(100000)
+		except mdb.Error as e:
+			sys.exit("# ERROR %d: %s" % (e.args[0],e.args[1]))
+		finally:
+			db.close()
+
+""" PROTEIN TO HFAM LOOKUP AND FAMILY HASHES """
+def loadPartition(args, source, org_codes, org_names):
+	"""
+	Returns ({protein: hfam}, {hfam: (members, sum, xor)}). A protein is the org code shifted by 32 bits plus its protein_id.
+	Repeated rows are counted once, proteins in more than one hfam are kept in the first one.
+	"""
+	startTimet_load = datetime.datetime.now()
+	members = dict()
+	families = dict()
+	conflicts = 0
+	for (hfam, org_name, protein_id) in readMembers(args, source):
+		if org_name not in org_codes:
+			org_codes[org_name] = len(org_names)
+			org_names.append(org_name)
+		key = (org_codes[org_name] << 32) | protein_id
+
+		if key in members:
+			if members[key] != hfam:
+				conflicts += 1
+			continue
+		members[key] = hfam
+
+		h = memberHash(key)
+		(count, total, xor) = families.get(hfam, (0, 0, 0))
+		families[hfam] = (count + 1, (total + h) & MASK, xor ^ h)
+
+	logging.info('%s: %s proteins in %s hfams - runtime :%s' %(source, len(members), len(families), str(datetime.datetime.now()-startTimet_load)))
+	if conflicts:
+		logging.warning('%s: %s proteins are in more than one hfam, only their first hfam is used' %(source, conflicts))
+	return members, families
+
+""" COMPARE THE TWO PARTITIONS """
+def comparePartitions(members_a, families_a, members_b, families_b):
+	"""
+	Returns the identical families {hfam_a: hfam_b}, the shared proteins {(hfam_a, hfam_b): proteins} of the other families
+	(None for proteins only in one table) and the b family most members of every changed a family went to.
+	"""
+	signature_b = dict((signature, hfam_b) for hfam_b, signature in families_b.items())
+	identical = dict()
+	for hfam_a, signature in families_a.items():
+		if signature in signature_b:
+			identical[hfam_a] = signature_b[signature]
+	identical_b = set(identical.values())
+
+	overlap = dict()
+	for key, hfam_a in members_a.items():
+		if hfam_a in identical:
+			continue
+		pair = (hfam_a, members_b.get(key))
+		overlap[pair] = overlap.get(pair, 0) + 1
+	for key, hfam_b in members_b.items():
+		if hfam_b not in identical_b and key not in members_a:
+			pair = (None, hfam_b)
+			overlap[pair] = overlap.get(pair, 0) + 1
+
+	main_b = dict()
+	for (hfam_a, hfam_b), proteins in overlap.items():
+		if hfam_a is None or hfam_b is None:
+			continue
+		best = main_b.get(hfam_a)
+		if best is None or (proteins, -hfam_b) > (overlap[(hfam_a, best)], -best):
+			main_b[hfam_a] = hfam_b
+
+	return identical, overlap, main_b
+
+""" WRITE TSV """
+def writeTsv(file_name, header, rows):
+	count = 0
+	with open(file_name, "w") as outfile:
+		outfile.write("\t".join(header) + "\n")
+		for row in rows:
+			outfile.write("\t".join("" if value is None else str(value) for value in row) + "\n")
+			count += 1
+	return count
+
+#--------------------------------------------------------
+# ARGUMENTS AND SETUP
+#--------------------------------------------------------
+def parseArguments(argv = None):
+	parser = argparse.ArgumentParser(description="Compare the protein families (hfams) of two homology tables or exported files")
+	parser.add_argument("-a", required=True, type = str, help="First homology table or tab separated file, e.g. the existing table")
+	parser.add_argument("-b", required=True, type = str, help="Second homology table or tab separated file, e.g. made with a new cutoff")
+	parser.add_argument("--output_dir", "-odir", required=True, type = str, help="Name and path of the output directory.")
+	""" DATABASE, ONLY NEEDED FOR TABLES """
+	parser.add_argument("-dbname", required=False, default = "aspminedb", help="Database name")
+	parser.add_argument("-host", required=False, default = "", help="Host name")
+	parser.add_argument("-user", required=False, default = "", help="User name")
+	parser.add_argument("-passwd", required=False, default = "", help="Password")
+	return parser.parse_args(argv)
+
+def setupOutput(args, argv):
+	output_dir = args.output_dir
+	if os.path.isdir(output_dir) == False:
+		try:
+			os.makedirs(output_dir)
+		except OSError as exc:
+			if not (exc.errno == errno.EEXIST and os.path.isdir(output_dir)):
+				raise
+
+	logging.basicConfig(level=logging.DEBUG,
+	                    format='%(asctime)s %(name)-10s %(levelname)-10s %(message)s',
+	                    datefmt='%m-%d %H:%M',
+	                    filename='%s/hfamDiff.log' %(output_dir),
+	                    filemode='w')
+	console = logging.StreamHandler()
+	console.setLevel(logging.INFO)
+	console.setFormatter(logging.Formatter('%(name)-10s: %(levelname)-10s %(message)s'))
+	logging.getLogger('').addHandler(console)
+
+	logging.info('--------------------------------------------------------------')
+	logging.info('python ' + ' '.join(argv))
+	logging.info('DATE: %s' %datetime.datetime.now().strftime("%a %b %d %Y %H:%M"))
+	logging.info('USER: ' + getpass.getuser())
+	logging.info('a: %s' %args.a)
+	logging.info('b: %s' %args.b)
+	logging.info('Output directory: %s' %output_dir)
+	logging.info('--------------------------------------------------------------')
+
+#--------------------------------------------------------
+# MAIN
+#--------------------------------------------------------
+def main(argv = None):
+	startTimet_1 = datetime.datetime.now()
+
+	argv = sys.argv[1:] if argv is None else argv
+	args = parseArguments(argv)
+	setupOutput(args, [sys.argv[0]] + list(argv))
+
+	org_codes = dict()
+	org_names = list()
+	(members_a, families_a) = loadPartition(args, args.a, org_codes, org_names)
+	(members_b, families_b) = loadPartition(args, args.b, org_codes, org_names)
+
+	(identical, overlap, main_b) = comparePartitions(members_a, families_a, members_b, families_b)
+
+	""" SPLIT AND MERGED FAMILIES """
+	parts_a = dict()
+	parts_b = dict()
+	for (hfam_a, hfam_b) in overlap:
+		if hfam_a is not None and hfam_b is not None:
+			parts_a.setdefault(hfam_a, []).append(hfam_b)
+			parts_b.setdefault(hfam_b, []).append(hfam_a)
+
+	def partRows(parts):
+		for hfam in sorted(parts):
+			if len(parts[hfam]) > 1:
+				yield hfam, len(parts[hfam]), ",".join(str(part) for part in sorted(parts[hfam]))
+
+	""" OUTPUT """
+	output_dir = args.output_dir
+	writeTsv(os.path.join(output_dir, "hfamDiff_identical.tsv"), ["hfam_a", "hfam_b"], identical.items())
+	writeTsv(os.path.join(output_dir, "hfamDiff_families.tsv"), ["hfam_a", "hfam_b", "proteins"],
+		sorted(((hfam_a, hfam_b, proteins) for (hfam_a, hfam_b), proteins in overlap.items()), key = lambda row: (row[0] is None, row[0], row[1] is None, row[1])))
+
+	# Proteins are written in the order they were read, sorting all keys would not be linear
+	def movedProteins():
+		for key in members_a:
+			hfam_a = members_a[key]
+			if hfam_a in identical:
+				continue
+			hfam_b = members_b.get(key)
+			if hfam_b is None or hfam_b != main_b.get(hfam_a):
+				yield org_names[key >> 32], key & 0xFFFFFFFF, hfam_a, hfam_b
+		for key in members_b:
+			if key not in members_a:
+				yield org_names[key >> 32], key & 0xFFFFFFFF, None, members_b[key]
+	moved = writeTsv(os.path.join(output_dir, "hfamDiff_moved.tsv"), ["org_name", "protein_id", "hfam_a", "hfam_b"], movedProteins())
+	split = writeTsv(os.path.join(output_dir, "hfamDiff_split.tsv"), ["hfam_a", "parts", "hfam_b"], partRows(parts_a))
+	merged = writeTsv(os.path.join(output_dir, "hfamDiff_merged.tsv"), ["hfam_b", "parts", "hfam_a"], partRows(parts_b))
+
+	only_a = sum(proteins for (hfam_a, hfam_b), proteins in overlap.items() if hfam_b is None)
+	only_b = sum(proteins for (hfam_a, hfam_b), proteins in overlap.items() if hfam_a is None)
+	equivalent = len(identical) == len(families_a) == len(families_b)
+
+	logging.info('--------------------------------------------------------------')
+	logging.info('SUMMARY:')
+	logging.info('--------------------------------------------------------------')
+	logging.info('hfams in a: %s, in b: %s' %(len(families_a), len(families_b)))
+	logging.info('Identical hfams: %s' %len(identical))
+	logging.info('hfams of a split over several hfams of b: %s (hfamDiff_split.tsv)' %split)
+	logging.info('hfams of b merged from several hfams of a: %s (hfamDiff_merged.tsv)' %merged)
+	logging.info('Proteins only in a: %s, only in b: %s' %(only_a, only_b))
+	logging.info('Moved proteins (incl. proteins only in one table): %s' %moved)
+	if equivalent:
+		logging.info('The two tables have the same families')
+	logging.info('--------------------------------------------------')
+	logging.info("The program has finished - runtime %s" %str(datetime.datetime.now()-startTimet_1))
+	logging.info('--------------------------------------------------')
+
+	sys.exit(0 if equivalent else 1)
+
+
+if __name__ == '__main__':
+	main()
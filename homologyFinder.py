@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python
 
 # python homologyFinder.py -host <host> -user <user> -passwd <passwd> -btable <biblast_tablename> -htable <homology_tablename> -odir <output_dir> -spfile /path/to/species_file.txt 
 
@@ -46,35 +46,45 @@
 # 3	     27	      Aspoch1	 10057	      NULL	       NULL      NULL
 # 4	     27	      Aspoch1	 10174	      NULL	       NULL      NULL
 
-# 4. homologyFinder.log
+# 4. go_closure and homology_GO_fam tables (with -goobo go-basic.obo)
+# The transitive closure of the GO DAG (is_a and part_of) and the GO terms of every hfam propagated to all their ancestors.
+# n is the number of proteins of the hfam annotated with the term or one of its descendants.
+# go_term_id   ancestor_id   distance          hfam   go_term_id   n
+# GO:0017000   GO:0017000    0                 12     GO:0017000   3
+# GO:0017000   GO:0009058    1                 12     GO:0009058   5
+# INDEXES: PRIMARY (`go_term_id`,`ancestor_id`), `i_ancestor` and PRIMARY (`go_term_id`,`hfam`), `i_hfam`
+# Families carrying any descendant of a term: SELECT hfam, n FROM homology_GO_fam WHERE go_term_id = 'GO:0017000'
+
+# 5. homologyFinder.log
 # A log file with all the screen outputs - located in the output directory 
 
 #--------------------------------------------------------
 # IMPORTS
 #--------------------------------------------------------
+from __future__ import print_function
+
 import os, datetime, getpass
 import sys
-from sys import argv
+import copy
+import re
+import hashlib
+import numbers
+import array
+import threading
 
-from collections import defaultdict
-import datetime
-from inspect import currentframe, getframeinfo
-import inspect
 import itertools
-import time
-
-import operator
 import errno
+from multiprocessing.pool import ThreadPool
+try:
+	import queue
+except ImportError:
+	import Queue as queue
 
-import shutil
-import subprocess
-
-import getopt, argparse, re, glob
-from argparse import ArgumentParser
+import argparse
 
 import logging
 
-import MySQLdb as mdb
+mdb = None # MySQLdb, imported on the first connection so the module can be imported and --help works without it
 
 #--------------------------------------------------------
 # SUBFUNCTIONS
@@ -101,15 +111,20 @@ class CustomArgumentParser(argparse.ArgumentParser):
 		sys.exit()
 
 """ CONNECT TO DATABASE """
-def connect_db(dbname, linenumber):
+def connect_db(args, streaming = False):
+	global mdb
+	if mdb is None:
+		import MySQLdb as mdb
+		import MySQLdb.cursors
 	try:
 		db = mdb.connect(host=args.host, user=args.user, passwd=args.passwd, db=args.dbname)
 	except mdb.Error as e:
-		sys.exit("# ERROR line %s - %d: %s" % (linenumber, e.args[0],e.args[1]))
+		sys.exit("# ERROR %d: %s" % (e.args[0],e.args[1]))
 	try:
-		cursor = db.cursor()
+		# A server side cursor streams the rows instead of loading the whole result into memory
+		cursor = db.cursor(mdb.cursors.SSCursor) if streaming else db.cursor()
 	except mdb.Error as e:
-		sys.exit("# ERROR line %s - %d: %s" % (linenumber, e.args[0],e.args[1]))
+		sys.exit("# ERROR %d: %s" % (e.args[0],e.args[1]))
 	return db, cursor
 
 """ COMBINE EXECUTE AND FETCH ALL """
@@ -120,13 +135,13 @@ def executeQuery(cursor, query):
 		result = cursor.fetchall()
 		if result:
 			if len(result) > 0:
-				columns = map(lambda x:x[0], cursor.description) 	
+				columns = [x[0] for x in cursor.description]
 	except mdb.Error as e:
 		sys.exit("# ERROR %d: %s" % (e.args[0],e.args[1]))
 	return columns, result
 
 """ FETCH ALL MEMBERS FROM HFAM (homoTable) AND DELETE EXISTING ONES """
-def hfamMembers_homoTable(hfam_homoTable_collected, homoTable, args):
+def hfamMembers_homoTable(db, cursor, hfam_homoTable_collected, homoTable):
 	hfamMembers_homoTable = list()
 
 	format_hfam = ', '.join(str(hfam_entry) for hfam_entry in hfam_homoTable_collected)	# Convert integers into string format
@@ -158,239 +173,564 @@ def createNewFamily(hfamMembers, upload_counter, new_hfam, new_family_to_values2
 #--------------------------------------------------------
 # ARGUMENTS, SETUPS AND PRINT
 #--------------------------------------------------------
-""" TIME """
-startTimet_1 = datetime.datetime.now()
-startTime = datetime.datetime.now().time() # record runtime
-today = datetime.date.today()
-now = datetime.datetime.now()
-
-""" DATABASE """
-parser = CustomArgumentParser(formatter_class=SmartFormatter, usage='%(prog)s -dbname [database name]')
-parser.add_argument("-dbname", required=False, default = "aspminedb", help="Database name")
-parser.add_argument("-host", required=True, help="Host name")
-parser.add_argument("-user", required=True, help="User name")
-parser.add_argument("-passwd", required=True, help="Password")
-
-""" INPUTS """
-parser.add_argument("--biblasttable", "-btable", required=True, type = str, default = '', help="Input BLAST table used for the paralog and homolog analysis. Ex. biblast_ID[custom]_SC[custom]. ID = min. alignment identity, SC = min. collected alignment coverage [SUMCOV = min.(q_cov + h_cov)].")
-parser.add_argument("--homotable", "-htable", required=True, type = str, default = '', help="Input homolog table containg homologous protein family, species and protein names. If present, new species homologs will be appended to the existing table. Ex. 'homoPF_SC[custom]_proteins'")
-parser.add_argument("--output_dir", "-odir",  required=True, default="", type = str, help="Name and path of the output directory.") 
-""" SPECIES SELECTION """
-parser.add_argument("--species", "-sp", nargs = '*',  required=False, default=[], action='store', help="List of species to analyse. Please insert JGI species names. Do NOT use any comma or quotes.")
-parser.add_argument("--speciesfile", "-spfile", required=False, type = str, default = "", help="The absolute path and name of the file containing one JGI species name per line.") 
-parser.add_argument("-all", required=False, action='store_true', help="Create homolog table based on all species present in the biblast table")
-""" FLAGS """
-parser.add_argument("-nogo", required=False, action='store_true', help="Do not create homolog table including GO terms")
-parser.add_argument("-noipr", required=False, action='store_true', help="Do not create homolog table including Interpro descriptions")
-
-""" PARSE ARGUMENTS """
-args = parser.parse_args()
-# database
-dbname = args.dbname
-host = args.host
-user = args.user
-passwd = args.passwd
-# inputs
-biblastTable = args.biblasttable
-homoTable = args.homotable
-output_dir = args.output_dir
-# species
-species = args.species 
-all_species = args.all
-speciesfile = args.speciesfile
-# flags
-nogo = args.nogo
-noipr = args.noipr
-
-#------------------------------------------------------------------
-# Creating output directory if it doesn't exist
-#------------------------------------------------------------------
-# The code has to be located here because the logging file is written to the output folder
-if os.path.isdir(output_dir) == False:
-	print "# WARNING: The output directory did not exists - The program will create: %s" % output_dir
-	try:
-		os.makedirs(output_dir)
-	except OSError as exc:
-		# If the folders already exist - then pass
-		if exc.errno == errno.EEXIST and os.path.isdir(output_dir):
-			pass
-		else: 
-			raise
-
-#--------------------------------------------------------
-# LOGGING
-#--------------------------------------------------------
-# define a Handler which writes INFO messages or higher to the sys.stderr
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s %(name)-10s %(levelname)-10s %(message)s',
-                    datefmt='%m-%d %H:%M',
-                    filename='%s/homologyFinder.log' %(output_dir),
-                    filemode='w')
-
-console = logging.StreamHandler() # define the consol
-console.setLevel(logging.INFO) # show the same information in the consol
-formatter = logging.Formatter('%(name)-10s: %(levelname)-10s %(message)s') # simple consol format
-console.setFormatter(formatter) # tell the handler to use this format
-logging.getLogger('').addHandler(console) # add the handler to the root logger
-
-
-#------------------------------------------------------------------
-# Check commandline arguments
-#------------------------------------------------------------------
-
-if species == [] and not all_species and speciesfile == "":
-	sys.exit("# ERROR: Please select either all species (-all) or add species to input list (-sp X Y Z) or as a file (-spfile)")
-if ((species != [] and all_species) or (species != [] and speciesfile != "") or (speciesfile != "" and all_species)):
-	sys.exit("# ERROR: Please select only one of the flags (-all or -sp X Y Z or -spfile <file.txt>)")
-if speciesfile != "":
-	if not os.path.isfile(speciesfile):
-		logging.error('The species files (-spfile) did not exists: %s' %speciesfile)
+def parseArguments(argv = None):
+	""" DATABASE """
+	parser = CustomArgumentParser(formatter_class=SmartFormatter, usage='%(prog)s -dbname [database name]')
+	parser.add_argument("-dbname", required=False, default = "aspminedb", help="Database name")
+	parser.add_argument("-host", required=True, help="Host name")
+	parser.add_argument("-user", required=True, help="User name")
+	parser.add_argument("-passwd", required=True, help="Password")
+
+	""" INPUTS """
+	parser.add_argument("--biblasttable", "-btable", required=True, type = str, default = '', help="Input BLAST table used for the paralog and homolog analysis. Ex. biblast_ID[custom]_SC[custom]. ID = min. alignment identity, SC = min. collected alignment coverage [SUMCOV = min.(q_cov + h_cov)].")
+	parser.add_argument("--homotable", "-htable", required=True, type = str, default = '', help="Input homolog table containg homologous protein family, species and protein names. If present, new species homologs will be appended to the existing table. Ex. 'homoPF_SC[custom]_proteins'")
+	parser.add_argument("--output_dir", "-odir",  required=True, default="", type = str, help="Name and path of the output directory.")
+	""" SPECIES SELECTION """
+	parser.add_argument("--species", "-sp", nargs = '*',  required=False, default=[], action='store', help="List of species to analyse. Please insert JGI species names. Do NOT use any comma or quotes.")
+	parser.add_argument("--speciesfile", "-spfile", required=False, type = str, default = "", help="The absolute path and name of the file containing one JGI species name per line.")
+	parser.add_argument("-all", required=False, action='store_true', help="Create homolog table based on all species present in the biblast table")
+	""" FLAGS """
+	parser.add_argument("-nogo", required=False, action='store_true', help="Do not create homolog table including GO terms")
+	parser.add_argument("-noipr", required=False, action='store_true', help="Do not create homolog table including Interpro descriptions")
+	parser.add_argument("-compact", required=False, action='store_true', help="Renumber the hfams to 1..N after linking. The old to new hfam mapping is written to <homotable>_hfam_map")
+	parser.add_argument("-shadow", required=False, action='store_true', help="Build the homolog, IPR and GO tables as <homotable>_shadow tables and publish them with one atomic RENAME TABLE, so readers never see a half built table")
+	parser.add_argument("-goobo", required=False, type = str, default = "", help="GO ontology in OBO format (go-basic.obo). Builds the go_closure table and <homotable>_GO_fam with the GO terms of every hfam propagated to their ancestors")
+	parser.add_argument("-threads", required=False, type = int, default = 1, help="Number of connections reading the biblast table at once. With more than one the biblast reads are split into primary key or (q_org, q_seqkey) ranges")
+	parser.add_argument("-explain", required=False, action='store_true', help="Preflight: check the indexes of biblast, protein_has_ipr and protein_has_go and EXPLAIN the hot queries. Writes indexes.tsv and explain.tsv to the output directory")
+	parser.add_argument("-create_indexes", required=False, action='store_true', help="Create the missing covering indexes of biblast, protein_has_ipr and protein_has_go before the run")
+	parser.add_argument("-batch", required=False, type = int, default = 0, help="Link N q_seqkeys at a time: their hits are read with two queries per batch and merged in memory. The families are the same as without -batch, only the hfam numbers differ")
+	parser.add_argument("-partition", required=False, action='store_true', help="Partition the homolog, IPR and GO tables by organism (InnoDB, LIST COLUMNS(org_name)). Existing tables are converted")
+
+	""" PARSE ARGUMENTS """
+	return parser.parse_args(argv)
+
+
+def setupOutput(args, argv):
+	#------------------------------------------------------------------
+	# Creating output directory if it doesn't exist
+	#------------------------------------------------------------------
+	# The code has to be located here because the logging file is written to the output folder
+	output_dir = args.output_dir
+	if os.path.isdir(output_dir) == False:
+		print("# WARNING: The output directory did not exists - The program will create: %s" % output_dir)
+		try:
+			os.makedirs(output_dir)
+		except OSError as exc:
+			# If the folders already exist - then pass
+			if exc.errno == errno.EEXIST and os.path.isdir(output_dir):
+				pass
+			else:
+				raise
+
+	#--------------------------------------------------------
+	# LOGGING
+	#--------------------------------------------------------
+	# define a Handler which writes INFO messages or higher to the sys.stderr
+	logging.basicConfig(level=logging.DEBUG,
+	                    format='%(asctime)s %(name)-10s %(levelname)-10s %(message)s',
+	                    datefmt='%m-%d %H:%M',
+	                    filename='%s/homologyFinder.log' %(output_dir),
+	                    filemode='w')
+
+	console = logging.StreamHandler() # define the consol
+	console.setLevel(logging.INFO) # show the same information in the consol
+	formatter = logging.Formatter('%(name)-10s: %(levelname)-10s %(message)s') # simple consol format
+	console.setFormatter(formatter) # tell the handler to use this format
+	logging.getLogger('').addHandler(console) # add the handler to the root logger
+
+
+	#------------------------------------------------------------------
+	# Check commandline arguments
+	#------------------------------------------------------------------
+	species = args.species
+	all_species = args.all
+	speciesfile = args.speciesfile
+
+	if species == [] and not all_species and speciesfile == "":
+		sys.exit("# ERROR: Please select either all species (-all) or add species to input list (-sp X Y Z) or as a file (-spfile)")
+	if ((species != [] and all_species) or (species != [] and speciesfile != "") or (speciesfile != "" and all_species)):
+		sys.exit("# ERROR: Please select only one of the flags (-all or -sp X Y Z or -spfile <file.txt>)")
+	if speciesfile != "":
+		if not os.path.isfile(speciesfile):
+			logging.error('The species files (-spfile) did not exists: %s' %speciesfile)
+			sys.exit()
+	if args.goobo != "" and not os.path.isfile(args.goobo):
+		logging.error('The GO ontology file (-goobo) did not exists: %s' %args.goobo)
 		sys.exit()
 
-#------------------------------------------------------------------
-# Print argument values to screen
-#------------------------------------------------------------------
-# Start information on consol and log file
-logging.info('--------------------------------------------------------------')
-logging.info('INFO:')
-logging.info('--------------------------------------------------------------')
-logging.info('python ' + ' '.join(argv))
-logging.info('DATE: %s'%now.strftime("%a %b %d %Y %H:%M"))
-logging.info('USER: ' + getpass.getuser())
-logging.info('CWD: %s' %os.getcwd())
-logging.info('--------------------------------------------------------------')
-logging.info('ARGUMENTS:')
-logging.info('--------------------------------------------------------------')
-logging.info('Database: %s' %dbname)
-logging.info('Homolog table: %s' %homoTable)
-if species != []:
-	logging.info('List of input species: %s' %species)
-if all_species:
-	logging.warning('List of input species: %s =  will be found in %s' %(species, homoTable))
-if speciesfile != "":
-	logging.info('Input species file: %s' %speciesfile)
-logging.info('Output directory: %s' %output_dir)
-logging.info('--------------------------------------------------------------')
+	#------------------------------------------------------------------
+	# Print argument values to screen
+	#------------------------------------------------------------------
+	# Start information on consol and log file
+	now = datetime.datetime.now()
+	logging.info('--------------------------------------------------------------')
+	logging.info('INFO:')
+	logging.info('--------------------------------------------------------------')
+	logging.info('python ' + ' '.join(argv))
+	logging.info('DATE: %s'%now.strftime("%a %b %d %Y %H:%M"))
+	logging.info('USER: ' + getpass.getuser())
+	logging.info('CWD: %s' %os.getcwd())
+	logging.info('--------------------------------------------------------------')
+	logging.info('ARGUMENTS:')
+	logging.info('--------------------------------------------------------------')
+	logging.info('Database: %s' %args.dbname)
+	logging.info('Homolog table: %s' %args.homotable)
+	if species != []:
+		logging.info('List of input species: %s' %species)
+	if all_species:
+		logging.warning('List of input species: %s =  will be found in %s' %(species, args.homotable))
+	if speciesfile != "":
+		logging.info('Input species file: %s' %speciesfile)
+	if args.goobo != "":
+		logging.info('GO ontology: %s' %args.goobo)
+	if args.threads > 1:
+		logging.info('Biblast reading connections: %s' %args.threads)
+	if args.batch > 0:
+		logging.info('q_seqkeys linked per batch: %s' %args.batch)
+	logging.info('Output directory: %s' %output_dir)
+	logging.info('--------------------------------------------------------------')
 
 #--------------------------------------------------------
 # FINDING MISSING ORGANISMS IN BIBLAST AND HOMOLOG TABLES
 #--------------------------------------------------------
-create_table = False
-homoTable_orgs = list()
-missing_orgs = list()
-biblastTable_orgs = list()
-all_possible_orgPairs = list()
-diff_biblast_allPossible = list()
-
-""" EXTRACT BIBLAST ORGS """
-logging.info('Retrieving information from table: %s' %biblastTable)
-db, cursor = connect_db(args, inspect.stack()[0][2])
-if cursor.execute("Show tables LIKE '%s'" %biblastTable):
-	# Extract q_org and h_org names from biblast table
-	biblast_qhorg_query = "SELECT DISTINCT q_org, h_org FROM %s" %biblastTable
-	(column_names, biblastTable_qhorgs) = executeQuery(cursor, biblast_qhorg_query)
-
-	for org_pair in biblastTable_qhorgs:
-		if org_pair[0] not in biblastTable_orgs:
-			biblastTable_orgs.append(org_pair[0])
-		if org_pair[1] not in biblastTable_orgs:
-			biblastTable_orgs.append(org_pair[1])
-else:
-	logging.error('%s did not exist. Please rerun with a new biblast table.' %biblastTable)
-
-
-""" EXTRACT HOMOTABLE ORGS AND MAX(HFAM) """
-if homoTable != "":
-	logging.info('Retrieving information from table: %s' %homoTable)
-	if cursor.execute("SHOW TABLES LIKE '%s';" % homoTable):
-		# Extract org_names from homolog table
-		homo_org_query = "SELECT DISTINCT org_name FROM %s" %homoTable
-		(column_names, homoTable_orgs) = executeQuery(cursor, homo_org_query)
-		homoTable_orgs = map(' '.join, homoTable_orgs) 	# Convert list of tuples to list of strings
-
-		# Find the max homolog cluster number (hfam)
-		(column_names, max_hfam) = executeQuery(cursor, "SELECT MAX(hfam) FROM %s;" %homoTable)
-		if max_hfam[0][0] == None:
-			new_hfam = int(1)
+def findOrganisms(args):
+	"""
+	Returns the homolog table organisms, the organisms to append, org_name to org_id lookup,
+	whether the homolog table has to be created and the first free hfam.
+	"""
+	biblastTable = args.biblasttable
+	homoTable = args.homotable
+	species = args.species
+
+	create_table = False
+	homoTable_orgs = list()
+	missing_orgs = list()
+	biblastTable_orgs = list()
+	biblastTable_qhorgs = list()
+	all_possible_orgPairs = list()
+	diff_biblast_allPossible = list()
+
+	""" EXTRACT BIBLAST ORGS """
+	logging.info('Retrieving information from table: %s' %biblastTable)
+	db, cursor = connect_db(args)
+	if cursor.execute("Show tables LIKE '%s'" %biblastTable):
+		# Extract q_org and h_org names from biblast table
+		if args.threads > 1:
+			(org_names, columns) = extractBiblast(args, ("q_org", "h_org"), distinct = True)
+			biblastTable_qhorgs = sorted(set((org_names[q], org_names[h]) for q, h in zip(columns["q_org"], columns["h_org"])))
 		else:
-			new_hfam = int(max_hfam[0][0]+1)
+			biblast_qhorg_query = "SELECT DISTINCT q_org, h_org FROM %s" %biblastTable
+			(column_names, biblastTable_qhorgs) = executeQuery(cursor, biblast_qhorg_query)
+
+		for org_pair in biblastTable_qhorgs:
+			if org_pair[0] not in biblastTable_orgs:
+				biblastTable_orgs.append(org_pair[0])
+			if org_pair[1] not in biblastTable_orgs:
+				biblastTable_orgs.append(org_pair[1])
+	else:
+		logging.error('%s did not exist. Please rerun with a new biblast table.' %biblastTable)
+
+
+	""" EXTRACT HOMOTABLE ORGS AND MAX(HFAM) """
+	if homoTable != "":
+		logging.info('Retrieving information from table: %s' %homoTable)
+		if cursor.execute("SHOW TABLES LIKE '%s';" % homoTable):
+			# Extract org_names from homolog table
+			homo_org_query = "SELECT DISTINCT org_name FROM %s" %homoTable
+			(column_names, homoTable_orgs) = executeQuery(cursor, homo_org_query)
+			homoTable_orgs = list(map(' '.join, homoTable_orgs)) 	# Convert list of tuples to list of strings
+
+			# Find the max homolog cluster number (hfam)
+			(column_names, max_hfam) = executeQuery(cursor, "SELECT MAX(hfam) FROM %s;" %homoTable)
+			if max_hfam[0][0] == None:
+				new_hfam = int(1)
+			else:
+				new_hfam = int(max_hfam[0][0]+1)
+		else:
+			logging.info('%s did not exist - creating new table' %homoTable)
+			create_table = True
+			new_hfam = int(1)
 	else:
-		logging.info('%s did not exist - creating new table' %homoTable)
 		create_table = True
 		new_hfam = int(1)
-else:
-	create_table = True
-	new_hfam = int(1)
-
-
-""" CHECK COMMANDLINE INPUT SPECIES """
-if speciesfile != "":
-	species = list()
-	sp_file = open(speciesfile, "r")
-	species = [line.strip() for line in sp_file]
-	sp_file.close()
-
-if species != []:
-	# Check if all input species are in biBLAST table
-	org_not_in_biblast_orgs = list(set(species) - set(biblastTable_orgs))
-	if len(org_not_in_biblast_orgs) > 0:
-		logging.error('Please recreate %s including species from input: %s' % (biblastTable, org_not_in_biblast_orgs))
+
+
+	""" CHECK COMMANDLINE INPUT SPECIES """
+	if args.speciesfile != "":
+		species = list()
+		sp_file = open(args.speciesfile, "r")
+		species = [line.strip() for line in sp_file]
+		sp_file.close()
+
+	if species != []:
+		# Check if all input species are in biBLAST table
+		org_not_in_biblast_orgs = list(set(species) - set(biblastTable_orgs))
+		if len(org_not_in_biblast_orgs) > 0:
+			logging.error('Please recreate %s including species from input: %s' % (biblastTable, org_not_in_biblast_orgs))
+			sys.exit()
+
+	if args.all:
+		# IF selected all orgs from biblast table
+		species = biblastTable_orgs
+
+	# Combine all input species with the orgs from the homolog table
+	# and create all possible orgPairs
+	input_homoTable_species = set(homoTable_orgs + species)
+	all_possible_orgPairs = tuple(itertools.product(set(input_homoTable_species), set(input_homoTable_species)))
+
+	# Check that all possible orgPairs are in biblast table
+	diff_biblast_allPossible = list(set(all_possible_orgPairs) - set(biblastTable_qhorgs))
+	if len(diff_biblast_allPossible) > 0:
+		logging.error("These organism pairs are missing to make a complete 'all vs. all' single linkage:")
+		for dif in diff_biblast_allPossible:
+			logging.error('%s' % str(dif))
 		sys.exit()
 
-if all_species:
-	# IF selected all orgs from biblast table
-	species = biblastTable_orgs
-
-# Combine all input species with the orgs from the homolog table
-# and create all possible orgPairs
-input_homoTable_species = set(homoTable_orgs + species)
-all_possible_orgPairs = tuple(itertools.product(set(input_homoTable_species), set(input_homoTable_species)))
-
-# Check that all possible orgPairs are in biblast table
-diff_biblast_allPossible = list(set(all_possible_orgPairs) - set(biblastTable_qhorgs))
-if len(diff_biblast_allPossible) > 0:
-	logging.error("These organism pairs are missing to make a complete 'all vs. all' single linkage:")
-	for dif in diff_biblast_allPossible:
-		logging.error('%s' % str(dif))
-	sys.exit()
-
-""" RETRIEVE ORG ID FROM organism TABLE """
-# Creating lookup lists to be able to change commandline 
-# input organisms to one common organism ID for further process
-logging.info('Retrieving information from table: organism')
-try:
-	# Extract organism ID, name and real name from database
-	organism_query = "SELECT org_id, name, real_name, section FROM organism"
-	cursor.execute(organism_query)
-	organism_name = cursor.fetchall()
-except mdb.Error, e:
-	logging.error("%d: %s" % (e.args[0],e.args[1]))
-	db.close
-	sys.exit()
-db.close
+	""" RETRIEVE ORG ID FROM organism TABLE """
+	# Creating lookup lists to be able to change commandline
+	# input organisms to one common organism ID for further process
+	logging.info('Retrieving information from table: organism')
+	try:
+		# Extract organism ID, name and real name from database
+		organism_query = "SELECT org_id, name, real_name, section FROM organism"
+		cursor.execute(organism_query)
+		organism_name = cursor.fetchall()
+	except mdb.Error as e:
+		logging.error("%d: %s" % (e.args[0],e.args[1]))
+		db.close()
+		sys.exit()
+	db.close()
 
-# Restructure organism data from database
-orgname_to_id = dict()
-for element in organism_name:
-	orgname_to_id[element[1]] = element[0]
+	# Restructure organism data from database
+	orgname_to_id = dict()
+	for element in organism_name:
+		orgname_to_id[element[1]] = element[0]
 
 
-""" FIND ORGS TO BE APPENDED TO HOMOTABLE """
-# Find missing q_orgs from homolog table
-if homoTable_orgs:
-	missing_orgs = list(set(species) - set(homoTable_orgs))
-else:
-	missing_orgs = species
+	""" FIND ORGS TO BE APPENDED TO HOMOTABLE """
+	# Find missing q_orgs from homolog table
+	if homoTable_orgs:
+		missing_orgs = list(set(species) - set(homoTable_orgs))
+	else:
+		missing_orgs = species
+
+	logging.info('Species to be appended in table %s: %s' %(homoTable, missing_orgs))
 
-logging.info('Species to be appended in table %s: %s' %(homoTable, missing_orgs))
+	return(homoTable_orgs, missing_orgs, orgname_to_id, create_table, new_hfam)
 
 #--------------------------------------------------------
-# CREATE NEW MYSQL HOMOLOG TABLE FOR SINGLE LINKAGE
+# HOT QUERIES, SHARED WITH THE -explain PREFLIGHT
 #--------------------------------------------------------
+""" ALL HOMOLOGS TO q_seqkey WITH THEIR HFAMS """
+def blastHomoTableQuery(biblastTable, homoTable, q_org, q_seqkey, searchOrgs):
+	# Combine homoTable and biblast - Output: hfam;h_org;h_seqkey
+	return """SELECT hfam, tb.*
+		FROM (
+		# 2.1. Select only one column pair (here h_org, h_seqkey)
+		SELECT h_org, h_seqkey
+		FROM (
+			# 1. Get all biblast hits to q_org/q_seqkey from db
+			SELECT q_org, q_seqkey, h_org, h_seqkey
+			FROM %s
+			WHERE ((q_org = '%s' AND q_seqkey = %s) OR (h_org = '%s' AND h_seqkey = %s))) ta
+		# 2.2. where both q_org and h_org is in the selected orgs
+		WHERE (ta.q_org IN ('%s')
+		AND ta.h_org IN ('%s'))
+		) tb
+		# 3.1 Join hfam from homotable where h_org/h_seqkey exists
+		LEFT JOIN %s
+		ON h_org = org_name AND h_seqkey = protein_id
+		# 3.2 group to reduce duplicates and retrieve all potential hfams per h_org/h_seqkey
+		GROUP BY hfam, h_org, h_seqkey
+		;""" %(biblastTable, q_org, q_seqkey, q_org, q_seqkey, "', '".join(searchOrgs),
+			"', '".join(searchOrgs), homoTable)
+
+""" PROTEINS IN MORE THAN ONE HFAM """
+def duplicateQuery(homoTable):
+	return """SELECT tb.hfam, CONCAT(ta.org_name, ":",ta.protein_id) name
+		FROM (
+		SELECT org_name, protein_id
+		FROM %s
+		GROUP BY org_name, protein_id
+		HAVING COUNT(DISTINCT hfam) > 1) ta
+		JOIN %s tb
+		ON (ta.org_name = tb.org_name AND ta.protein_id = tb.protein_id)""" %(homoTable, homoTable)
+
+""" DUPLICATION TABLE, name is org_name:protein_id """
+def duplTableDefinition(dupl_table):
+	# i_name_hfam covers the hfam lookup by name in duplicateHfamsQuery
+	return """CREATE TABLE %s (
+		`hfam` int(100) NOT NULL,
+		`name` varchar(100) NOT NULL,
+		KEY `i_hfam_name` (`hfam`,`name`),
+		KEY `i_name_hfam` (`name`,`hfam`)
+		) ENGINE=MyISAM DEFAULT CHARSET=latin1;""" %dupl_table
+
+""" ALL DUPLICATED PROTEINS IN THE HFAMS OF ONE PROTEIN, RUN FOR EVERY PROTEIN WHILE MERGING """
+def duplicateHfamsQuery(dupl_table, name):
+	return """SELECT * FROM %s WHERE hfam IN (SELECT hfam FROM %s WHERE name = '%s')
+		GROUP BY hfam, name;""" %(dupl_table, dupl_table, name)
+
+""" INTERPRO AND GO ANNOTATION OF THE HOMOLOG TABLE """
+def iprQuery(homoTable):
+	return """SELECT hfam, org_id, org_name, protein_id, t1.ipr_id, ipr_desc
+		FROM
+		(SELECT hfam, hfam.org_id, hfam.org_name, hfam.protein_id, ipr_id
+		FROM %s as hfam
+		LEFT JOIN protein_has_ipr as pip
+		ON (hfam.org_id = pip.org_id AND hfam.protein_id = pip.protein_id)
+		GROUP BY hfam, org_name, hfam.protein_id, ipr_id) t1
+		LEFT JOIN ipr
+		ON (t1.ipr_id = ipr.ipr_id)
+		GROUP BY hfam, org_name, protein_id, t1.ipr_id""" % homoTable
 
-if create_table:
+def goQuery(homoTable):
+	return """SELECT hfam, org_id, org_name, protein_id, t1.go_term_id, go_name, go_termtype
+		FROM
+		(SELECT hfam, hfam.org_id, hfam.org_name, hfam.protein_id, go_term_id
+		FROM %s as hfam
+		LEFT JOIN protein_has_go as pgo
+		ON (hfam.org_id = pgo.org_id AND hfam.protein_id = pgo.protein_id)
+		GROUP BY hfam, org_name, hfam.protein_id, go_term_id) t1
+		LEFT JOIN go
+		ON (t1.go_term_id = go.go_term_id)
+		GROUP BY hfam, org_name, protein_id, t1.go_term_id""" % homoTable
+
+#--------------------------------------------------------
+# INDEX ADVISOR AND EXPLAIN
+#--------------------------------------------------------
+""" COVERING INDEXES OF THE HOT QUERIES: (table, index name, columns, used by) """
+def advisedIndexes(args):
+	return [
+		(args.biblasttable, "i_q_org_seqkey_h", ("q_org", "q_seqkey", "h_org", "h_seqkey"), "per-seqkey join, q side of the OR"),
+		(args.biblasttable, "i_h_org_seqkey_q", ("h_org", "h_seqkey", "q_org", "q_seqkey"), "per-seqkey join, h side of the OR"),
+		("protein_has_ipr", "i_org_prot_ipr", ("org_id", "protein_id", "ipr_id"), "IPR table"),
+		("protein_has_go", "i_org_prot_go", ("org_id", "protein_id", "go_term_id"), "GO table"),
+	]
+
+def checkIndexes(args, create = False):
+	"""
+	Compares the indexes of biblast, protein_has_ipr and protein_has_go with advisedIndexes. An index is usable when it starts
+	with the first two advised columns and covering when it also has the others. With create the missing or not covering indexes are added.
+	Writes indexes.tsv to the output directory.
+	"""
+	db, cursor = connect_db(args)
+	report = list()
+	for (table, index_name, columns, used_by) in advisedIndexes(args):
+		if not cursor.execute("SHOW TABLES LIKE '%s';" % table):
+			logging.warning('Index check: %s does not exist' % table)
+			continue
+		(column_names, index_rows) = executeQuery(cursor, "SHOW INDEX FROM %s;" % table)
+		indexes = dict()
+		if index_rows:
+			key_col = column_names.index("Key_name")
+			seq_col = column_names.index("Seq_in_index")
+			name_col = column_names.index("Column_name")
+			for row in sorted(index_rows, key = lambda row: (row[key_col], row[seq_col])):
+				indexes.setdefault(row[key_col], []).append(row[name_col])
+
+		status = "missing"
+		found = ""
+		for (name, index_columns) in sorted(indexes.items()):
+			if tuple(index_columns[:2]) != columns[:2]:
+				continue
+			if set(columns) <= set(index_columns):
+				(status, found) = ("covering", name)
+				break
+			(status, found) = ("usable", name)
+
+		if status == "covering":
+			logging.info('Index check: %s %s covers %s (%s)' %(table, found, ", ".join(columns), used_by))
+		elif create:
+			logging.info('Creating index %s on %s (%s) - this may take a while' %(index_name, table, ", ".join(columns)))
+			executeQuery(cursor, "ALTER TABLE %s ADD INDEX `%s` (%s);" %(table, index_name, ", ".join(columns)))
+			db.commit()
+			(status, found) = ("created", index_name)
+		elif status == "usable":
+			logging.warning('Index check: %s %s is usable but does not cover %s (%s) - rerun with -create_indexes' %(table, found, ", ".join(columns), used_by))
+		else:
+			logging.warning('Index check: %s has no index on %s (%s) - rerun with -create_indexes' %(table, ", ".join(columns), used_by))
+		report.append((table, ",".join(columns), used_by, status, found))
+	db.close()
+
+	with open(os.path.join(args.output_dir, "indexes.tsv"), "w") as outfile:
+		outfile.write("table\tcolumns\tused_by\tstatus\tindex\n")
+		for row in report:
+			outfile.write("\t".join(row) + "\n")
+	return report
+
+def explainQueries(args):
+	"""
+	Runs EXPLAIN on the per-seqkey join, the duplicate search, the per-protein hfam lookup in the duplication table and
+	the IPR/GO selects with a sample q_org/q_seqkey from the biblast table and writes the plans to explain.tsv in the output directory.
+	The duplication table only exists while merging, its lookup is explained on <homotable>_dupl_explain, filled with a sample
+	of the homolog table and dropped afterwards. Full table scans are logged as warnings.
+	"""
+	biblastTable = args.biblasttable
+	homoTable = args.homotable
+	db, cursor = connect_db(args)
+	if not cursor.execute("SHOW TABLES LIKE '%s';" % homoTable):
+		logging.warning('EXPLAIN: %s does not exist yet, only the index check is done' % homoTable)
+		db.close()
+		return []
+	(column_names, sample) = executeQuery(cursor, "SELECT q_org, q_seqkey, h_org FROM %s LIMIT 1;" % biblastTable)
+	if not sample:
+		logging.warning('EXPLAIN: %s is empty' % biblastTable)
+		db.close()
+		return []
+	(q_org, q_seqkey, h_org) = sample[0]
+
+	# A real table, MySQL cannot use a temporary table twice in one statement
+	dupl_table = homoTable + "_dupl_explain"
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % dupl_table)
+	executeQuery(cursor, duplTableDefinition(dupl_table))
+	executeQuery(cursor, """INSERT INTO %s SELECT hfam, CONCAT(org_name, ":", protein_id) name FROM %s LIMIT 10000;""" %(dupl_table, homoTable))
+	(column_names, dupl_sample) = executeQuery(cursor, "SELECT name FROM %s LIMIT 1;" % dupl_table)
+	db.commit()
+
+	statements = [
+		("blast_homoTable", blastHomoTableQuery(biblastTable, homoTable, q_org, q_seqkey, sorted(set([q_org, h_org])))),
+		("dupl", duplicateQuery(homoTable)),
+		("dupl_hfams", duplicateHfamsQuery(dupl_table, dupl_sample[0][0] if dupl_sample else "")),
+		("ipr", iprQuery(homoTable)),
+		("go", goQuery(homoTable)),
+	]
+
+	header = None
+	plans = list()
+	for (name, statement) in statements:
+		try:
+			cursor.execute("EXPLAIN " + statement.rstrip().rstrip(";"))
+			rows = cursor.fetchall()
+		except mdb.Error as e:
+			logging.warning('EXPLAIN %s failed %d: %s' %(name, e.args[0], e.args[1]))
+			continue
+		columns = [x[0] for x in cursor.description]
+		header = header or columns
+		for row in rows:
+			plan = dict(zip(columns, row))
+			plans.append((name, plan))
+			# Derived tables (<derived2>) are always scanned, only full scans of stored tables are reported
+			if plan.get("type") == "ALL" and not str(plan.get("table")).startswith("<"):
+				logging.warning('EXPLAIN %s: full scan of %s (%s rows), possible keys: %s' %(name, plan.get("table"), plan.get("rows"), plan.get("possible_keys")))
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % dupl_table)
+	db.commit()
+	db.close()
+
+	if header:
+		with open(os.path.join(args.output_dir, "explain.tsv"), "w") as outfile:
+			outfile.write("\t".join(["statement"] + header) + "\n")
+			for (name, plan) in plans:
+				outfile.write("\t".join([name] + ["" if plan.get(column) is None else str(plan.get(column)) for column in header]) + "\n")
+		logging.info('EXPLAIN plans written to %s' % os.path.join(args.output_dir, "explain.tsv"))
+	return plans
+
+#--------------------------------------------------------
+# PARALLEL BIBLAST EXTRACTION
+#--------------------------------------------------------
+orgColumns = ("q_org", "h_org")
+
+""" SPLIT THE BIBLAST TABLE INTO RANGES """
+def biblastRanges(args, cursor, pieces, orgs = ()):
+	"""
+	Returns WHERE conditions covering the biblast table, or the rows of the q_orgs in orgs, in about pieces ranges.
+	An integer primary key of one column is split into equal ranges, otherwise every q_org is split into q_seqkey ranges.
+	"""
+	biblastTable = args.biblasttable
+	if not orgs:
+		(column_names, keys) = executeQuery(cursor, "SHOW KEYS FROM %s WHERE Key_name = 'PRIMARY';" % biblastTable)
+		if len(keys) == 1:
+			key = keys[0][column_names.index("Column_name")]
+			(column_names, bounds) = executeQuery(cursor, "SELECT MIN(%s), MAX(%s) FROM %s;" %(key, key, biblastTable))
+			(low, high) = bounds[0]
+			if low is None:
+				return []
+			if isinstance(low, numbers.Integral):
+				step = max(1, -(-(high - low + 1) // pieces))
+				return ["%s >= %s AND %s < %s" %(key, start, key, start + step) for start in range(low, high + 1, step)]
+
+	org_filter = "WHERE q_org IN ('%s')" % "', '".join(orgs) if orgs else ""
+	(column_names, bounds) = executeQuery(cursor, "SELECT q_org, MIN(q_seqkey), MAX(q_seqkey) FROM %s %s GROUP BY q_org;" %(biblastTable, org_filter))
+	ranges = list()
+	per_org = max(1, -(-pieces // max(1, len(bounds))))
+	for (q_org, low, high) in bounds:
+		step = max(1, -(-(high - low + 1) // per_org))
+		for start in range(low, high + 1, step):
+			ranges.append("q_org = '%s' AND q_seqkey >= %s AND q_seqkey < %s" %(q_org, start, start + step))
+	return ranges
+
+""" READ BIBLAST COLUMNS OVER SEVERAL CONNECTIONS """
+def extractBiblast(args, columns, distinct = False, orgs = (), threads = None, chunk_size = 100000):
+	"""
+	Reads columns of the biblast table with threads connections at once, each streaming one range at a time.
+	Returns (org_names, {column: array('l')}), q_org and h_org are stored as indices into org_names.
+	With distinct the duplicates within each range are removed on the server.
+	"""
+	biblastTable = args.biblasttable
+	threads = threads or args.threads
+	startTimet_extract = datetime.datetime.now()
+
+	db, cursor = connect_db(args)
+	ranges = biblastRanges(args, cursor, threads * 4, orgs)
+	db.close()
+
+	# One connection per thread, opened here so connection errors stop the program
+	connections = queue.Queue()
+	for i in range(min(threads, len(ranges))):
+		connections.put(connect_db(args, streaming = True))
+
+	lock = threading.Lock()
+	org_names = list()
+	org_codes = dict()
+	def orgCode(org_name):
+		code = org_codes.get(org_name)
+		if code is None:
+			with lock:
+				if org_name not in org_codes:
+					org_codes[org_name] = len(org_names)
+					org_names.append(org_name)
+				code = org_codes[org_name]
+		return code
+
+	def readRange(where):
+		buffers = dict((column, array.array("l")) for column in columns)
+		(range_db, range_cursor) = connections.get()
+		try:
+			range_cursor.execute("SELECT %s%s FROM %s WHERE %s;" %("DISTINCT " if distinct else "", ", ".join(columns), biblastTable, where))
+			rows = range_cursor.fetchmany(chunk_size)
+			while rows:
+				for column, values in zip(columns, zip(*rows)):
+					buffers[column].extend(map(orgCode, values) if column in orgColumns else values)
+				rows = range_cursor.fetchmany(chunk_size)
+		finally:
+			connections.put((range_db, range_cursor))
+		return buffers
+
+	extracted = dict((column, array.array("l")) for column in columns)
+	pool = ThreadPool(max(1, min(threads, len(ranges))))
+	try:
+		for buffers in pool.imap(readRange, ranges):
+			for column in columns:
+				extracted[column].extend(buffers[column])
+	except mdb.Error as e:
+		logging.error("%s extraction %d: %s" % (biblastTable, e.args[0], e.args[1]))
+		sys.exit()
+	finally:
+		pool.close()
+		pool.join()
+		while not connections.empty():
+			connections.get()[0].close()
+
+	logging.info('Read %s rows of %s in %s ranges - runtime :%s' %(len(extracted[columns[0]]), biblastTable, len(ranges), str(datetime.datetime.now()-startTimet_extract)))
+	return org_names, extracted
+
+#--------------------------------------------------------
+# CREATE NEW MYSQL HOMOLOG TABLE FOR SINGLE LINKAGE
+#--------------------------------------------------------
+def createHomoTable(args, orgs = ()):
+	homoTable = args.homotable
 	logging.info('Creating table: %s' % homoTable)
-	db, cursor = connect_db(args, inspect.stack()[0][2])
+	db, cursor = connect_db(args)
 	query = ("""CREATE TABLE %s (
 		`hfam` int(100) NOT NULL,
 		`org_id` int(100) NOT NULL,
@@ -398,8 +738,8 @@ if create_table:
 		`protein_id` int(100) NOT NULL,
 		unique `i_hfam_org_prot` (`hfam`, `org_name`, `protein_id`),
 		KEY `i_org_prot` (`org_name`, `protein_id`)
-		) ENGINE=MyISAM DEFAULT CHARSET=latin1""") % homoTable
-	
+		) %s""") % (homoTable, tableOptions(args, orgs))
+
 	executeQuery(cursor, query)
 	db.commit()
 
@@ -409,342 +749,580 @@ if create_table:
 		sys.exit()
 	db.close()
 
+#--------------------------------------------------------
+# PARTITIONS
+#--------------------------------------------------------
+""" ONE PARTITION PER ORGANISM """
+def partitionName(org_name):
+	# The hash of the full name keeps names apart that only differ in punctuation or after the first 45 characters
+	return "p_%s_%s" %(re.sub(r"\W", "_", org_name)[:45], hashlib.md5(org_name.encode("utf-8")).hexdigest()[:8])
+
+def partitionDefinitions(orgs):
+	return ", ".join("PARTITION %s VALUES IN ('%s')" % (partitionName(org), org) for org in sorted(set(orgs)))
+
+""" TABLE OPTIONS FOR NEW TABLES """
+def tableOptions(args, orgs):
+	# MyISAM tables cannot be partitioned in MySQL 8, partitioned tables use InnoDB
+	if args.partition and orgs:
+		return "ENGINE=InnoDB DEFAULT CHARSET=latin1 PARTITION BY LIST COLUMNS(org_name) (%s)" % partitionDefinitions(orgs)
+	return "ENGINE=MyISAM DEFAULT CHARSET=latin1"
+
+""" ADD PARTITIONS FOR NEW ORGANISMS OR PARTITION AN EXISTING TABLE """
+def ensurePartitions(args, table, orgs):
+	if not orgs:
+		return
+	db, cursor = connect_db(args)
+	(column_names, partitions) = executeQuery(cursor, """SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+		WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '%s' AND PARTITION_NAME IS NOT NULL;""" % table)
+	# The organisms already partitioned, from the partition values ('Aspni1') rather than the partition names
+	partitioned_orgs = set(description.strip()[1:-1].replace("''", "'") for (name, description) in partitions)
+
+	if not partitions:
+		logging.info('Partitioning %s by organism' % table)
+		executeQuery(cursor, "ALTER TABLE %s ENGINE=InnoDB PARTITION BY LIST COLUMNS(org_name) (%s);" %(table, partitionDefinitions(orgs)))
+	else:
+		new_orgs = [org for org in sorted(set(orgs)) if org not in partitioned_orgs]
+		if new_orgs:
+			logging.info('Adding partitions to %s for: %s' %(table, new_orgs))
+			executeQuery(cursor, "ALTER TABLE %s ADD PARTITION (%s);" %(table, partitionDefinitions(new_orgs)))
+	db.commit()
+	db.close()
+
+#--------------------------------------------------------
+# SHADOW TABLES
+#--------------------------------------------------------
+shadowSuffixes = ["", "_IPR", "_GO", "_GO_fam", "_hfam_map"]
+
+""" COPY THE HOMOLOG TABLE TO ITS SHADOW """
+def prepareShadow(args):
+	"""
+	Returns a copy of args working on <homotable>_shadow. The shadow starts as a copy of the homolog table,
+	leftovers of an interrupted run are dropped.
+	"""
+	shadowArgs = copy.copy(args)
+	shadowArgs.homotable = args.homotable + "_shadow"
+	shadowTable = shadowArgs.homotable
+
+	db, cursor = connect_db(args)
+	for suffix in shadowSuffixes + ["_dupl", "_compact"]:
+		executeQuery(cursor, "DROP TABLE IF EXISTS %s%s;" %(shadowTable, suffix))
+
+	if cursor.execute("SHOW TABLES LIKE '%s';" % args.homotable):
+		logging.info('Copying %s to %s' %(args.homotable, shadowTable))
+		executeQuery(cursor, "CREATE TABLE %s LIKE %s;" %(shadowTable, args.homotable))
+		executeQuery(cursor, "INSERT INTO %s SELECT * FROM %s;" %(shadowTable, args.homotable))
+	db.commit()
+	db.close()
+	return shadowArgs
+
+""" PUBLISH ALL SHADOW TABLES AT ONCE """
+def publishShadow(args, shadowArgs, built):
+	"""
+	Publishes the shadow tables of the suffixes in built (the tables of this run) in one RENAME. Live IPR, GO and mapping
+	tables that are not published describe the old hfam numbering, they are moved away in the same RENAME and dropped.
+	"""
+	db, cursor = connect_db(args)
+	renames = list()
+	old_tables = list()
+	for suffix in shadowSuffixes:
+		live = args.homotable + suffix
+		shadow = shadowArgs.homotable + suffix
+		publish = suffix in built and cursor.execute("SHOW TABLES LIKE '%s';" % shadow)
+		if cursor.execute("SHOW TABLES LIKE '%s';" % live) and (publish or suffix != ""):
+			if not publish:
+				logging.warning('%s was not rebuilt in this run and does not match the new %s, dropping it' %(live, args.homotable))
+			executeQuery(cursor, "DROP TABLE IF EXISTS %s_old;" % live)
+			renames.append("%s TO %s_old" %(live, live))
+			old_tables.append(live + "_old")
+		if publish:
+			renames.append("%s TO %s" %(shadow, live))
+
+	if not renames:
+		db.close()
+		return
+	logging.info('Publishing shadow tables: %s' % ", ".join(renames))
+	executeQuery(cursor, "RENAME TABLE %s;" % ", ".join(renames))
+	for table in old_tables:
+		executeQuery(cursor, "DROP TABLE %s;" % table)
+	db.commit()
+	db.close()
+
 #--------------------------------------------------------
 # APPEND, MERGE OR CREATE NEW CLUSTERS/FAMILIES
 #--------------------------------------------------------
+def linkFamilies(args, homoTable_orgs, missing_orgs, orgname_to_id, new_hfam):
+	"""
+	Single links the proteins of missing_orgs into the homolog table. homoTable_orgs is extended with every
+	species that was linked. Returns the next free hfam.
+	"""
+	biblastTable = args.biblasttable
+	homoTable = args.homotable
 
-# Limit the biBLAST search to homoTable q_orgs + runned q_orgs
-searchOrgs = homoTable_orgs
-startTimet_2 = ""
-startTimet_3 = datetime.datetime.now()
+	# Limit the biBLAST search to homoTable q_orgs + runned q_orgs
+	searchOrgs = homoTable_orgs
+	startTimet_2 = ""
+
+	logging.info('Creating homologous protein families')
+	db, cursor = connect_db(args)
+	if args.batch > 0:
+		executeQuery(cursor, """CREATE TEMPORARY TABLE IF NOT EXISTS hf_batch_keys (
+			`q_seqkey` int(100) NOT NULL,
+			PRIMARY KEY (`q_seqkey`)
+			) ENGINE=MEMORY;""")
+	org_count = 0
+	for q_org in missing_orgs:
+		if org_count != 0:
+			logging.info('Iteration time: %s' %str(datetime.datetime.now()-startTimet_2))
+
+		org_count += 1
+
+		startTimet_2 = datetime.datetime.now()
+		logging.info("----------------------------------------------------")
+		logging.info('Running species: %s - %s of %s' %(q_org, org_count, len(missing_orgs)))
+		logging.info("----------------------------------------------------")
+
+
+		# Set variables
+		total_seqkey_counter = 0
+		upload_counter = 0
+		total_upload_counter = 0
+		values2insert = []
+
+		# Limit the biBLAST search to homoTable q_orgs + runned q_orgs
+		searchOrgs.append(q_org)
+
+		""" RETRIEVE ALL q_seqkeys """
+		# Retrieve q_seqkey from missing q_org
+		if args.threads > 1:
+			(org_names, columns) = extractBiblast(args, ("q_seqkey",), distinct = True, orgs = [q_org])
+			q_org_seqkey_list = sorted(set(columns["q_seqkey"]))
+		else:
+			q_org_seqkey_query = "SELECT DISTINCT q_seqkey FROM %s WHERE q_org = '%s';" %(biblastTable, q_org)
+			(column_names, q_org_seqkey_list) = executeQuery(cursor, q_org_seqkey_query)
+			q_org_seqkey_list = list(sum(q_org_seqkey_list, ())) # list of tuples to flat list
+
+		""" BATCHED LINKING """
+		if args.batch > 0:
+			for start in range(0, len(q_org_seqkey_list), args.batch):
+				new_hfam = linkBatch(args, db, cursor, q_org, q_org_seqkey_list[start:start + args.batch], searchOrgs, orgname_to_id, new_hfam)
+				logging.info('Linked q_seqkey %s of %s' %(min(start + args.batch, len(q_org_seqkey_list)), len(q_org_seqkey_list)))
+			continue
+
+		# Find all q_seqkey biBLAST hits (h_seqkeys) in both the input and homoTable q_orgs
+		for q_seqkey in q_org_seqkey_list:
+
+			# Set and reset variables
+			total_seqkey_counter += 1
+			blast_homoTable_output = list()
+			hfam_homoTable_collected = list()
+			hfam_values2insert_collected = list()
+			collect_NULLhfam = list()
 
-logging.info('Creating homologous protein families')
-db, cursor = connect_db(args, inspect.stack()[0][2])
-org_count = 0
-for q_org in missing_orgs:
-	if org_count != 0:
-		logging.info('Iteration time: %s' %str(datetime.datetime.now()-startTimet_2))
+			""" RETRIEVE ALL HOMOLOGS TO q_seqkey """
+			# Combine homoTable and biblast - Output: hfam;h_org;h_seqkey
+			query_blast_homoTable = blastHomoTableQuery(biblastTable, homoTable, q_org, q_seqkey, searchOrgs)
 
-	org_count += 1
+			(column_names, blast_homoTable_data) = executeQuery(cursor, query_blast_homoTable)
 
-	startTimet_2 = datetime.datetime.now()
-	logging.info("----------------------------------------------------")
-	logging.info('Running species: %s - %s of %s' %(q_org, org_count, len(missing_orgs)))
-	logging.info("----------------------------------------------------")
 
-	
-	# Set variables 
-	total_seqkey_counter = 0
-	upload_counter = 0
-	total_upload_counter = 0
-	values2insert = []
-	
-	# Limit the biBLAST search to homoTable q_orgs + runned q_orgs
-	searchOrgs.append(q_org)
-
-	""" RETRIEVE ALL q_seqkeys """
-	# Retrieve q_seqkey from missing q_org
-	q_org_seqkey_query = "SELECT DISTINCT q_seqkey FROM %s WHERE q_org = '%s';" %(biblastTable, q_org)
-	(column_names, q_org_seqkey_list) = executeQuery(cursor, q_org_seqkey_query)
-	q_org_seqkey_list = list(sum(q_org_seqkey_list, ())) # list of tuples to flat list
-
-
-	# Find all q_seqkey biBLAST hits (h_seqkeys) in both the input and homoTable q_orgs 
-	for q_seqkey in q_org_seqkey_list:
-		
-		# Set and reset variables 
-		total_seqkey_counter += 1
-		blast_homoTable_output = list()
-		hfam_homoTable_collected = list()
-		hfam_values2insert_collected = list()
-		collect_NULLhfam = list()
-
-		""" RETRIEVE ALL HOMOLOGS TO q_seqkey """ 
-		# Combine homoTable and biblast - Output: hfam;h_org;h_seqkey
-		query_blast_homoTable = """SELECT hfam, tb.*
-			FROM (
-			# 2.1. Select only one column pair (here h_org, h_seqkey)
-			SELECT h_org, h_seqkey
-			FROM (
-				# 1. Get all biblast hits to q_org/q_seqkey from db 
-				SELECT q_org, q_seqkey, h_org, h_seqkey
-				FROM %s
-				WHERE ((q_org = '%s' AND q_seqkey = %s) OR (h_org = '%s' AND h_seqkey = %s))) ta
-			# 2.2. where both q_org and h_org is in the selected orgs
-			WHERE (ta.q_org IN ('%s') 
-			AND ta.h_org IN ('%s'))
-			) tb
-			# 3.1 Join hfam from homotable where h_org/h_seqkey exists
-			LEFT JOIN %s
-			ON h_org = org_name AND h_seqkey = protein_id
-			# 3.2 group to reduce duplicates and retrieve all potential hfams per h_org/h_seqkey
-			GROUP BY hfam, h_org, h_seqkey
-			;""" %(biblastTable, q_org, q_seqkey, q_org, q_seqkey, "', '".join(searchOrgs), 
-				"', '".join(searchOrgs), homoTable)
-
-		(column_names, blast_homoTable_data) = executeQuery(cursor, query_blast_homoTable) 
-
-
-		# Converto output from tuples of tuples to a list of lists
-		# or create empty list
-		if len(blast_homoTable_data) == 0:
-			blast_homoTable_output = list()
-		else:
-			blast_homoTable_output = blast_homoTable_data
-
-		""" FETCH ALL HFAMS FROM homoTable """
-		for blasthit in blast_homoTable_output:
-			hfam_homoTable = blasthit[0]
-			h_org = blasthit[1]
-			h_seqkey = blasthit[2]
-
-			# Retrieve all homoTable HFAMS
-			if hfam_homoTable != None: # can hfam be collected from homologs in the query?
-				if hfam_homoTable not in hfam_homoTable_collected:
-					hfam_homoTable_collected.append(hfam_homoTable)
+			# Converto output from tuples of tuples to a list of lists
+			# or create empty list
+			if len(blast_homoTable_data) == 0:
+				blast_homoTable_output = list()
 			else:
-				# Collect all entries with no HFAM - Exit if not a paralog
-				collect_NULLhfam.append(blasthit)
+				blast_homoTable_output = blast_homoTable_data
+
+			""" FETCH ALL HFAMS FROM homoTable """
+			for blasthit in blast_homoTable_output:
+				hfam_homoTable = blasthit[0]
+				h_org = blasthit[1]
+				h_seqkey = blasthit[2]
+
+				# Retrieve all homoTable HFAMS
+				if hfam_homoTable != None: # can hfam be collected from homologs in the query?
+					if hfam_homoTable not in hfam_homoTable_collected:
+						hfam_homoTable_collected.append(hfam_homoTable)
+				else:
+					# Collect all entries with no HFAM - Exit if not a paralog
+					collect_NULLhfam.append(blasthit)
+
+
+			""" FETCH ALL MEMBERS FROM HFAM AND DELETE EXISTING ONES AND CREATE NEW HFAMS"""
+			members_homoTable = list()
+			new_family_members = list()
+			new_family_to_values2insert = list()
+			collect_NULLhfam_orgID = list()
+			upload_counter = len(values2insert)
+
+			# Fetch hfam members, delete existing ones and create new uploads
+			if len(hfam_homoTable_collected) > 0:
+				members_homoTable = hfamMembers_homoTable(db, cursor, hfam_homoTable_collected, homoTable)
+
+			# Include org_id to collect_NULLhfam protein members
+			if len(collect_NULLhfam) > 0:
+				for row_entry in collect_NULLhfam:
+					collect_NULLhfam_orgID.append((row_entry[0], int(orgname_to_id[row_entry[1]]), row_entry[1], int(row_entry[2])))
+
+			# Combine homoTable members with biblast hfams and hits without hfams
+			new_family_members = list(set(members_homoTable + collect_NULLhfam_orgID))
+
+			# Create new family with new hfam, the hfam count only moves on when a family was created
+			if len(new_family_members) > 0:
+				(upload_counter, new_family_to_values2insert) = createNewFamily(new_family_members, upload_counter, new_hfam, new_family_to_values2insert)
+				new_hfam += 1
+
+			# Remove duplicates in new_family_to_values2insert and extend values2insert
+			# OBS: This might be redundant - IT IS NOT (tested)
+			new_family_to_values2insert_reduced = list(set(new_family_to_values2insert))
+
+			# Update values2insert
+			values2insert.extend(new_family_to_values2insert_reduced)
+
+			""" UPLOAD TO SERVER """
+			# Uploading to server
+			if upload_counter >= 5000 or total_seqkey_counter == len(q_org_seqkey_list):
+
+				total_upload_counter = total_upload_counter + upload_counter
+				# Prints record number that will be inserted
+				if upload_counter >= 5000 :
+					logging.info('Inserting record number %s' % total_upload_counter)
+				elif total_seqkey_counter == len(q_org_seqkey_list):
+					logging.info('Inserting record number %s' % total_upload_counter)
+					total_upload_counter = 0
+
+				# Upload into table
+				try:
+					query =  "INSERT IGNORE INTO %s (hfam, org_id, org_name, protein_id) values(%s);" % (homoTable, ("%s," * len(values2insert[0])).rstrip(","))
+
+					cursor.executemany(query, values2insert)
+					# Add changes to database
+					db.commit()
+
+					upload_counter = 0 	# restart counter
+					values2insert = []	# Empty list of values
+					new_family_to_values2insert = []
+				except mdb.Error as e:
+					print(values2insert)
+					logging.error('%s load %s %d: %s' % (homoTable, q_org, e.args[0],e.args[1]))
+					db.close()
+					sys.exit()
+
+	""" CLOSE DATABASE """
+	db.close()
 
+	if len(missing_orgs)>0:
+		logging.info('Iteration time: %s' %str(datetime.datetime.now()-startTimet_2))
 
-		""" FETCH ALL MEMBERS FROM HFAM AND DELETE EXISTING ONES AND CREATE NEW HFAMS"""
-		members_homoTable = list()
-		new_family_members = list()
-		new_family_to_values2insert = list()
-		collect_NULLhfam_orgID = list()
-		upload_counter = len(values2insert)
-
-		# Fetch hfam members, delete existing ones and create new uploads
-		if len(hfam_homoTable_collected) > 0:
-			members_homoTable = hfamMembers_homoTable(hfam_homoTable_collected, homoTable, args)
-
-		# Include org_id to collect_NULLhfam protein members
-		if len(collect_NULLhfam) > 0:
-			for row_entry in collect_NULLhfam:
-				collect_NULLhfam_orgID.append((row_entry[0], int(orgname_to_id[row_entry[1]]), row_entry[1], int(row_entry[2])))
-		
-		# Combine homoTable members with biblast hfams and hits without hfams
-		new_family_members = list(set(members_homoTable + collect_NULLhfam_orgID))
-
-		# Create new family with new hfam
-		if len(new_family_members) > 0:
-			(upload_counter, new_family_to_values2insert) = createNewFamily(new_family_members, upload_counter, new_hfam, new_family_to_values2insert)	
-
-		# Remove duplicates in new_family_to_values2insert and extend values2insert
-		# OBS: This might be redundant - IT IS NOT (tested)
-		new_family_to_values2insert_reduced = list(set(new_family_to_values2insert))
-		
-		# Update values2insert and hfam count
-		values2insert.extend(new_family_to_values2insert_reduced)
-		new_hfam += 1
-		
-		""" UPLOAD TO SERVER """
-		# Uploading to server
-		if upload_counter >= 5000 or total_seqkey_counter == len(q_org_seqkey_list):
-
-			total_upload_counter = total_upload_counter + upload_counter
-			# Prints record number that will be inserted
-			if upload_counter >= 5000 : 
-				logging.info('Inserting record number %s' % total_upload_counter)
-			elif total_seqkey_counter == len(q_org_seqkey_list): 
-				logging.info('Inserting record number %s' % total_upload_counter)
-				total_upload_counter = 0
-
-			# Upload into table
-			try:
-				query =  "INSERT IGNORE INTO %s (hfam, org_id, org_name, protein_id) values(%s);" % (homoTable, ("%s," * len(values2insert[0])).rstrip(","))
-				
-				cursor.executemany(query, values2insert)
-				# Add changes to database
-			 	db.commit()	
-
-				upload_counter = 0 	# restart counter
-				values2insert = []	# Empty list of values
-				new_family_to_values2insert = []
-			except mdb.Error, e:
-				print values2insert
-				logging.error('%s load %s %d: %s' % (homoTable, q_org, e.args[0],e.args[1]))
-				db.close()
-				sys.exit()
-
-""" CLOSE DATABASE """
-db.close()
-new_hfam += 1
-
-if len(missing_orgs)>0:
-	logging.info('Iteration time: %s' %str(datetime.datetime.now()-startTimet_2))
-
-logging.info("----------------------------------------------------")
-logging.info('Total linking time: %s' %str(datetime.datetime.now()-startTimet_3))
-logging.info("----------------------------------------------------")
-
-startTimet_4 = datetime.datetime.now()
+	return(new_hfam)
+
+""" ROOT OF A NODE IN THE UNION-FIND FOREST """
+def findRoot(parent, node):
+	root = node
+	while parent[root] != root:
+		root = parent[root]
+	while parent[node] != root:
+		next_node = parent[node]
+		parent[node] = root
+		node = next_node
+	return root
+
+def linkBatch(args, db, cursor, q_org, q_seqkeys, searchOrgs, orgname_to_id, new_hfam):
+	"""
+	Links a batch of q_seqkeys of q_org like the per-seqkey loop: the hits of a q_seqkey and all members of their hfams
+	become one family. The hits of the whole batch are read with two queries through the temporary table hf_batch_keys,
+	families sharing hits are merged in memory (union-find), then the old hfams are deleted and the new ones inserted at once.
+	Returns the next free hfam.
+	"""
+	biblastTable = args.biblasttable
+	homoTable = args.homotable
+	search_orgs = "', '".join(searchOrgs)
+
+	executeQuery(cursor, "DELETE FROM hf_batch_keys;")
+	cursor.executemany("INSERT INTO hf_batch_keys (q_seqkey) values(%s);", [(q_seqkey,) for q_seqkey in q_seqkeys])
+
+	""" RETRIEVE ALL HOMOLOGS TO THE BATCH """
+	# The two sides of the OR of the per-seqkey query, a temporary table can only be used once per statement
+	(column_names, q_hits) = executeQuery(cursor, """SELECT k.q_seqkey, b.h_org, b.h_seqkey, h.hfam
+		FROM hf_batch_keys k
+		JOIN %s b ON (b.q_org = '%s' AND b.q_seqkey = k.q_seqkey)
+		LEFT JOIN %s h ON (b.h_org = h.org_name AND b.h_seqkey = h.protein_id)
+		WHERE b.h_org IN ('%s');""" %(biblastTable, q_org, homoTable, search_orgs))
+	(column_names, h_hits) = executeQuery(cursor, """SELECT k.q_seqkey, b.h_org, b.h_seqkey, h.hfam
+		FROM hf_batch_keys k
+		JOIN %s b ON (b.h_org = '%s' AND b.h_seqkey = k.q_seqkey)
+		LEFT JOIN %s h ON (b.h_org = h.org_name AND b.h_seqkey = h.protein_id)
+		WHERE b.q_org IN ('%s');""" %(biblastTable, q_org, homoTable, search_orgs))
+
+	""" MERGE IN MEMORY """
+	parent = dict()
+	proteins_NULLhfam = set()
+	for (q_seqkey, h_org, h_seqkey, hfam) in list(q_hits) + list(h_hits):
+		nodes = [("key", q_seqkey), ("protein", h_org, int(h_seqkey))]
+		if hfam is None:
+			proteins_NULLhfam.add(nodes[1])
+		else:
+			nodes.append(("hfam", int(hfam)))
+		for node in nodes:
+			parent.setdefault(node, node)
+		for node in nodes[1:]:
+			root_a = findRoot(parent, nodes[0])
+			root_b = findRoot(parent, node)
+			if root_a != root_b:
+				parent[root_b] = root_a
+
+	# New hfams in q_seqkey order, one per group of linked q_seqkeys
+	root_to_hfam = dict()
+	for q_seqkey in q_seqkeys:
+		if ("key", q_seqkey) in parent:
+			root = findRoot(parent, ("key", q_seqkey))
+			if root not in root_to_hfam:
+				root_to_hfam[root] = new_hfam
+				new_hfam += 1
+
+	""" FETCH ALL MEMBERS FROM HFAMS, DELETE THEM AND INSERT THE NEW FAMILIES """
+	hfams = sorted(node[1] for node in parent if node[0] == "hfam")
+	members_homoTable = list()
+	if len(hfams) > 0:
+		members_homoTable = hfamMembers_homoTable(db, cursor, hfams, homoTable)
+
+	values2insert = set()
+	for member in members_homoTable:
+		values2insert.add((root_to_hfam[findRoot(parent, ("hfam", int(member[0])))], member[1], member[2], member[3]))
+	for protein in proteins_NULLhfam:
+		values2insert.add((root_to_hfam[findRoot(parent, protein)], int(orgname_to_id[protein[1]]), protein[1], protein[2]))
+
+	if len(values2insert) > 0:
+		try:
+			cursor.executemany("INSERT IGNORE INTO %s (hfam, org_id, org_name, protein_id) values(%%s,%%s,%%s,%%s);" % homoTable, sorted(values2insert))
+			db.commit()
+		except mdb.Error as e:
+			logging.error('%s load %s %d: %s' % (homoTable, q_org, e.args[0],e.args[1]))
+			db.close()
+			sys.exit()
+
+	return(new_hfam)
 
 #--------------------------------------------------------
 # CREATE DUPLICATE TABLE
 #--------------------------------------------------------
-dupl_table = homoTable+"_dupl"
+def mergeDuplicates(args, new_hfam):
+	"""
+	Merges all hfams sharing an org_name/protein_id pair into new hfams. Returns the next free hfam.
+	"""
+	homoTable = args.homotable
+	dupl_table = homoTable+"_dupl"
+
+	""" DROP TABLE IF EXISTS """
+	db, cursor = connect_db(args)
+	if cursor.execute("SHOW TABLES LIKE '%s';" % dupl_table):
+		logging.warning('Deleting existing table: %s' %dupl_table)
+		executeQuery(cursor, "DROP TABLE %s;" % dupl_table)
+	db.commit()
 
-""" DROP TABLE IF EXISTS """
-db, cursor = connect_db(args, inspect.stack()[0][2])
-if cursor.execute("SHOW TABLES LIKE '%s';" % dupl_table):
-	logging.warning('Deleting existing table: %s' %dupl_table)
-	executeQuery(cursor, "DROP TABLE %s;" % dupl_table)
-db.commit()
+	logging.info('Creating protein duplication table: %s' %dupl_table)
+	executeQuery(cursor, duplTableDefinition(dupl_table))
 
-logging.info('Creating protein duplication table: %s' %dupl_table)
-query = """CREATE TABLE %s (
-	`hfam` int(100) NOT NULL,
-	`name` varchar(100) NOT NULL,
-	KEY `i_hfam_name` (`hfam`,`name`),
-	KEY `name` (`name`)
-	) ENGINE=MyISAM DEFAULT CHARSET=latin1;""" %dupl_table
+	if not cursor.execute("SHOW TABLES LIKE '%s';" % dupl_table):
+		logging.error("%s was not created" % dupl_table)
+		db.close()
+		sys.exit()
 
-executeQuery(cursor, query) 
+	PROTdupl_table_query = "INSERT %s %s;" %(dupl_table, duplicateQuery(homoTable))
 
-if not cursor.execute("SHOW TABLES LIKE '%s';" % dupl_table):
-	logging.error("%s was not created" % dupl_table)
+	executeQuery(cursor, PROTdupl_table_query)
 	db.close()
-	sys.exit()
-
-PROTdupl_table_query = """INSERT %s
-	SELECT tb.hfam, CONCAT(ta.org_name, ":",ta.protein_id) name
-	FROM (
-	SELECT org_name, protein_id
-	FROM %s
-	GROUP BY org_name, protein_id
-	HAVING COUNT(DISTINCT hfam) > 1) ta
-	JOIN %s tb
-	ON (ta.org_name = tb.org_name AND ta.protein_id = tb.protein_id)
-	;""" %(dupl_table, homoTable, homoTable)
-
-executeQuery(cursor, PROTdupl_table_query) 
-db.close()
-
-
-#--------------------------------------------------------
-# SINGLE-LINK ALL HFAMS WITH DUPLICATED 
-# org_name/protein_id pair IN DUPLICATE TABLE
-#--------------------------------------------------------
-""" CHECK ROW COUNT """
-db, cursor = connect_db(args, inspect.stack()[0][2])
-
-(column_names, row_count) = executeQuery(cursor, "SELECT COUNT(*) FROM %s;" % dupl_table)
-logging.info('There are %s duplications present in %s' %(row_count[0][0], homoTable))
-
-logging.info('Mergin hfams with common org/protein pairs')
-while row_count[0][0] != 0:
-	# Initiate variables
-	protein_list = list()
-	hfam_list = list()
-	protein_list_updated = list()
-	hfam_list_updated = list()
-	protein_missing = list()
-	hfam_missing = list()
-
-	# Get first duplicated protein
-	(column_names, dupl_protein) = executeQuery(cursor, "SELECT name FROM %s limit 1;" % dupl_table)
-
-	# Retrieve all hfams and org/prot pairs associated with the dupl proteins hfams
-	prot_hfam_query= """SELECT * FROM %s WHERE hfam IN (SELECT hfam FROM %s WHERE name = '%s')
-		GROUP BY hfam, name;""" %(dupl_table, dupl_table, dupl_protein[0][0])
-	(column_names, prot_hfam) = executeQuery(cursor, prot_hfam_query)
-
-	# Save newly found org/protein pairs and their hfams to lists
-	for entry in prot_hfam:
-		if entry[1] not in protein_list_updated:
-			protein_list_updated.append(entry[1])
-		if entry[0] not in hfam_list_updated:
-			hfam_list_updated.append(entry[0])
-	
-	# While a new protein is added find its hfams and the duplicated proteins that are in the hfams
-	while set(protein_list) != set(protein_list_updated):
-		missing_prots = list(set(protein_list_updated)-set(protein_list))
-		protein_list = protein_list_updated
-		hfam_list = hfam_list_updated
-
-		for element in missing_prots:
-			prot_hfam_query= """SELECT * FROM %s WHERE hfam IN (SELECT hfam FROM %s WHERE name = '%s')
-			GROUP BY hfam, name;""" %(dupl_table, dupl_table, element)
-			(column_names, prot_hfam) = executeQuery(cursor, prot_hfam_query)
-
-			for entry in prot_hfam:
-				if entry[1] not in protein_missing:
-					protein_missing.append(entry[1])
-				if entry[0] not in hfam_missing:
-					hfam_missing.append(entry[0])
-
-			protein_list_updated = set.union(set(protein_list_updated), set(protein_missing))
-			hfam_list_updated = set.union(set(hfam_list_updated), set(hfam_missing))
-	
-	protein_list = set.union(set(protein_list), set(protein_list_updated))
-	hfam_list =  set.union(set(hfam_list), set(hfam_list_updated))
+
 
 	#--------------------------------------------------------
-	# DUPLICATE DELETION
+	# SINGLE-LINK ALL HFAMS WITH DUPLICATED
+	# org_name/protein_id pair IN DUPLICATE TABLE
 	#--------------------------------------------------------
-	""" Deletion of proteins in dupl_table """
-	delete_prot_query = "DELETE FROM %s WHERE name IN ('%s');" %(dupl_table, "', '".join(protein_list))
-	executeQuery(cursor, delete_prot_query)
-	db.commit()
+	""" CHECK ROW COUNT """
+	db, cursor = connect_db(args)
+
+	(column_names, row_count) = executeQuery(cursor, "SELECT COUNT(*) FROM %s;" % dupl_table)
+	logging.info('There are %s duplications present in %s' %(row_count[0][0], homoTable))
+
+	logging.info('Mergin hfams with common org/protein pairs')
+	while row_count[0][0] != 0:
+		# Initiate variables
+		protein_list = list()
+		hfam_list = list()
+		protein_list_updated = list()
+		hfam_list_updated = list()
+		protein_missing = list()
+		hfam_missing = list()
+
+		# Get first duplicated protein
+		(column_names, dupl_protein) = executeQuery(cursor, "SELECT name FROM %s limit 1;" % dupl_table)
+
+		# Retrieve all hfams and org/prot pairs associated with the dupl proteins hfams
+		prot_hfam_query = duplicateHfamsQuery(dupl_table, dupl_protein[0][0])
+		(column_names, prot_hfam) = executeQuery(cursor, prot_hfam_query)
+
+		# Save newly found org/protein pairs and their hfams to lists
+		for entry in prot_hfam:
+			if entry[1] not in protein_list_updated:
+				protein_list_updated.append(entry[1])
+			if entry[0] not in hfam_list_updated:
+				hfam_list_updated.append(entry[0])
+
+		# While a new protein is added find its hfams and the duplicated proteins that are in the hfams
+		while set(protein_list) != set(protein_list_updated):
+			missing_prots = list(set(protein_list_updated)-set(protein_list))
+			protein_list = protein_list_updated
+			hfam_list = hfam_list_updated
+
+			for element in missing_prots:
+				prot_hfam_query = duplicateHfamsQuery(dupl_table, element)
+				(column_names, prot_hfam) = executeQuery(cursor, prot_hfam_query)
+
+				for entry in prot_hfam:
+					if entry[1] not in protein_missing:
+						protein_missing.append(entry[1])
+					if entry[0] not in hfam_missing:
+						hfam_missing.append(entry[0])
+
+				protein_list_updated = set.union(set(protein_list_updated), set(protein_missing))
+				hfam_list_updated = set.union(set(hfam_list_updated), set(hfam_missing))
+
+		protein_list = set.union(set(protein_list), set(protein_list_updated))
+		hfam_list =  set.union(set(hfam_list), set(hfam_list_updated))
+
+		#--------------------------------------------------------
+		# DUPLICATE DELETION
+		#--------------------------------------------------------
+		""" Deletion of proteins in dupl_table """
+		delete_prot_query = "DELETE FROM %s WHERE name IN ('%s');" %(dupl_table, "', '".join(protein_list))
+		executeQuery(cursor, delete_prot_query)
+		db.commit()
 
-	# Retrieve all members hfams in homoTable 
-	ALLprotsInHfams_query = "SELECT * FROM %s WHERE hfam in (%s) GROUP BY org_name, protein_id;" %(homoTable, ", ".join([str(i) for i in hfam_list]))
-	(column_names, ALLprotsInHfams) = executeQuery(cursor, ALLprotsInHfams_query)	
+		# Retrieve all members hfams in homoTable
+		ALLprotsInHfams_query = "SELECT * FROM %s WHERE hfam in (%s) GROUP BY org_name, protein_id;" %(homoTable, ", ".join([str(i) for i in hfam_list]))
+		(column_names, ALLprotsInHfams) = executeQuery(cursor, ALLprotsInHfams_query)
 
 
-	""" Deletion of hfams in homoTable """	
-	delete_prot_query = "DELETE FROM %s WHERE hfam IN (%s);" %(homoTable, ", ".join([str(i) for i in hfam_list]))
-	executeQuery(cursor, delete_prot_query)
-	db.commit()
-	
-	#--------------------------------------------------------
-	# CREATION OF NEW HFAMS
-	#--------------------------------------------------------
-	new_family_to_values2insert = list()
-	
-	for prot_member in list(ALLprotsInHfams):
-		# Append entries to existing cluster
-		values = (int(new_hfam), int(prot_member[1]), prot_member[2], int(prot_member[3]))
-		new_family_to_values2insert.append(values)
+		""" Deletion of hfams in homoTable """
+		delete_prot_query = "DELETE FROM %s WHERE hfam IN (%s);" %(homoTable, ", ".join([str(i) for i in hfam_list]))
+		executeQuery(cursor, delete_prot_query)
+		db.commit()
 
+		#--------------------------------------------------------
+		# CREATION OF NEW HFAMS
+		#--------------------------------------------------------
+		new_family_to_values2insert = list()
 
-	# Upload into table
-	try:
-		query =  "INSERT IGNORE INTO %s (hfam, org_id, org_name, protein_id) values(%s);" % (homoTable, ("%s," * len(new_family_to_values2insert[0])).rstrip(","))
-		
-		cursor.executemany(query, new_family_to_values2insert)
-		# Add changes to database
-	 	db.commit()	
-
-		new_family_to_values2insert = []	# Empty list of values
-	except mdb.Error, e:
-		print new_family_to_values2insert
-		logging.error('%s load %s %d: %s' % (homoTable, q_org, e.args[0],e.args[1]))
-		db.close()
-		sys.exit()
+		for prot_member in list(ALLprotsInHfams):
+			# Append entries to existing cluster
+			values = (int(new_hfam), int(prot_member[1]), prot_member[2], int(prot_member[3]))
+			new_family_to_values2insert.append(values)
+
+
+		# Upload into table
+		try:
+			query =  "INSERT IGNORE INTO %s (hfam, org_id, org_name, protein_id) values(%s);" % (homoTable, ("%s," * len(new_family_to_values2insert[0])).rstrip(","))
+
+			cursor.executemany(query, new_family_to_values2insert)
+			# Add changes to database
+			db.commit()
+
+			new_family_to_values2insert = []	# Empty list of values
+		except mdb.Error as e:
+			print(new_family_to_values2insert)
+			logging.error('%s load %d: %s' % (homoTable, e.args[0],e.args[1]))
+			db.close()
+			sys.exit()
+
+		#--------------------------------------------------------
+		# CHECKING ROW COUNTS
+		#--------------------------------------------------------
+		(column_names, row_count) = executeQuery(cursor, "SELECT COUNT(*) FROM %s;" % dupl_table)
+		new_hfam += 1
 
 	#--------------------------------------------------------
-	# CHECKING ROW COUNTS
+	# DELETE EMPTY DUPLICATION TABLE
 	#--------------------------------------------------------
-	(column_names, row_count) = executeQuery(cursor, "SELECT COUNT(*) FROM %s;" % dupl_table) 
-	new_hfam += 1
+	logging.info('Deleting duplication table: %s' %dupl_table)
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % dupl_table)
+	db.commit()
+	db.close()
+
+	return(new_hfam)
+
 
 #--------------------------------------------------------
-# DELETE EMPTY DUPLICATION TABLE
+# COMPACT HFAMS
 #--------------------------------------------------------
-logging.info('Deleting duplication table: %s' %dupl_table)
-executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % dupl_table)
-db.commit()
-db.close()
+def compactHfams(args):
+	"""
+	Renumbers the hfams of the homolog table to 1..N, keeping their order. The mapping is written to <homoTable>_hfam_map
+	(old_hfam, new_hfam), the renumbered rows are copied to a new table in one statement which then replaces the homolog table.
+	Returns N.
+	"""
+	homoTable = args.homotable
+	map_table = homoTable+"_hfam_map"
+	compact_table = homoTable+"_compact"
+	startTimet_compact = datetime.datetime.now()
+
+	db, cursor = connect_db(args)
+
+	""" MAPPING TABLE """
+	logging.info('Creating hfam mapping table: %s' %map_table)
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % map_table)
+	executeQuery(cursor, """CREATE TABLE %s (
+		`new_hfam` int(100) NOT NULL AUTO_INCREMENT,
+		`old_hfam` int(100) NOT NULL,
+		PRIMARY KEY (`new_hfam`),
+		UNIQUE KEY `i_old_hfam` (`old_hfam`)
+		) ENGINE=MyISAM DEFAULT CHARSET=latin1;""" % map_table)
+	# Auto increment numbers the hfams in the order of the SELECT. Replicated and Galera servers may step by more than 1,
+	# so the session is set to 1..N explicitly
+	executeQuery(cursor, "SET SESSION auto_increment_increment = 1, auto_increment_offset = 1;")
+	executeQuery(cursor, "INSERT INTO %s (old_hfam) SELECT DISTINCT hfam FROM %s ORDER BY hfam;" %(map_table, homoTable))
+	db.commit()
 
+	(column_names, counts) = executeQuery(cursor, "SELECT COUNT(*), MAX(old_hfam), MIN(new_hfam), MAX(new_hfam) FROM %s;" % map_table)
+	n_hfams, max_hfam, min_new, max_new = counts[0]
+	if n_hfams and (min_new != 1 or max_new != n_hfams):
+		db.close()
+		sys.exit("# ERROR: %s numbers %s hfams %s..%s instead of 1..%s, check auto_increment_increment" %(map_table, n_hfams, min_new, max_new, n_hfams))
+	if n_hfams == 0 or n_hfams == max_hfam:
+		logging.info('%s has %s hfams numbered 1..%s already' %(homoTable, n_hfams, n_hfams))
+		db.close()
+		return(n_hfams)
+
+	""" RENUMBER """
+	logging.info('Renumbering %s hfams (max hfam %s) in %s' %(n_hfams, max_hfam, homoTable))
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % compact_table)
+	executeQuery(cursor, "CREATE TABLE %s LIKE %s;" %(compact_table, homoTable))
+	executeQuery(cursor, """INSERT INTO %s (hfam, org_id, org_name, protein_id)
+		SELECT m.new_hfam, h.org_id, h.org_name, h.protein_id
+		FROM %s h
+		JOIN %s m ON (h.hfam = m.old_hfam)
+		ORDER BY m.new_hfam, h.org_name, h.protein_id;""" %(compact_table, homoTable, map_table))
+	db.commit()
 
-logging.info("----------------------------------------------------")
-logging.info('Deletion duplication time:%s' %str(datetime.datetime.now()-startTimet_4))
-logging.info("----------------------------------------------------")
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s_old;" % homoTable)
+	executeQuery(cursor, "RENAME TABLE %s TO %s_old, %s TO %s;" %(homoTable, homoTable, compact_table, homoTable))
+	executeQuery(cursor, "DROP TABLE %s_old;" % homoTable)
+	db.commit()
+	db.close()
 
+	logging.info('Finished compacting %s - runtime :%s' %(homoTable, str(datetime.datetime.now()-startTimet_compact)))
+	return(n_hfams)
 
-if not noipr:
+
+#--------------------------------------------------------
+# INTERPRO AND GO TABLES
+#--------------------------------------------------------
+""" PARTITIONING OF THE ANNOTATION TABLES """
+def annotationOptions(args, orgs):
+	if args.partition and orgs:
+		return tableOptions(args, orgs)
+	return ""
+
+def createIprTable(args, homoTable_orgs):
+	homoTable = args.homotable
 	startTimet_ipr = datetime.datetime.now()
 	ipr_table = homoTable+"_IPR"
 	logging.info("----------------------------------------------------")
@@ -753,28 +1331,18 @@ if not noipr:
 	logging.info("This may take some time")
 
 	""" DROP TABLE IF EXISTS """
-	db, cursor = connect_db(args, inspect.stack()[0][2])
+	db, cursor = connect_db(args)
 	if cursor.execute("SHOW TABLES LIKE '%s';" % ipr_table):
 		logging.warning('Deleting existing table: %s' %ipr_table)
 		executeQuery(cursor, "DROP TABLE %s;" % ipr_table)
 	db.commit()
 
 	logging.info('Creating Interpro table: %s' %ipr_table)
-	
+
 	""" CREATE TABLE """
-	ipr_query= """CREATE TABLE %s
-		SELECT hfam, org_id, org_name, protein_id, t1.ipr_id, ipr_desc
-		FROM
-		(SELECT hfam, hfam.org_id, hfam.org_name, hfam.protein_id, ipr_id 
-		FROM %s as hfam
-		LEFT JOIN protein_has_ipr as pip
-		ON (hfam.org_id = pip.org_id AND hfam.protein_id = pip.protein_id)
-		GROUP BY hfam, org_name, hfam.protein_id, ipr_id) t1
-		LEFT JOIN ipr
-		ON (t1.ipr_id = ipr.ipr_id)
-		GROUP BY hfam, org_name, protein_id, t1.ipr_id;""" %(ipr_table,homoTable)
+	ipr_query= "CREATE TABLE %s %s %s;" %(ipr_table, annotationOptions(args, homoTable_orgs), iprQuery(homoTable))
 
-	executeQuery(cursor, ipr_query) 
+	executeQuery(cursor, ipr_query)
 
 	""" INDEX """
 	if not cursor.execute("SHOW TABLES LIKE '%s';" % ipr_table):
@@ -794,7 +1362,7 @@ if not noipr:
 	db.close()
 
 	# Create warning if species are missing InterPro annotation
-	IPRtable_orgs = map(' '.join, IPRtable_orgs)
+	IPRtable_orgs = list(map(' '.join, IPRtable_orgs))
 	missing_orgs = list()
 	missing_orgs = list(set(homoTable_orgs)-set(IPRtable_orgs))
 	if len(missing_orgs) > 0:
@@ -805,8 +1373,8 @@ if not noipr:
 	logging.info('Finished %s - runtime :%s' %(ipr_table, str(datetime.datetime.now()-startTimet_ipr)))
 
 
-
-if not nogo:
+def createGoTable(args, homoTable_orgs):
+	homoTable = args.homotable
 	startTimet_go = datetime.datetime.now()
 	go_table = homoTable+"_GO"
 	logging.info("----------------------------------------------------")
@@ -815,28 +1383,18 @@ if not nogo:
 	logging.info("This may take some time")
 
 	""" DROP TABLE IF EXISTS """
-	db, cursor = connect_db(args, inspect.stack()[0][2])
+	db, cursor = connect_db(args)
 	if cursor.execute("SHOW TABLES LIKE '%s';" % go_table):
 		logging.warning('Deleting existing table: %s' %go_table)
 		executeQuery(cursor, "DROP TABLE %s;" % go_table)
 	db.commit()
 
 	logging.info('Creating GO table: %s' %go_table)
-	
+
 	""" CREATE TABLE """
-	go_query= """CREATE TABLE %s
-		SELECT hfam, org_id, org_name, protein_id, t1.go_term_id, go_name, go_termtype
-		FROM
-		(SELECT hfam, hfam.org_id, hfam.org_name, hfam.protein_id, go_term_id 
-		FROM %s as hfam
-		LEFT JOIN protein_has_go as pgo
-		ON (hfam.org_id = pgo.org_id AND hfam.protein_id = pgo.protein_id)
-		GROUP BY hfam, org_name, hfam.protein_id, go_term_id) t1
-		LEFT JOIN go
-		ON (t1.go_term_id = go.go_term_id)
-		GROUP BY hfam, org_name, protein_id, t1.go_term_id;""" %(go_table, homoTable)
+	go_query= "CREATE TABLE %s %s %s;" %(go_table, annotationOptions(args, homoTable_orgs), goQuery(homoTable))
 
-	executeQuery(cursor, go_query) 
+	executeQuery(cursor, go_query)
 
 	""" INDEX """
 	if not cursor.execute("SHOW TABLES LIKE '%s';" % go_table):
@@ -856,7 +1414,7 @@ if not nogo:
 	db.close()
 
 	# Create warning if species are missing InterPro annotation
-	GOtable_orgs = map(' '.join, GOtable_orgs)
+	GOtable_orgs = list(map(' '.join, GOtable_orgs))
 	missing_orgs = list()
 	missing_orgs = list(set(homoTable_orgs)-set(GOtable_orgs))
 	if len(missing_orgs) > 0:
@@ -865,8 +1423,252 @@ if not nogo:
 			logging.warning("%s" %morg)
 
 	logging.info('Finished %s - runtime :%s' %(go_table, str(datetime.datetime.now()-startTimet_go)))
-logging.info('--------------------------------------------------')
-logging.info("The program has finished - runtime %s" %str(datetime.datetime.now()-startTimet_1))
-logging.info('--------------------------------------------------')
 
-# sys.exit("Exit at line %s\nRuntime %s\n\n\n" %(currentframe().f_lineno, str(datetime.datetime.now()-startTimet_1)))
+
+#--------------------------------------------------------
+# GO ANCESTOR CLOSURE
+#--------------------------------------------------------
+""" READ THE GO DAG FROM AN OBO FILE """
+def parseObo(obo_file):
+	"""
+	Returns ({term: set(parents)}, {alt_id: term}) from the [Term] stanzas of an OBO file.
+	Parents are is_a and part_of relations, obsolete terms are left out.
+	"""
+	parents = dict()
+	alt_ids = dict()
+	term = None
+	stanza = None
+	with open(obo_file) as obo:
+		for line in obo:
+			line = line.strip()
+			if line.startswith("["):
+				if stanza is not None and not stanza["obsolete"]:
+					parents[stanza["id"]] = stanza["parents"]
+					for alt_id in stanza["alt_ids"]:
+						alt_ids[alt_id] = stanza["id"]
+				stanza = {"id": None, "parents": set(), "alt_ids": [], "obsolete": False} if line == "[Term]" else None
+				continue
+			if stanza is None or ":" not in line:
+				continue
+
+			key, value = line.split(":", 1)
+			value = value.split("!")[0].strip()
+			if key == "id":
+				stanza["id"] = value
+			elif key == "alt_id":
+				stanza["alt_ids"].append(value)
+			elif key == "is_a":
+				stanza["parents"].add(value.split()[0])
+			elif key == "relationship" and value.split()[0] == "part_of":
+				stanza["parents"].add(value.split()[1])
+			elif key == "is_obsolete" and value == "true":
+				stanza["obsolete"] = True
+	if stanza is not None and not stanza["obsolete"]:
+		parents[stanza["id"]] = stanza["parents"]
+		for alt_id in stanza["alt_ids"]:
+			alt_ids[alt_id] = stanza["id"]
+
+	return parents, alt_ids
+
+""" TRANSITIVE CLOSURE """
+def goAncestors(parents):
+	"""
+	Returns {term: {ancestor: distance}}, distance is the shortest number of edges. Every term is its own ancestor at distance 0.
+	"""
+	closure = dict()
+	def ancestors(term):
+		if term not in closure:
+			found = {term: 0}
+			for parent in parents[term]:
+				if parent not in parents:
+					continue
+				for ancestor, distance in ancestors(parent).items():
+					if ancestor not in found or distance + 1 < found[ancestor]:
+						found[ancestor] = distance + 1
+			closure[term] = found
+		return closure[term]
+
+	for term in parents:
+		ancestors(term)
+	return closure
+
+""" GO ID FORMAT OF protein_has_go """
+def goIdFormat(cursor):
+	"""
+	Returns a function converting GO:0017000 to the format of protein_has_go.go_term_id and the column type for it.
+	"""
+	(column_names, sample) = executeQuery(cursor, "SELECT go_term_id FROM protein_has_go WHERE go_term_id IS NOT NULL LIMIT 1;")
+	value = sample[0][0] if sample else "GO:"
+	if isinstance(value, numbers.Integral):
+		return (lambda term: int(term[3:])), "int(11)"
+	value = value.decode("ascii") if isinstance(value, bytes) else value
+	if value.startswith("GO:"):
+		return (lambda term: term), "varchar(12)"
+	return (lambda term: term[3:]), "varchar(12)"
+
+def createGoClosure(args):
+	"""
+	Builds the go_closure table (go_term_id, ancestor_id, distance) from the OBO file in args.goobo. It is filled
+	as go_closure_new and swapped in with RENAME TABLE.
+	"""
+	startTimet_closure = datetime.datetime.now()
+	closure_table = "go_closure"
+	new_table = closure_table + "_new"
+	logging.info("----------------------------------------------------")
+	logging.info('Creating GO closure table: %s' %closure_table)
+	logging.info("----------------------------------------------------")
+
+	(parents, alt_ids) = parseObo(args.goobo)
+	closure = goAncestors(parents)
+	for alt_id, term in alt_ids.items():
+		if alt_id not in closure:
+			closure[alt_id] = closure[term]
+	logging.info('%s GO terms, %s alternative ids' %(len(parents), len(alt_ids)))
+
+	db, cursor = connect_db(args)
+	(go_format, go_type) = goIdFormat(cursor)
+	executeQuery(cursor, "DROP TABLE IF EXISTS %s;" % new_table)
+	executeQuery(cursor, """CREATE TABLE %s (
+		`go_term_id` %s NOT NULL,
+		`ancestor_id` %s NOT NULL,
+		`distance` int(11) NOT NULL,
+		PRIMARY KEY (`go_term_id`,`ancestor_id`),
+		KEY `i_ancestor` (`ancestor_id`)
+		) ENGINE=MyISAM DEFAULT CHARSET=latin1;""" %(new_table, go_type, go_type))
+
+	query = "INSERT INTO %s (go_term_id, ancestor_id, distance) values(%%s,%%s,%%s);" % new_table
+	values2insert = list()
+	total_rows = 0
+	for term in sorted(closure):
+		for ancestor, distance in closure[term].items():
+			values2insert.append((go_format(term), go_format(ancestor), distance))
+		if len(values2insert) >= 5000:
+			cursor.executemany(query, values2insert)
+			total_rows += len(values2insert)
+			values2insert = list()
+	if values2insert:
+		cursor.executemany(query, values2insert)
+		total_rows += len(values2insert)
+	db.commit()
+	logging.info('Inserted %s term-ancestor pairs' % total_rows)
+
+	if cursor.execute("SHOW TABLES LIKE '%s';" % closure_table):
+		executeQuery(cursor, "DROP TABLE IF EXISTS %s_old;" % closure_table)
+		executeQuery(cursor, "RENAME TABLE %s TO %s_old, %s TO %s;" %(closure_table, closure_table, new_table, closure_table))
+		executeQuery(cursor, "DROP TABLE %s_old;" % closure_table)
+	else:
+		executeQuery(cursor, "RENAME TABLE %s TO %s;" %(new_table, closure_table))
+	db.commit()
+	db.close()
+
+	logging.info('Finished %s - runtime :%s' %(closure_table, str(datetime.datetime.now()-startTimet_closure)))
+
+def createGoFamTable(args):
+	"""
+	Builds <homoTable>_GO_fam (hfam, go_term_id, n) from the GO table and go_closure: every family gets all ancestors
+	of its GO terms, n is the number of its proteins annotated with the term or a descendant.
+	"""
+	homoTable = args.homotable
+	startTimet_gofam = datetime.datetime.now()
+	go_table = homoTable+"_GO"
+	gofam_table = homoTable+"_GO_fam"
+	logging.info("----------------------------------------------------")
+	logging.info('Creating GO family table: %s' %gofam_table)
+	logging.info("----------------------------------------------------")
+
+	db, cursor = connect_db(args)
+	if not cursor.execute("SHOW TABLES LIKE '%s';" % go_table):
+		logging.error("%s does not exist, %s is not created" %(go_table, gofam_table))
+		db.close()
+		return
+	if cursor.execute("SHOW TABLES LIKE '%s';" % gofam_table):
+		logging.warning('Deleting existing table: %s' %gofam_table)
+		executeQuery(cursor, "DROP TABLE %s;" % gofam_table)
+
+	executeQuery(cursor, """CREATE TABLE %s (
+		PRIMARY KEY (`go_term_id`,`hfam`),
+		KEY `i_hfam` (`hfam`)
+		) ENGINE=MyISAM DEFAULT CHARSET=latin1
+		SELECT g.hfam, c.ancestor_id AS go_term_id, COUNT(DISTINCT g.org_name, g.protein_id) AS n
+		FROM %s AS g
+		JOIN go_closure AS c
+		ON (g.go_term_id = c.go_term_id)
+		GROUP BY g.hfam, c.ancestor_id;""" %(gofam_table, go_table))
+	db.commit()
+	db.close()
+
+	logging.info('Finished %s - runtime :%s' %(gofam_table, str(datetime.datetime.now()-startTimet_gofam)))
+
+
+#--------------------------------------------------------
+# MAIN
+#--------------------------------------------------------
+def main(argv = None):
+	""" TIME """
+	startTimet_1 = datetime.datetime.now()
+
+	argv = sys.argv[1:] if argv is None else argv
+	args = parseArguments(argv)
+	setupOutput(args, [sys.argv[0]] + list(argv))
+
+	if args.explain or args.create_indexes:
+		checkIndexes(args, create = args.create_indexes)
+	if args.explain:
+		explainQueries(args)
+
+	# With -shadow all tables are built under <homotable>_shadow names and published at the end
+	liveArgs = args
+	if args.shadow:
+		args = prepareShadow(liveArgs)
+
+	(homoTable_orgs, missing_orgs, orgname_to_id, create_table, new_hfam) = findOrganisms(args)
+
+	if create_table:
+		createHomoTable(args, homoTable_orgs + missing_orgs)
+	elif args.partition:
+		ensurePartitions(args, args.homotable, homoTable_orgs + missing_orgs)
+
+	startTimet_3 = datetime.datetime.now()
+	new_hfam = linkFamilies(args, homoTable_orgs, missing_orgs, orgname_to_id, new_hfam)
+
+	logging.info("----------------------------------------------------")
+	logging.info('Total linking time: %s' %str(datetime.datetime.now()-startTimet_3))
+	logging.info("----------------------------------------------------")
+
+	startTimet_4 = datetime.datetime.now()
+	new_hfam = mergeDuplicates(args, new_hfam)
+
+	logging.info("----------------------------------------------------")
+	logging.info('Deletion duplication time:%s' %str(datetime.datetime.now()-startTimet_4))
+	logging.info("----------------------------------------------------")
+
+	# Suffixes of the tables built in this run, see publishShadow
+	built = [""]
+
+	if args.compact:
+		compactHfams(args)
+		built.append("_hfam_map")
+
+	if not args.noipr:
+		createIprTable(args, homoTable_orgs)
+		built.append("_IPR")
+
+	if not args.nogo:
+		createGoTable(args, homoTable_orgs)
+		built.append("_GO")
+
+	if args.goobo != "":
+		createGoClosure(args)
+		createGoFamTable(args)
+		built.append("_GO_fam")
+
+	if args.shadow:
+		publishShadow(liveArgs, args, built)
+
+	logging.info('--------------------------------------------------')
+	logging.info("The program has finished - runtime %s" %str(datetime.datetime.now()-startTimet_1))
+	logging.info('--------------------------------------------------')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,6 @@
+"""
+Secondary metabolism pipeline of AspMine (see smPipeline.py) and the modules it is built from.
+
+Installed with the secmet, secmet-check and secmet-seq commands. Without installing, run main.py from the
+secMet directory, or a module with python3 -m aspmine.<module> from there.
+"""
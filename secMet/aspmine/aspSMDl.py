@@ -0,0 +1,126 @@
+"""
+Download info on secondary metabolic gene clusters using jgi codes.
+"""
+
+
+import os
+import csv
+import sys
+import pickle
+import hashlib
+import pandas as pd
+from .bioSlim3 import dbFetch, dbwHeader, dbChunks, cachePath, normalizeQuery, queryVersions
+
+
+# Column types of the downloaded frames. Ids are int32, repeated names are categorical.
+# gff coordinates come from a LEFT JOIN and can be missing, hence the nullable integer type.
+smurfGffTypes = {
+    "org_id": "int32", "name": "category", "genus": "category", "real_name": "category", "section": "category",
+    "protein_id": "int32", "sm_short": "category", "cluster_id": "category", "clust_size": "int32",
+    "gff_start": "Int32", "gff_end": "Int32", "gff_strand": "category"}
+
+iprTypes = {
+    "org_id": "int32", "protein_id": "int32", "ipr_desc": "object", "ipr_domaindesc": "object",
+    "ipr_domaindb": "category"}
+
+
+def typedFrame(query, dtypes, chunkSize = 50000, cache = True):
+    """
+    Streams a query in chunks and builds one DataFrame with the given dtypes.
+    Each chunk is converted right away, so the untyped rows of only one chunk are held in memory.
+    The frame is cached in the local cache directory and reused as long as the table versions of the query
+    (bioSlim3.queryVersions, row checksums of the queried organisms where update times are missing) are unchanged.
+    """
+    versions = queryVersions(query) if cache else None
+    if versions is not None:
+        key = normalizeQuery(query) + repr(sorted(dtypes.items()))
+        entryFile = cachePath("frames", hashlib.sha1(key.encode("UTF-8")).hexdigest() + ".pkl")
+        if os.path.isfile(entryFile):
+            try:
+                with open(entryFile, "rb") as entry:
+                    entry = pickle.load(entry)
+                if entry["key"] == key and entry["versions"] == versions:
+                    print("Number of rows (cached):")
+                    print(len(entry["frame"]))
+                    return(entry["frame"])
+            except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+                pass
+
+    frame = streamFrame(query, dtypes, chunkSize)
+
+    if versions is not None:
+        with open(entryFile + ".tmp", "wb") as out:
+            pickle.dump({"key": key, "versions": versions, "frame": frame}, out, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(entryFile + ".tmp", entryFile)
+
+    return(frame)
+
+
+def streamFrame(query, dtypes, chunkSize):
+    """
+    Builds the frame of typedFrame from the streamed chunks of the query.
+    """
+    frames = []
+    for fields, rows in dbChunks(query, chunkSize):
+        frames.append(pd.DataFrame.from_records(rows, columns = fields).astype(dtypes))
+
+    if not frames:
+        return(pd.DataFrame({col: pd.Series(dtype = dtype) for col, dtype in dtypes.items()}))
+
+    # Chunks have their own categories, unify them so concat keeps the categorical dtype
+    for col, dtype in dtypes.items():
+        if dtype == "category":
+            categories = frames[0][col].cat.categories.append([frame[col].cat.categories for frame in frames[1:]]).unique()
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+
+    print("Number of rows:")
+    print(sum(len(frame) for frame in frames))
+
+    return(pd.concat(frames, ignore_index = True))
+
+
+def dlSMdata(orgSet, chunkSize = 50000):
+    """
+    Download smurf gff and interpro data and combine them.
+    orgSet has to be a list of jgi names.
+    All subqueries are restricted to the org_ids of orgSet and results are streamed in chunks of chunkSize rows.
+    The frames are cached per query and reused while the rows of these organisms are unchanged, see typedFrame.
+    """
+    orgIds = [str(org_id) for org_id, in dbFetch("SELECT org_id FROM organism WHERE name IN ('%s');" % "','".join(orgSet))]
+
+    if not orgIds:
+        raise ValueError("None of the organisms in orgSet were found in the organism table")
+
+    print("Combining smurf, gff and organism data")
+    query = """
+    SELECT org.org_id, org.name, org.genus, org.real_name, org.section,
+    smurf.sm_protein_id AS protein_id, smurf.sm_short, CONCAT(smurf.org_id, '_', smurf.clust_backbone, '_', smurf.clust_size) AS cluster_id, smurf.clust_size,
+    gff_prot.gff_start, gff_prot.gff_end, gff_prot.gff_strand
+    FROM smurf
+    LEFT JOIN (SELECT MIN(gff.gff_start) AS gff_start, MAX(gff.gff_end) AS gff_end, gff.org_id, gff.gff_protein_id, gff.gff_strand, gff.gff_seqorigin FROM gff WHERE gff.org_id IN (%s) GROUP BY gff.org_id, gff.gff_protein_id) AS gff_prot ON
+    smurf.org_id = gff_prot.org_id AND smurf.sm_protein_id = gff_prot.gff_protein_id
+    JOIN organism AS org ON smurf.org_id = org.org_id
+    WHERE smurf.org_id IN (%s);
+    """ % (",".join(orgIds), ",".join(orgIds))
+
+    smurf = typedFrame(query, smurfGffTypes, chunkSize)
+
+    print("Downloading interpro annotations")
+
+    query = """
+    SELECT phi.org_id, phi.protein_id,
+    GROUP_CONCAT(DISTINCT ipr.ipr_desc ORDER BY phi.ipr_domain_start SEPARATOR ',') AS ipr_desc ,
+    GROUP_CONCAT(DISTINCT ipr.ipr_domaindesc ORDER BY phi.ipr_domain_start SEPARATOR ',') AS ipr_domaindesc , ipr.ipr_domaindb
+    FROM protein_has_ipr AS phi
+    JOIN ipr ON phi.ipr_id = ipr.ipr_id AND phi.ipr_domaindb = 'HMMPfam' AND phi.ipr_domaindb = ipr.ipr_domaindb
+    WHERE phi.org_id IN (%s)
+    GROUP BY phi.org_id, phi.protein_id;
+    """ % ",".join(orgIds)
+
+    ipr = typedFrame(query, iprTypes, chunkSize)
+
+    print("Merging data")
+    smIpr = pd.merge(smurf, ipr,  how='left', left_on=['org_id','protein_id'], right_on = ['org_id','protein_id'])
+
+    return(smIpr)
@@ -0,0 +1,596 @@
+import os
+import re
+import csv
+import sys
+import gzip
+import mmap
+import struct
+import pickle
+import bisect
+import hashlib
+from . import misc
+
+# Array based classes live in domains.py and are loaded on first use, so importing bioSlim3 does not load numpy and pandas.
+# config is read from config.txt on first use as well, see misc.getConfig.
+domainNames = {"DomainIntervals", "SmProteinSet", "mergeIntervalArrays", "domainSequences", "readIprIntervals", "iprColumns"}
+
+
+def __getattr__(name):
+	if name in domainNames:
+		from . import domains
+		return(getattr(domains, name))
+	if name == "config":
+		return(misc.getConfig())
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+
+def flatl(l):
+	"""
+	Flattening lists made easy!
+	Or unpacking tuples made easy!
+	Try:
+	a = ['a','b',[1,2,3,4]]
+	print flatl(a)
+	"""
+	return([item for subl in l for item in subl])
+
+
+def read_fasta(ff):
+	"""
+	seqDict = {}
+	with open('/home/seth/domainPhylogeny/fastaFiles/hybridsOnlypubData.fasta') as ff:
+	for name, seq in read_fasta(ff):
+	seqDict[name] = seq
+	"""
+	name, seq = None, []
+	for line in ff:
+		line = line.rstrip()
+		if line.startswith(">"):
+			if name: yield (name, ''.join(seq))
+			name, seq = line[1:], []
+		else:
+			seq.append(line)
+	if name: yield (name, ''.join(seq))
+
+
+def cleanProtSeq(seq):
+	if '*' in seq:
+		seq = seq.replace('*','x')
+	if seq.endswith('x'):
+		seq = seq[:-1]
+
+	return seq
+
+def writeFasta(records, fileName, maxChars = 80, compress = False, clean = False):
+	"""
+	Writes (name, seq) tuples from any iterable (e.g. a generator) to a fasta file, one buffered write per record.
+	compress writes gzip, clean passes sequences through cleanProtSeq.
+	The file is written under a temporary name and moved in place when complete. Returns the number of records.
+	"""
+	tmpName = fileName + ".tmp"
+	outfile = gzip.open(tmpName, 'wt', compresslevel = 6) if compress else open(tmpName, 'w', buffering = 1 << 20)
+	counter = 0
+
+	with outfile:
+		for (key, seq) in records:
+			if clean:
+				seq = cleanProtSeq(seq)
+			lines = [seq[i:i+maxChars] for i in range(0, len(seq), maxChars)]
+			outfile.write('>%s\n%s\n' % (key, '\n'.join(lines)) if lines else '>%s\n' % key)
+			counter += 1
+	os.replace(tmpName, fileName)
+	return(counter)
+
+def tupleToFasta(db, fileName, maxChars = 80):
+	"""
+	Provide an iterable of (identifier, sequence) tuples to write it to a fasta file
+	"""
+	return(writeFasta(db, fileName, maxChars, clean = True))
+
+def dictToFasta(db, fileName, maxChars = 80):
+	"""
+	Provide a simple dictionary with identifier as key and sequence as value to write it to
+	a fasta file
+	"""
+	return(writeFasta(db.items(), fileName, maxChars))
+
+
+class IndexedFasta:
+	"""
+	Random access to the sequences of a FASTA file, e.g.
+	with IndexedFasta("smurf.fasta") as fasta:
+		seq = fasta.fetch("1234_56789")
+		seqs = fasta.fetchMany(names)
+
+	A faidx style index (name, length, offset, bases per line, bytes per line) is written to <file>.fai
+	the first time, or when the FASTA is newer than the index. Records are named by the first word of their header
+	and all lines of a record but the last must have the same length.
+	Plain files are memory mapped. Gzip compressed files have to be BGZF (bgzip), their block offsets are kept in <file>.gzi.
+	A BGZF file shares one reader, so an instance should not be used from several threads.
+	"""
+
+	def __init__(self, fileName, rebuild = False):
+		self.fileName = fileName
+		self.faiFile = fileName + ".fai"
+		self.gziFile = fileName + ".gzi"
+		self.bgzf = isBgzf(fileName)
+
+		indexFiles = [self.faiFile, self.gziFile] if self.bgzf else [self.faiFile]
+		if rebuild or not all(os.path.isfile(f) and os.path.getmtime(f) >= os.path.getmtime(fileName) for f in indexFiles):
+			self.buildIndex()
+		self.readIndex()
+
+		if self.bgzf:
+			from Bio import bgzf
+			self.reader = bgzf.BgzfReader(fileName, "rb")
+		else:
+			self.handle = open(fileName, "rb")
+			self.data = mmap.mmap(self.handle.fileno(), 0, access = mmap.ACCESS_READ) if os.path.getsize(fileName) else b""
+
+	def buildIndex(self):
+		print("Indexing %s" % self.fileName)
+		if self.bgzf:
+			from Bio import bgzf
+			with open(self.fileName, "rb") as raw:
+				blocks = [(start, dataStart) for start, rawLength, dataStart, dataLength in bgzf.BgzfBlocks(raw)]
+			# Same layout as the .gzi files of bgzip: number of blocks, then (compressed, uncompressed) offsets, first block left out
+			with open(self.gziFile + ".tmp", "wb") as gzi:
+				gzi.write(struct.pack("<Q", len(blocks) - 1))
+				for block in blocks[1:]:
+					gzi.write(struct.pack("<QQ", *block))
+			os.replace(self.gziFile + ".tmp", self.gziFile)
+			handle = bgzf.BgzfReader(self.fileName, "rb")
+		else:
+			handle = open(self.fileName, "rb")
+
+		entries = []
+		names = set()
+		offset = 0
+		record = None
+		with handle:
+			for line in handle:
+				if line.startswith(b">"):
+					if record:
+						entries.append(record[:5])
+					name = line[1:].split()[0].decode("UTF-8") if line[1:].strip() else ""
+					if name in names:
+						raise ValueError("%s: sequence name %s is not unique" % (self.fileName, name))
+					names.add(name)
+					# name, length, offset, bases per line, bytes per line, last line seen
+					record = [name, 0, offset + len(line), 0, 0, False]
+				elif record:
+					bases = len(line.rstrip(b"\r\n"))
+					if bases and record[5]:
+						raise ValueError("%s: lines of %s have different lengths, rewrite the file with tupleToFasta" % (self.fileName, record[0]))
+					if not record[3]:
+						record[3], record[4] = bases, len(line)
+					elif bases > record[3] or len(line) - bases != record[4] - record[3]:
+						raise ValueError("%s: lines of %s have different lengths, rewrite the file with tupleToFasta" % (self.fileName, record[0]))
+					record[5] = bases < record[3]
+					record[1] += bases
+				offset += len(line)
+			if record:
+				entries.append(record[:5])
+
+		with open(self.faiFile + ".tmp", "w") as fai:
+			for entry in entries:
+				fai.write("\t".join(map(str, entry)) + "\n")
+		os.replace(self.faiFile + ".tmp", self.faiFile)
+
+	def readIndex(self):
+		self.index = {}
+		with open(self.faiFile) as fai:
+			for line in fai:
+				name, length, offset, lineBases, lineWidth = line.rstrip("\n").split("\t")[:5]
+				self.index[name] = (int(length), int(offset), int(lineBases), int(lineWidth))
+
+		if self.bgzf:
+			with open(self.gziFile, "rb") as gzi:
+				count, = struct.unpack("<Q", gzi.read(8))
+				blocks = [(0, 0)] + list(struct.iter_unpack("<QQ", gzi.read(16 * count)))
+			self.blockStarts = [start for start, dataStart in blocks]
+			self.blockDataStarts = [dataStart for start, dataStart in blocks]
+
+	def readBytes(self, start, end):
+		"""
+		Bytes start to end of the uncompressed file.
+		"""
+		if not self.bgzf:
+			return(self.data[start:end])
+
+		from Bio import bgzf
+		block = bisect.bisect_right(self.blockDataStarts, start) - 1
+		self.reader.seek(bgzf.make_virtual_offset(self.blockStarts[block], start - self.blockDataStarts[block]))
+		return(self.reader.read(end - start))
+
+	def fetch(self, name, start = 0, end = None):
+		"""
+		Sequence of name, or its positions start to end (0 based, end excluded). Raises KeyError for unknown names.
+		"""
+		length, offset, lineBases, lineWidth = self.index[name]
+		start = max(start, 0)
+		end = length if end is None else min(end, length)
+		if start >= end:
+			return("")
+
+		first = offset + (start // lineBases) * lineWidth + start % lineBases
+		last = offset + ((end - 1) // lineBases) * lineWidth + (end - 1) % lineBases + 1
+		return(self.readBytes(first, last).translate(None, b"\r\n").decode("ascii"))
+
+	def fetchMany(self, names):
+		"""
+		Returns {name: sequence} for a list of names. Sequences are read in file order, names missing from the file are left out.
+		"""
+		found = sorted((name for name in set(names) if name in self.index), key = lambda name: self.index[name][1])
+		seqs = {name: self.fetch(name) for name in found}
+		return({name: seqs[name] for name in names if name in seqs})
+
+	def length(self, name):
+		return(self.index[name][0])
+
+	def keys(self):
+		return(self.index.keys())
+
+	def __getitem__(self, name):
+		return(self.fetch(name))
+
+	def __contains__(self, name):
+		return(name in self.index)
+
+	def __len__(self):
+		return(len(self.index))
+
+	def __iter__(self):
+		return(iter(self.index))
+
+	def close(self):
+		if self.bgzf:
+			self.reader.close()
+		else:
+			if self.data:
+				self.data.close()
+			self.handle.close()
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def isBgzf(fileName):
+	"""
+	True for BGZF files, False for uncompressed files. Raises ValueError for gzip files which are not BGZF,
+	as those cannot be read at random positions.
+	"""
+	with open(fileName, "rb") as f:
+		header = f.read(18)
+	if header[:2] != b"\x1f\x8b":
+		return(False)
+	if header[3:4] == b"\x04" and header[12:14] == b"BC":
+		return(True)
+	raise ValueError("%s is gzip compressed but not BGZF, compress it with bgzip for indexed access" % fileName)
+
+
+
+def cachePath(*parts):
+	"""
+	Path of a file in the local cache directory (config key cacheDir, default ~/.aspmineCache).
+	Parent directories are created.
+	"""
+	base = misc.getConfig().get('cacheDir', os.path.join(os.path.expanduser("~"), ".aspmineCache"))
+	path = os.path.join(base, *parts)
+	os.makedirs(os.path.dirname(path), exist_ok = True)
+	return(path)
+
+
+# Table references of a query, used to invalidate its cached result.
+# String literals are blanked before parsing, so a quoted "from" can not be taken for a table.
+literalPattern = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+tableListPattern = re.compile(r"\b(?:FROM|JOIN|STRAIGHT_JOIN)\b", re.IGNORECASE)
+refTokenPattern = re.compile(r"`[^`]*`|\w+|\S")
+tableRefPattern = re.compile(r"`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?", re.IGNORECASE)
+refEndWords = {"WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "ON", "USING", "UNION", "WINDOW", "FOR", "LOCK", "INTO",
+	"JOIN", "STRAIGHT_JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "FULL", "OUTER"}
+
+
+def tableRefs(query, start):
+	"""
+	Splits the table list that starts at position start into its comma separated references.
+	The list ends at a clause keyword, a join or the closing parenthesis of a subquery.
+	"""
+	refs, depth, refStart, end = [], 0, start, len(query)
+	for token in refTokenPattern.finditer(query, start):
+		word = token.group()
+		if word == "(":
+			depth += 1
+		elif word == ")":
+			if depth == 0:
+				end = token.start()
+				break
+			depth -= 1
+		elif depth == 0 and word == ",":
+			refs.append(query[refStart:token.start()])
+			refStart = token.end()
+		elif depth == 0 and word.upper() in refEndWords:
+			end = token.start()
+			break
+	refs.append(query[refStart:end])
+	return([ref.strip() for ref in refs])
+
+
+def queryTables(query):
+	"""
+	Returns {table: names} for every table a SELECT reads from, names being the table name and its aliases.
+	All comma separated tables after FROM and the table of every JOIN are found. Derived tables are covered by the FROM
+	of their subquery. Returns None if a reference can not be parsed (another schema, index hints, partitions, ...),
+	so the result of such a query is not cached.
+	"""
+	query = literalPattern.sub("''", query)
+	tables = {}
+	for match in tableListPattern.finditer(query):
+		for ref in tableRefs(query, match.end()):
+			if ref.startswith("("):
+				if not re.match(r"\(\s*SELECT\b", ref, re.IGNORECASE):
+					return(None)
+				continue
+			parsed = tableRefPattern.fullmatch(ref)
+			if not parsed:
+				return(None)
+			table, alias = parsed.groups()
+			tables.setdefault(table, {table}).add(alias or table)
+	return(tables or None)
+
+
+def restrictedOrgs(query, names, single):
+	"""
+	org_ids a table of the query is restricted to by an org_id IN (...) list, qualified by one of the names of the
+	table (or unqualified if it is the only table). Returns None if there is no such list, or if the query has an OR
+	that could lift it.
+	"""
+	if re.search(r"\bOR\b", literalPattern.sub("''", query), re.IGNORECASE):
+		return(None)
+	qualifier = r"(?<![\w.])(?:%s)\." % "|".join(re.escape(name) for name in names)
+	if single:
+		qualifier = r"(?:%s|(?<![\w.]))" % qualifier
+	lists = re.findall(r"%sorg_id\s+IN\s*\(([\d\s,']*)\)" % qualifier, query, re.IGNORECASE)
+	if not lists:
+		return(None)
+	return(sorted(set(org_id for ids in lists for org_id in re.findall(r"\d+", ids)), key = int))
+
+
+def tableChecksum(cursor, table, org_ids = None):
+	"""
+	Row count and sum of the CRC32s of all rows of a table, computed on the server like the organism fingerprints of
+	smServerSide. Restricted to org_ids if given and the table has an org_id column.
+	"""
+	cursor.execute("""SELECT COLUMN_NAME FROM information_schema.COLUMNS
+	WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION""", (table,))
+	columns = [column for column, in cursor.fetchall()]
+	row = "CONCAT_WS('#', %s)" % ", ".join("IFNULL(`%s`, '\\\\N')" % column for column in columns)
+
+	where, label = "", "all"
+	if org_ids is not None and "org_id" in columns:
+		where, label = " WHERE org_id IN (%s)" % ",".join(org_ids), ",".join(org_ids)
+	cursor.execute("SELECT COUNT(*), SUM(CRC32(%s)) FROM `%s`%s" % (row, table, where))
+	count, checksum = cursor.fetchone()
+	return("checksum:%s:%s:%s" % (label, count, checksum))
+
+
+def normalizeQuery(query):
+	"""
+	Collapses whitespace and trailing semicolons so reformatted queries share a cache entry.
+	"""
+	return(" ".join(query.split()).rstrip(";").strip())
+
+
+def queryCacheEnabled():
+	return(misc.getConfig().get('queryCache', 'on').lower() not in ('off', 'no', 'false', '0'))
+
+
+def tableVersions(cursor, query):
+	"""
+	Returns {table: version} for every table in the query, or None if the tables could not be resolved.
+	The version is the update time of the table. Tables without one (InnoDB on MySQL 5.6, or after a restart on later
+	versions) get a row checksum instead, restricted to the organisms of the query where it has an org_id IN list,
+	so only those rows are read on the server and nothing is sent to the client.
+	"""
+	refs = queryTables(query)
+	if not refs:
+		return(None)
+	tables = sorted(refs)
+
+	cursor.execute("""SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES
+	WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN (%s)""" % ",".join(["%s"] * len(tables)), tables)
+	updateTimes = dict(cursor.fetchall())
+
+	if set(updateTimes) != set(tables):
+		return(None)
+
+	versions = {}
+	for table in tables:
+		if updateTimes[table] is not None:
+			versions[table] = "updated:%s" % updateTimes[table].isoformat()
+		else:
+			versions[table] = tableChecksum(cursor, table, restrictedOrgs(query, refs[table], len(tables) == 1))
+	return(versions)
+
+
+def queryVersions(query):
+	"""
+	tableVersions of a query on a connection of its own, for callers that cache results themselves (see aspSMDl).
+	Returns None if the result of the query can not be cached.
+	"""
+	query = normalizeQuery(query)
+	if not (queryCacheEnabled() and query.lower().startswith("select")):
+		return(None)
+	db = dbConnect()
+	try:
+		return(tableVersions(db.cursor(), query))
+	finally:
+		db.close()
+
+
+def dbConnect(streaming = False):
+	"""
+	Connection to the database of config.txt. MySQLdb is imported here, so modules using bioSlim3 start without it.
+	streaming uses a server side cursor.
+	"""
+	import MySQLdb
+	config = misc.getConfig()
+	options = {}
+	if streaming:
+		from MySQLdb.cursors import SSCursor
+		options['cursorclass'] = SSCursor
+	return(MySQLdb.connect(host=config['host'], user=config['user'], passwd=config['passwd'], db=config['db'], **options))
+
+
+def cachedQuery(query, cache = True):
+	"""
+	Runs a query and returns (field_names, rows).
+	SELECT results are stored column-wise in the local cache directory, keyed by the normalized query text,
+	and served from there as long as the version of every table in the query (see tableVersions) is unchanged.
+	"""
+	query = normalizeQuery(query)
+	cache = cache and queryCacheEnabled() and query.lower().startswith("select")
+
+	db = dbConnect()
+	try:
+		cursor = db.cursor()
+
+		if cache:
+			versions = tableVersions(cursor, query)
+			entryFile = cachePath("queries", hashlib.sha1(query.encode("UTF-8")).hexdigest() + ".pkl")
+
+			if versions is not None and os.path.isfile(entryFile):
+				try:
+					with open(entryFile, "rb") as entry:
+						entry = pickle.load(entry)
+					if entry["query"] == query and entry["versions"] == versions:
+						return(entry["fields"], list(zip(*entry["columns"])) if entry["rows"] else [])
+				except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+					pass
+
+		cursor.execute(query)
+		field_names = tuple([i[0] for i in cursor.description])
+		data = list(cursor.fetchall())
+	finally:
+		db.close()
+
+	if cache and versions is not None:
+		entry = {"query": query, "versions": versions, "fields": field_names, "rows": len(data), "columns": list(zip(*data))}
+		with open(entryFile + ".tmp", "wb") as out:
+			pickle.dump(entry, out, protocol = pickle.HIGHEST_PROTOCOL)
+		os.replace(entryFile + ".tmp", entryFile)
+
+	return(field_names, data)
+
+
+def dbFetch(query, cache = True):
+	field_names, data = cachedQuery(query, cache)
+	return(data)
+# Why doesnt this work?
+
+def dbwHeader(query, cache = True):
+	field_names, data = cachedQuery(query, cache)
+	print("Mysql query yielded info on")
+	print(field_names)
+	print("Number of rows:")
+	print(len(data))
+	return([field_names, data])
+
+
+def dbChunks(query, chunkSize = 50000):
+	"""
+	Streams the result of a query with a server side cursor.
+	Yields (field_names, rows) for every chunk of up to chunkSize rows, so large results never sit in memory at once.
+	Streamed results are not cached here, callers can cache what they build from them under queryVersions.
+	"""
+	db = dbConnect(streaming = True)
+	try:
+		cursor = db.cursor()
+		cursor.execute(query)
+		field_names = tuple([i[0] for i in cursor.description])
+		while True:
+			rows = cursor.fetchmany(chunkSize)
+			if not rows:
+				break
+			yield (field_names, rows)
+		cursor.close()
+	finally:
+		db.close()
+
+
+def iprFileReader(iprFile):
+	from .domains import readIprIntervals
+	print("Reading interpro file")
+	return(readIprIntervals(iprFile).toDict())
+
+
+
+def proteinDl(orgs):
+    """
+    Downloads all secondary metabolite proteins (the ones like, e.g. PKS, NRPS, etc.) for a list of organisms (jgi names).
+    Sequences are read from the local protein store, which is filled for organisms that are not in it yet.
+    Returns (name, org_id, protein_id, sm_short, seq) tuples.
+    """
+    from .proteinStore import ProteinStore
+    print("Downloading secondary metabolite proteins")
+
+    proteins = dbFetch("""
+    SELECT torg.name, torg.org_id, sp.sm_protein_id, sp.sm_short FROM (SELECT * FROM organism WHERE name IN ('%s')) torg
+    JOIN smurf_papa AS sp ON torg.org_id = sp.org_id AND sp.sm_short != 'none';
+    """ % "','".join(orgs) )
+
+    with ProteinStore() as store:
+        store.ensure(set(org_id for org, org_id, protein_id, sm_short in proteins))
+        seqs = store.fetch([(org_id, protein_id) for org, org_id, protein_id, sm_short in proteins])
+
+    proteins = [(org, org_id, protein_id, sm_short, cleanProtSeq(seqs[(org_id, protein_id)])) for org, org_id, protein_id, sm_short in proteins
+        if (org_id, protein_id) in seqs]
+
+    return(proteins)
+
+
+class smProt:
+	'Class for secondary metabolite associated proteins'
+
+	def __init__(self, name):
+	  self.name = name
+
+	def setSeq(self, seq):
+		try:
+			isinstance(seq, str)
+			self.seq = seq
+		except Exception:
+			print("Error, sequence must be string")
+
+	def setDomains(self, domains, minSize = 100, distance = 100):
+		from .domains import mergeIntervalArrays
+		try:
+			starts, ends = zip(*domains) if domains else ((), ())
+			# Joining domains together and only taking domains over minSize
+			offsets, starts, ends = mergeIntervalArrays([0, len(starts)], starts, ends, distance = distance, minSize = minSize)
+			self.domains = list(zip(starts.tolist(), ends.tolist()))
+		except (TypeError, ValueError):
+			print ("Error: Domains must be formatted as list")
+
+	def fullSeq(self):
+		return self.seq
+
+	def getDomains(self):
+		return self.domains
+
+	def getDomainList(self):
+		return [[self.name] + list(d) for d in self.domains]
+
+	def getDomSeqs(self):
+		l = [ ]
+		for start, end in self.domains:
+			dseq = self.seq[start-1:end]
+			l.append(dseq)
+		return(l)
+
+	def displayProtein(self):
+		return "Name : ", self.name,  ", Domains: ", self.domains, ", Sequence Length: ", len(self.seq)
@@ -0,0 +1,101 @@
+"""
+Sharded BLAST runs.
+
+runBlast splits the query FASTA into shards of about the same residue count, keeping the order of the queries.
+Every shard is searched by its own single threaded BLAST process, with up to `processes` of them running at the same time.
+Failed shards are retried, the tabular outputs are concatenated in shard order, so the result has the same order as a single run.
+
+Example:
+runBlast("mibigDb.fasta", "smurf.fasta", "mibigVsSmurf.txt",
+	args = ["-max_target_seqs", "25", "-evalue", "1e-50", "-outfmt", "6 std qlen slen"])
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import bioSlim3 as bio
+
+
+def shardFasta(queryFasta, nShards, shardDir):
+	"""
+	Writes the records of queryFasta to at most nShards files in shardDir. Shards are consecutive runs of records
+	with about the same number of residues. Returns the list of shard files.
+	"""
+	with open(queryFasta) as ff:
+		lengths = [len(seq) for name, seq in bio.read_fasta(ff)]
+
+	if not lengths:
+		return([])
+
+	nShards = max(1, min(nShards, len(lengths)))
+	total = sum(lengths)
+
+	shards = []
+	out = None
+	residues = 0
+	with open(queryFasta) as ff:
+		for (name, seq), length in zip(bio.read_fasta(ff), lengths):
+			# Starting the next shard once this one has its share of residues
+			if out is None or (residues >= total * len(shards) / nShards and len(shards) < nShards):
+				if out is not None:
+					out.close()
+				shards.append(os.path.join(shardDir, "shard_%04d.fasta" % len(shards)))
+				out = open(shards[-1], "w")
+			out.write(">%s\n%s\n" % (name, seq))
+			residues += length
+	out.close()
+
+	return(shards)
+
+
+def runShard(cmd, shardOut, retries):
+	"""
+	Runs one BLAST process, retrying it up to retries times. Raises RuntimeError if all attempts failed.
+	"""
+	for attempt in range(retries + 1):
+		result = subprocess.run(cmd, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+		if result.returncode == 0 and os.path.isfile(shardOut):
+			return(shardOut)
+		print("BLAST failed on %s (attempt %s of %s): %s" % (os.path.basename(shardOut), attempt + 1, retries + 1, result.stderr.strip()))
+	raise RuntimeError("BLAST failed on %s after %s attempts" % (shardOut, retries + 1))
+
+
+def runBlast(query, db, out, program = None, args = (), processes = None, shards = None, retries = 2, workDir = None):
+	"""
+	Runs program (default blastpPath from config.txt) for query against db and writes the tabular output to out.
+	args are passed to every BLAST process, e.g. ["-evalue", "1e-50", "-outfmt", "6 std qlen slen"].
+	The query is split into shards (default one per process) that run as up to processes (default: number of cores)
+	concurrent BLAST processes. Shard files are kept in a temporary directory next to out, which is removed when the run ends,
+	also if a shard fails.
+	"""
+	program = program or bio.config['blastpPath']
+	processes = processes or os.cpu_count() or 1
+	shards = shards or processes
+
+	workDir = tempfile.mkdtemp(prefix = "blastShards_", dir = workDir or os.path.dirname(os.path.abspath(out)))
+
+	try:
+		shardFiles = shardFasta(query, shards, workDir)
+		print("Running %s on %s query shards with %s processes" % (os.path.basename(program), len(shardFiles), processes))
+
+		jobs = []
+		for shardFile in shardFiles:
+			shardOut = shardFile.replace(".fasta", ".out")
+			cmd = [program, "-query", shardFile, "-db", db, "-out", shardOut] + list(args)
+			jobs.append((cmd, shardOut))
+
+		with ThreadPoolExecutor(max_workers = processes) as pool:
+			shardOuts = list(pool.map(lambda job: runShard(job[0], job[1], retries), jobs))
+
+		# Concatenating in shard order, the output appears only once it is complete
+		with open(out + ".tmp", "wb") as merged:
+			for shardOut in shardOuts:
+				with open(shardOut, "rb") as part:
+					shutil.copyfileobj(part, merged)
+		os.replace(out + ".tmp", out)
+	finally:
+		shutil.rmtree(workDir, ignore_errors = True)
+	return(out)
@@ -2,7 +2,7 @@
 
 import sys
 import logging
-import bioSlim3 as bio
+from . import bioSlim3 as bio
 import argparse
 
 
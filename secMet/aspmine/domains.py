@@ -0,0 +1,320 @@
+"""
+Array based domain intervals and protein collections.
+
+DomainIntervals and SmProteinSet keep the domains and sequences of many proteins in contiguous numpy arrays with offsets,
+readIprIntervals fills them from InterProScan output. Kept out of bioSlim3 so importing it does not load numpy and pandas.
+"""
+
+import sys
+import csv
+import numpy as np
+import pandas as pd
+
+from .bioSlim3 import read_fasta, smProt
+
+
+# Columns of InterProScan TSV output, the last four are only present for some rows
+iprColumns = ["name", "md5", "length", "domainDb", "pf_id", "pf_desc", "start", "end", "score", "status", "date",
+	"ipr_id", "ipr_desc", "go", "pathways"]
+
+
+class DomainIntervals:
+	"""
+	Domain intervals of many proteins in contiguous arrays: the domains of protein names[i]
+	are starts[offsets[i]:offsets[i+1]] and ends[offsets[i]:offsets[i+1]].
+	"""
+
+	def __init__(self, names, offsets, starts, ends):
+		self.names = list(names)
+		self.offsets = np.asarray(offsets, dtype = np.int64)
+		self.starts = np.asarray(starts, dtype = np.int32)
+		self.ends = np.asarray(ends, dtype = np.int32)
+		self.position = {name: i for i, name in enumerate(self.names)}
+
+	@classmethod
+	def fromArrays(cls, names, starts, ends):
+		"""
+		Groups unsorted (name, start, end) arrays by name, proteins keep the order of their first domain.
+		"""
+		codes, uniqueNames = pd.factorize(np.asarray(names, dtype = object))
+		order = np.argsort(codes, kind = "stable")
+		offsets = np.zeros(len(uniqueNames) + 1, dtype = np.int64)
+		np.cumsum(np.bincount(codes, minlength = len(uniqueNames)), out = offsets[1:])
+		return(cls(uniqueNames, offsets, np.asarray(starts)[order], np.asarray(ends)[order]))
+
+	def __len__(self):
+		return(len(self.names))
+
+	def __contains__(self, name):
+		return(name in self.position)
+
+	def __iter__(self):
+		return(iter(self.names))
+
+	def intervals(self, name):
+		"""
+		List of (start, end) tuples of a protein.
+		"""
+		i = self.position[name]
+		a, b = self.offsets[i], self.offsets[i + 1]
+		return(list(zip(self.starts[a:b].tolist(), self.ends[a:b].tolist())))
+
+	def toDict(self):
+		return({name: self.intervals(name) for name in self.names})
+
+	def merge(self, distance = 100, minSize = 100):
+		"""
+		Joins domains at most distance apart and drops the joined domains not longer than minSize, see mergeIntervalArrays.
+		"""
+		offsets, starts, ends = mergeIntervalArrays(self.offsets, self.starts, self.ends, distance, minSize)
+		return(DomainIntervals(self.names, offsets, starts, ends))
+
+	def sequences(self, seqs):
+		"""
+		Domain sequences of every protein, seqs is a dictionary of protein names and sequences.
+		Returns {name: [domain sequences]} for the proteins found in seqs.
+		"""
+		found = [i for i, name in enumerate(self.names) if name in seqs]
+		rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in found]) if found else np.empty(0, dtype = np.int64)
+		counts = np.diff(self.offsets)[found]
+		offsets = np.zeros(len(found) + 1, dtype = np.int64)
+		np.cumsum(counts, out = offsets[1:])
+		domSeqs = domainSequences([seqs[self.names[i]] for i in found], offsets, self.starts[rows], self.ends[rows])
+		return({self.names[i]: d for i, d in zip(found, domSeqs)})
+
+
+def mergeIntervalArrays(offsets, starts, ends, distance = 100, minSize = 100):
+	"""
+	Merges the domain intervals of many proteins at once. The domains of protein i are starts[offsets[i]:offsets[i+1]]
+	and ends[offsets[i]:offsets[i+1]], in any order. Overlapping domains and domains at most distance apart are joined,
+	merged domains with end - start <= minSize are dropped.
+	Returns (offsets, starts, ends) of the merged domains, sorted by start within every protein.
+	"""
+	offsets = np.asarray(offsets, dtype = np.int64)
+	starts = np.asarray(starts, dtype = np.int64)
+	ends = np.asarray(ends, dtype = np.int64)
+	nProteins = len(offsets) - 1
+
+	if len(starts) == 0:
+		return(np.zeros(nProteins + 1, dtype = np.int64), np.empty(0, dtype = np.int32), np.empty(0, dtype = np.int32))
+
+	protein = np.repeat(np.arange(nProteins), np.diff(offsets))
+	order = np.lexsort((starts, protein))
+	protein, starts, ends = protein[order], starts[order], ends[order]
+
+	# Running maximum of the ends within every protein: shifting each protein above the previous one
+	# lets a single cumulative maximum run over all of them
+	shift = ends.max() + 1
+	reach = np.maximum.accumulate(ends + protein * shift) - protein * shift
+
+	newDomain = np.ones(len(starts), dtype = bool)
+	newDomain[1:] = (protein[1:] != protein[:-1]) | (starts[1:] > reach[:-1] + distance)
+	first = np.flatnonzero(newDomain)
+
+	mStarts = starts[first]
+	mEnds = np.maximum.reduceat(ends, first)
+	mProtein = protein[first]
+
+	keep = mEnds - mStarts > minSize
+	mergedOffsets = np.zeros(nProteins + 1, dtype = np.int64)
+	np.cumsum(np.bincount(mProtein[keep], minlength = nProteins), out = mergedOffsets[1:])
+	return(mergedOffsets, mStarts[keep].astype(np.int32), mEnds[keep].astype(np.int32))
+
+
+def domainSequences(seqs, offsets, starts, ends):
+	"""
+	Slices the domains (1 based, end included) out of the protein sequences seqs, with the domains of seqs[i]
+	at starts[offsets[i]:offsets[i+1]]. Positions are clipped to the sequence.
+	Returns a list with the list of domain sequences of every protein.
+	"""
+	offsets = np.asarray(offsets, dtype = np.int64)
+	lengths = np.fromiter((len(seq) for seq in seqs), dtype = np.int64, count = len(seqs))
+	seqStarts = np.zeros(len(seqs), dtype = np.int64)
+	np.cumsum(lengths[:-1], out = seqStarts[1:])
+
+	protein = np.repeat(np.arange(len(seqs)), np.diff(offsets))
+	first = seqStarts[protein] + np.clip(np.asarray(starts, dtype = np.int64) - 1, 0, lengths[protein])
+	last = seqStarts[protein] + np.clip(np.asarray(ends, dtype = np.int64), 0, lengths[protein])
+
+	buffer = "".join(seqs)
+	domSeqs = [buffer[a:b] for a, b in zip(first.tolist(), last.tolist())]
+	return([domSeqs[offsets[i]:offsets[i + 1]] for i in range(len(seqs))])
+
+
+def readIprIntervals(iprFile, memberDb = None, iprOnly = True, chunkSize = 1000000):
+	"""
+	Reads the domain intervals of an InterProScan TSV file (plain or gzip compressed) in typed chunks.
+	memberDb keeps only the domains of one or more member databases, e.g. "Pfam",
+	iprOnly leaves out domains without an InterPro entry. Returns DomainIntervals.
+	"""
+	if isinstance(memberDb, str):
+		memberDb = [memberDb]
+
+	names, starts, ends = [], [], []
+	reader = pd.read_csv(iprFile, sep = "\t", header = None, names = iprColumns, usecols = ["name", "domainDb", "start", "end", "ipr_id"],
+		dtype = {"name": str, "domainDb": "category", "start": np.int32, "end": np.int32, "ipr_id": str},
+		quoting = csv.QUOTE_NONE, na_values = ["-", ""], keep_default_na = False, compression = "infer", chunksize = chunkSize)
+
+	for chunk in reader:
+		keep = np.ones(len(chunk), dtype = bool)
+		if memberDb:
+			keep &= chunk["domainDb"].isin(memberDb).to_numpy()
+		if iprOnly:
+			keep &= chunk["ipr_id"].notna().to_numpy()
+		names.append(chunk["name"].to_numpy()[keep])
+		starts.append(chunk["start"].to_numpy()[keep])
+		ends.append(chunk["end"].to_numpy()[keep])
+
+	if not names:
+		return(DomainIntervals([], [0], [], []))
+	return(DomainIntervals.fromArrays(np.concatenate(names), np.concatenate(starts), np.concatenate(ends)))
+
+
+class SmProteinSet:
+	"""
+	Array backed collection of secondary metabolite proteins, in place of one smProt object per protein.
+	All sequences sit in one byte buffer (sequence i is buffer[seqOffsets[i]:seqOffsets[i+1]]) and the domains
+	in start and end arrays (domains of protein i are domStarts[domOffsets[i]:domOffsets[i+1]]), names are interned.
+
+	proteins = SmProteinSet.fromFasta("smurf.fasta")
+	proteins.setDomains(readIprIntervals("smurf.tsv", memberDb = "Pfam"))
+	domSeqs = proteins.domainSeqs()
+	"""
+
+	def __init__(self, names, buffer, seqOffsets):
+		self.names = [sys.intern(name) for name in names]
+		self.position = {name: i for i, name in enumerate(self.names)}
+		if len(self.position) != len(self.names):
+			raise ValueError("Protein names must be unique")
+		self.buffer = bytes(buffer)
+		self.seqOffsets = np.asarray(seqOffsets, dtype = np.int64)
+		self.residues = np.frombuffer(self.buffer, dtype = np.uint8)
+		self.domOffsets = np.zeros(len(self.names) + 1, dtype = np.int64)
+		self.domStarts = np.empty(0, dtype = np.int32)
+		self.domEnds = np.empty(0, dtype = np.int32)
+
+	@classmethod
+	def fromRecords(cls, records):
+		"""
+		Builds the set from (name, seq) tuples, e.g. read_fasta or iterSmurfProteins.
+		"""
+		names = []
+		lengths = []
+		buffer = bytearray()
+		for name, seq in records:
+			names.append(name)
+			seq = seq.encode("ascii") if isinstance(seq, str) else seq
+			lengths.append(len(seq))
+			buffer += seq
+		seqOffsets = np.zeros(len(names) + 1, dtype = np.int64)
+		np.cumsum(lengths, out = seqOffsets[1:])
+		return(cls(names, buffer, seqOffsets))
+
+	@classmethod
+	def fromFasta(cls, fileName):
+		with open(fileName) as ff:
+			return(cls.fromRecords(read_fasta(ff)))
+
+	def __len__(self):
+		return(len(self.names))
+
+	def __contains__(self, name):
+		return(name in self.position)
+
+	def __iter__(self):
+		return(iter(self.names))
+
+	def setDomains(self, domains, minSize = 100, distance = 100):
+		"""
+		Sets the domains from DomainIntervals or a dictionary of names and (start, end) lists,
+		joining domains at most distance apart and keeping merged domains over minSize.
+		Proteins without domains get an empty domain list, domains of unknown proteins are ignored.
+		"""
+		if not isinstance(domains, DomainIntervals):
+			names = [name for name, doms in domains.items() for d in doms]
+			domains = DomainIntervals.fromArrays(names, [d[0] for doms in domains.values() for d in doms],
+				[d[1] for doms in domains.values() for d in doms])
+
+		# Rows of domains, in the order of the proteins of this set
+		idx = np.array([domains.position.get(name, -1) for name in self.names], dtype = np.int64)
+		hit = idx >= 0
+		counts = np.zeros(len(idx), dtype = np.int64)
+		counts[hit] = np.diff(domains.offsets)[idx[hit]]
+		firstRow = np.zeros(len(idx), dtype = np.int64)
+		firstRow[hit] = domains.offsets[idx[hit]]
+		offsets = np.zeros(len(self.names) + 1, dtype = np.int64)
+		np.cumsum(counts, out = offsets[1:])
+		rows = np.repeat(firstRow - offsets[:-1], counts) + np.arange(offsets[-1])
+
+		self.domOffsets, self.domStarts, self.domEnds = mergeIntervalArrays(offsets, domains.starts[rows], domains.ends[rows],
+			distance = distance, minSize = minSize)
+
+	def seqView(self, name):
+		"""
+		Sequence of a protein as a memoryview of the buffer, without copying.
+		"""
+		i = self.position[name]
+		return(memoryview(self.buffer)[self.seqOffsets[i]:self.seqOffsets[i + 1]])
+
+	def fullSeq(self, name):
+		return(self.seqView(name).tobytes().decode("ascii"))
+
+	def fullSeqs(self):
+		text = self.buffer.decode("ascii")
+		bounds = self.seqOffsets.tolist()
+		return([text[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+
+	def domainArrays(self, name):
+		"""
+		(starts, ends) of the domains of a protein as views of the domain arrays.
+		"""
+		i = self.position[name]
+		a, b = self.domOffsets[i], self.domOffsets[i + 1]
+		return(self.domStarts[a:b], self.domEnds[a:b])
+
+	def getDomains(self, name):
+		starts, ends = self.domainArrays(name)
+		return(list(zip(starts.tolist(), ends.tolist())))
+
+	def domainLists(self):
+		"""
+		List with the (start, end) domain list of every protein.
+		"""
+		domains = list(zip(self.domStarts.tolist(), self.domEnds.tolist()))
+		bounds = self.domOffsets.tolist()
+		return([domains[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+
+	def getDomainList(self):
+		"""
+		[name, start, end] rows of all domains.
+		"""
+		protein = np.repeat(np.arange(len(self.names)), np.diff(self.domOffsets))
+		return([[self.names[i], start, end] for i, start, end in zip(protein.tolist(), self.domStarts.tolist(), self.domEnds.tolist())])
+
+	def getDomSeqs(self, name):
+		seq = self.seqView(name)
+		return([seq[max(start - 1, 0):end].tobytes().decode("ascii") for start, end in self.getDomains(name)])
+
+	def domainSeqs(self):
+		"""
+		List with the domain sequences (1 based, end included) of every protein, sliced from the buffer in one pass.
+		"""
+		protein = np.repeat(np.arange(len(self.names)), np.diff(self.domOffsets))
+		lengths = np.diff(self.seqOffsets)[protein]
+		first = self.seqOffsets[protein] + np.clip(self.domStarts.astype(np.int64) - 1, 0, lengths)
+		last = self.seqOffsets[protein] + np.clip(self.domEnds.astype(np.int64), 0, lengths)
+
+		text = self.buffer.decode("ascii")
+		domSeqs = [text[a:b] for a, b in zip(first.tolist(), last.tolist())]
+		bounds = self.domOffsets.tolist()
+		return([domSeqs[a:b] for a, b in zip(bounds[:-1], bounds[1:])])
+
+	def protein(self, name):
+		"""
+		smProt object of a single protein.
+		"""
+		prot = smProt(name)
+		prot.setSeq(self.fullSeq(name))
+		prot.domains = self.getDomains(name)
+		return(prot)
+
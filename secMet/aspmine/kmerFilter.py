@@ -0,0 +1,159 @@
+"""
+Alignment free prefilter for the MIBiG vs smurf blast.
+
+processBlastResult only keeps near identical hits (pident > 95, query and subject coverage > 90),
+and pairs like that share most of their k-mers. KmerIndex keeps the distinct k-mers of every subject protein
+in a compressed sparse row layout (one offset per possible k-mer), so the subjects sharing k-mers with a query are found
+by gathering a few slices and counting them with bincount. Only the queries and subjects of candidate pairs are blasted.
+
+Example:
+prefilterBlast("mibigDb.fasta", "smurf.fasta", "mibigVsSmurf.txt", minShared = 0.3,
+	args = ["-max_target_seqs", "25", "-evalue", "1e-50", "-outfmt", "6 std qlen slen"])
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+from . import bioSlim3 as bio
+from .blastRunner import runBlast
+
+
+aminoAcids = "ACDEFGHIKLMNPQRSTVWY"
+
+# Byte to residue code, everything that is not one of the 20 amino acids (X, *, U, ...) gets len(aminoAcids)
+residueCodes = np.full(256, len(aminoAcids), dtype = np.uint8)
+for i, aa in enumerate(aminoAcids):
+	residueCodes[ord(aa)] = i
+	residueCodes[ord(aa.lower())] = i
+
+
+def kmerCodes(seq, k = 5):
+	"""
+	Returns the sorted distinct k-mers of seq as integers in base 20. K-mers with other residues than the 20 amino acids are left out.
+	"""
+	residues = residueCodes[np.frombuffer(seq.encode("ascii", "replace"), dtype = np.uint8)].astype(np.int64)
+	if len(residues) < k:
+		return(np.empty(0, dtype = np.int64))
+
+	windows = np.lib.stride_tricks.sliding_window_view(residues, k)
+	valid = (windows < len(aminoAcids)).all(axis = 1)
+	codes = windows[valid] @ (len(aminoAcids) ** np.arange(k - 1, -1, -1, dtype = np.int64))
+	return(np.unique(codes))
+
+
+class KmerIndex:
+	'Distinct k-mers of a set of protein sequences, grouped by k-mer'
+
+	def __init__(self, records, k = 5, maxOccurrence = None):
+		"""
+		records are (name, seq) tuples. K-mers found in more than maxOccurrence sequences (low complexity regions, repeats)
+		are not used for the lookup.
+		"""
+		self.k = k
+		self.names = []
+		perSeq = []
+		for name, seq in records:
+			self.names.append(name)
+			perSeq.append(kmerCodes(seq, k))
+
+		self.nKmers = np.array([len(codes) for codes in perSeq], dtype = np.int64)
+		codes = np.concatenate(perSeq) if perSeq else np.empty(0, dtype = np.int64)
+		seqIdx = np.repeat(np.arange(len(perSeq), dtype = np.int32), self.nKmers)
+
+		# Sorting the (k-mer, sequence) pairs by k-mer, offsets[c]:offsets[c+1] are the sequences containing k-mer c
+		order = np.argsort(codes, kind = "stable")
+		self.seqIdx = seqIdx[order]
+		counts = np.bincount(codes, minlength = len(aminoAcids) ** k)
+		if maxOccurrence:
+			keep = counts <= maxOccurrence
+			self.seqIdx = self.seqIdx[np.repeat(keep, counts)]
+			counts = np.where(keep, counts, 0)
+		self.offsets = np.zeros(len(counts) + 1, dtype = np.int64)
+		np.cumsum(counts, out = self.offsets[1:])
+
+	def __len__(self):
+		return(len(self.names))
+
+	def shared(self, seq):
+		"""
+		Returns the indices of the sequences sharing k-mers with seq, the number of shared k-mers and the number of k-mers of seq.
+		"""
+		codes = kmerCodes(seq, self.k)
+		starts = self.offsets[codes]
+		lengths = self.offsets[codes + 1] - starts
+		total = lengths.sum()
+		if total == 0:
+			return(np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64), len(codes))
+
+		# Gathering all slices at once: the position in the slice plus the start of the slice
+		within = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+		hits = np.bincount(self.seqIdx[np.repeat(starts, lengths) + within], minlength = len(self.names))
+		found = np.flatnonzero(hits)
+		return(found, hits[found], len(codes))
+
+	def candidates(self, seq, minShared = 0.3):
+		"""
+		Returns the names of the sequences whose shared k-mers are at least minShared of the k-mers of the longer of the two.
+		"""
+		found, hits, nQuery = self.shared(seq)
+		fraction = hits / np.maximum(self.nKmers[found], max(nQuery, 1))
+		return([self.names[i] for i in found[fraction >= minShared]])
+
+
+def kmerCandidates(queryFasta, subjectFasta, minShared = 0.3, k = 5, maxOccurrence = None):
+	"""
+	Returns a dictionary of query names and the subject names they share at least minShared of their k-mers with.
+	Queries without candidates are left out.
+	"""
+	with open(subjectFasta) as ff:
+		index = KmerIndex(bio.read_fasta(ff), k = k, maxOccurrence = maxOccurrence)
+
+	pairs = {}
+	with open(queryFasta) as ff:
+		for name, seq in bio.read_fasta(ff):
+			hits = index.candidates(seq, minShared)
+			if hits:
+				pairs[name] = hits
+	return(pairs)
+
+
+def prefilterBlast(query, db, out, minShared = 0.3, k = 5, makeblastdb = None, args = (), **blastOptions):
+	"""
+	Blasts only the candidate pairs of query against db (both FASTA files) and writes the tabular output to out.
+	The candidate subjects get their own database, which is searched with -dbsize set to the residues of db,
+	so e-values are the same as for a search of the full database. blastOptions are passed on to runBlast.
+	"""
+	pairs = kmerCandidates(query, db, minShared = minShared, k = k)
+	subjects = set(name for hits in pairs.values() for name in hits)
+	print("k-mer prefilter: %s queries with %s candidate subjects" % (len(pairs), len(subjects)))
+
+	if not pairs:
+		open(out, "w").close()
+		return(out)
+
+	workDir = tempfile.mkdtemp(prefix = "kmerPrefilter_", dir = os.path.dirname(os.path.abspath(out)))
+	queryFile = os.path.join(workDir, "query.fasta")
+	subjectFile = os.path.join(workDir, "subjects.fasta")
+
+	with open(query) as ff:
+		bio.tupleToFasta([(name, seq) for name, seq in bio.read_fasta(ff) if name in pairs], queryFile)
+
+	dbSize = 0
+	selected = []
+	with open(db) as ff:
+		for name, seq in bio.read_fasta(ff):
+			dbSize += len(seq)
+			if name in subjects:
+				selected.append((name, seq))
+	bio.tupleToFasta(selected, subjectFile)
+
+	subprocess.run([makeblastdb or bio.config['makeblastdbPath'], "-in", subjectFile, "-dbtype", "prot"],
+		check = True, stdout = subprocess.DEVNULL)
+
+	runBlast(queryFile, subjectFile, out, args = list(args) + ["-dbsize", str(dbSize)], **blastOptions)
+
+	shutil.rmtree(workDir)
+	return(out)
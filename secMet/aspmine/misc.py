@@ -0,0 +1,48 @@
+"""
+Config reader.
+Since the main script is split in two parts, a config makes it easy to \n
+reuse the same settings.
+"""
+
+import os
+
+_config = None
+
+def readConfig(config):
+    # confKeys = {"interproscanPath","domainType",
+    #             "domainDistance", "smSelect"}
+    confDict = {}
+
+    for line in config:
+        if "=" in line:
+            v = line.split("=")
+            confDict[v[0]] = v[1].strip()
+
+    return(confDict)
+
+
+def configPath():
+    """
+    config.txt to use: the file in ASPMINE_CONFIG, else config.txt in the working directory, else the one next to main.py.
+    """
+    candidates = [os.environ.get("ASPMINE_CONFIG"), os.path.join(os.getcwd(), "config.txt"),
+                  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.txt")]
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return(path)
+    raise FileNotFoundError("No config.txt found, set ASPMINE_CONFIG or run from the directory with config.txt")
+
+
+def getConfig():
+    """
+    Settings of config.txt, read on the first call.
+    """
+    global _config
+    if _config is None:
+        with open(configPath()) as c:
+            _config = readConfig(c.readlines())
+    return(_config)
+
+# if __name__ == '__main__':
+#     with open("../config.txt") as cf:
+#         config = readConfig(cf.readlines())
@@ -0,0 +1,407 @@
+"""
+Module to dereplicate our SM proteins with the mibig data.
+
+Todo:
+* Make it a standalone script with main?
+"""
+
+import io
+import os
+import csv
+import sys
+import urllib.request
+import tarfile
+import hashlib
+import multiprocessing
+# sys.path.append("..")
+from . import bioSlim3 as bio
+from .proteinStore import ProteinStore, orgIds
+import argparse
+from Bio import SeqIO
+from collections import Counter, namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pandas as pd
+
+mibigUrl = "https://mibig.secondarymetabolites.org/mibig_gbk_1.3.tar.gz"
+
+
+def dlMibig(tarball = "mibig.tar.gz", url = mibigUrl):
+	"""
+	Downloads the mibig genbank tarball from https://mibig.secondarymetabolites.org/mibig_gbk_1.3.tar.gz.
+	Nothing is downloaded if the tarball exists already, so a local copy can be used without network.
+	The tarball is not extracted, processMibig reads the genbank files straight from it.
+	Returns the path of the tarball.
+	"""
+	tarDir = os.path.dirname(tarball)
+	if tarDir and not os.path.isdir(tarDir):
+		os.makedirs(tarDir)
+
+	if os.path.isfile(tarball):
+		print("Using mibig tarball %s" % tarball)
+		return(tarball)
+
+	try:
+		print("Downloading")
+		urllib.request.urlretrieve(url, tarball + ".part")
+		os.replace(tarball + ".part", tarball)
+	except Exception as e:
+		print("Cannot download database")
+		if os.path.isfile(tarball + ".part"):
+			os.remove(tarball + ".part")
+
+	return(tarball)
+
+
+
+
+def smurfKeyQuery(orgSet):
+	return("""
+	SELECT smurf.org_id, smurf.sm_protein_id FROM smurf
+	JOIN organism ON organism.name IN ('%s') AND smurf.org_id = organism.org_id
+	WHERE smurf.sm_short != 'none';
+	""" % "','".join(orgSet))
+
+
+def iterSmurfProteins(orgSet, chunkSize = 50000):
+	"""
+	Streams the smurf backbone proteins of orgSet (jgi names) as (org_id_protein_id, seq) tuples,
+	chunkSize rows at a time. Sequences come from the local protein store, organisms missing from it are downloaded first.
+	"""
+	with ProteinStore() as store:
+		store.ensure(orgIds(orgSet))
+		for fields, rows in bio.dbChunks(smurfKeyQuery(orgSet), chunkSize):
+			seqs = store.fetch(rows)
+			for org, prot in rows:
+				key = (int(org), int(prot))
+				if key in seqs:
+					yield (str(org) + '_' + str(prot), seqs[key])
+
+
+def dlSmurfProteins(orgSet):
+	""" Download backbones of smurf database for annotation by mibig
+	needs orgSet for join with
+	Returns tuples of (name,seq)\n
+	orgSet must be a character vector of jgi names"""
+	return(list(iterSmurfProteins(orgSet)))
+
+
+def exportSmurfProteins(orgSet, fileName, compress = False):
+	"""
+	Writes the smurf backbone proteins of orgSet straight from the database to a fasta file,
+	without holding them in memory. Returns the number of proteins.
+	"""
+	count = bio.writeFasta(iterSmurfProteins(orgSet), fileName, compress = compress, clean = True)
+	print("Wrote %s smurf proteins to %s" % (count, fileName))
+	return(count)
+
+
+
+# Compact gene cluster record with the only fields later stages use
+bgcRecord = namedtuple("bgcRecord", ["description", "organism", "translations"])
+
+
+def gbkOrganism(handle):
+	"""
+	Reads the organism from the ORGANISM line of a GenBank header.
+	Stops at the FEATURES table, so the rest of the file is never read. Returns None if there is no ORGANISM line.
+	"""
+	for line in handle:
+		if line.startswith("  ORGANISM"):
+			return(line[len("  ORGANISM"):].strip())
+		if line.startswith("FEATURES") or line.startswith("ORIGIN"):
+			break
+	return(None)
+
+
+def orgSelected(organism, selOrgs):
+	return(selOrgs == "all" or any(org in organism for org in selOrgs))
+
+
+def bgcTexts(source):
+	"""
+	Yields (file name, text) of the mibig genbank files (BGC*) in a directory or a (compressed) tarball.
+	Tarballs are read as a stream, members are never written to disk.
+	"""
+	if os.path.isdir(source):
+		for file in sorted(os.listdir(source)):
+			if file.startswith("BGC"):
+				try:
+					with open(os.path.join(source, file)) as tempFile:
+						yield (file, tempFile.read())
+				except Exception:
+					yield (file, None)
+	else:
+		with tarfile.open(source, "r|*") as tar:
+			for member in tar:
+				file = os.path.basename(member.name)
+				if member.isfile() and file.startswith("BGC"):
+					try:
+						yield (file, tar.extractfile(member).read().decode("UTF-8"))
+					except Exception:
+						yield (file, None)
+
+
+def parseBgcText(text, selOrgs = "all"):
+	"""
+	Parses the text of a mibig genbank file into bgcRecords of the selected organisms.
+	Returns None if the text could not be parsed. Used as worker by processMibig.
+	"""
+	try:
+		clusters = [bgcRecord(rec.description, rec.annotations["organism"], tuple(cdsTranslations(rec))) for rec in SeqIO.parse(io.StringIO(text), 'genbank')]
+	except Exception:
+		return(None)
+	return([cluster for cluster in clusters if orgSelected(cluster.organism, selOrgs)])
+
+
+def processMibig(source, selOrgs = ["Aspergillus", "Penicillium"], processes = 1):
+	"""Provide the mibig db as genbank file
+	returns bgcRecords (description, organism, CDS translations) of gene clusters
+	ONly looking for SMGC from Aspergillus and Penicillium
+
+	source is the mibig tarball (read as a stream, nothing is extracted) or a directory of genbank files.
+	Files whose ORGANISM header line does not match selOrgs are skipped before parsing,
+	the remaining files are parsed on a pool of processes if processes > 1."""
+
+	geneClusters = []
+	failedOnes = []
+	nFiles = 0
+	nParsed = 0
+
+	def collect(file, clusters):
+		if clusters is None:
+			print("Failed to read" + file)
+			failedOnes.append(file)
+		else:
+			geneClusters.extend(clusters)
+
+	# Workers are spawned, not forked: the pipeline calls this from a thread while other stages may hold locks (MySQLdb, logging)
+	pool = ProcessPoolExecutor(max_workers = processes, mp_context = multiprocessing.get_context("spawn")) if processes > 1 else None
+	pending = deque()
+	try:
+		for file, text in bgcTexts(source):
+			nFiles += 1
+			if text is None:
+				collect(file, None)
+				continue
+			if selOrgs != "all":
+				organism = gbkOrganism(io.StringIO(text))
+				if organism is not None and not orgSelected(organism, selOrgs):
+					continue
+			nParsed += 1
+
+			if pool is None:
+				collect(file, parseBgcText(text, selOrgs))
+				continue
+
+			# Keeping a bounded number of files in flight, results are collected in file order
+			pending.append((file, pool.submit(parseBgcText, text, selOrgs)))
+			while len(pending) > processes * 8:
+				file, future = pending.popleft()
+				collect(file, future.result())
+
+		while pending:
+			file, future = pending.popleft()
+			collect(file, future.result())
+	finally:
+		if pool is not None:
+			pool.shutdown()
+
+	print("%s out of %s genbank files match the selected organisms" % (nParsed, nFiles))
+	print ("%s gene cluster entries out of %s genbank files could be loaded" % (len(geneClusters), nFiles))
+	print ("%s files could not be read" % len(failedOnes))
+	print (" Failed files:")
+	print (failedOnes)
+
+	return(geneClusters)
+
+
+def cdsTranslations(seqRec):
+	"""
+	Use on seqIO object to get the protein sequences of all CDS features.
+	"""
+	bb = []
+	if seqRec.features:
+		for feature in seqRec.features:
+			if feature.type == "CDS":
+				if 'translation' in feature.qualifiers:
+					bb.append(feature.qualifiers['translation'][0])
+	return(bb)
+
+
+def getLargestProtein(seqRec):
+	"""
+	Use on seqIO object or bgcRecord to get largest protein sequence.
+	We want to get the largest protein sequence since SM proteins like NRPS, PKS, etc. are the largest ones in secondary metabolic gene clusters.
+	"""
+	if isinstance(seqRec, bgcRecord):
+		bb = seqRec.translations
+	else:
+		bb = cdsTranslations(seqRec)
+	backbone = max(bb, key = len)
+	return(backbone)
+
+
+
+def mibigBackbones(geneClusters):
+	"""
+	Get largest proteins from each cluster (bgcRecords from processMibig).
+	Returns (gcId, compound, organism, backbone sequence) tuples.
+	"""
+	backbones = []
+	counter = 1
+	for rec in geneClusters:
+
+		comp = rec.description
+		org = rec.organism
+		seq = getLargestProtein(rec)
+		gcId = "gc_"+str(counter)
+
+		backbones.append((gcId, comp, org, seq))
+		counter = counter + 1
+
+	return(backbones)
+
+
+#
+def writeMibigFormatted(geneClusters, addPath = ''):
+	"""
+	Get largest proteins from each cluster (bgcRecords from processMibig) and write them to mibigDf.fasta
+	Sometimes the files just contain domains only and not the full protein.
+	That's ok, we will still get the best hit at a later stage.
+
+	Output:
+	* mibigDb.fasta (containing mibig entries in blastable format)
+	* translateBgc.txt (mibig entries with their corresponding blastable id)
+	"""
+	writeMibigBackbones(mibigBackbones(geneClusters), addPath)
+
+
+def writeMibigBackbones(backbones, addPath = ''):
+	"""
+	Writes mibigDb.fasta and translateBgc.txt from (gcId, compound, organism, backbone sequence) tuples.
+	"""
+	finDb = {gcId: seq for gcId, comp, org, seq in backbones}
+	translationTable = [(comp, org, gcId) for gcId, comp, org, seq in backbones]
+
+	# WRITING SEQUENCES #
+	print("Writing sequences to %s" % addPath + 'mibigDb.fasta')
+	bio.dictToFasta(finDb, addPath + "mibigDb.fasta")
+
+	# WRITING TRANSLATION TABLE #
+	print("Writing translation table to %s" % addPath + 'translateBgc.txt')
+	with open(addPath + "translateBgc.txt", "w") as tfile:
+		out = csv.writer(tfile, delimiter=';')
+		for row in translationTable:
+			out.writerow(row)
+
+
+def fileHash(fileName, blockSize = 1 << 20):
+	"""
+	SHA-256 of a file. The hash is kept in the cache directory with the size and modification time of the file
+	and only computed again when one of them changed.
+	"""
+	stat = os.stat(fileName)
+	hashFile = bio.cachePath("mibig", "fileHashes.tsv")
+	hashes = {}
+	if os.path.isfile(hashFile):
+		with open(hashFile) as h:
+			hashes = {row[0]: row[1:] for row in csv.reader(h, delimiter = '\t') if len(row) == 4}
+
+	path = os.path.abspath(fileName)
+	key = [str(stat.st_size), str(stat.st_mtime_ns)]
+	if path in hashes and hashes[path][:2] == key:
+		return(hashes[path][2])
+
+	sha = hashlib.sha256()
+	with open(fileName, "rb") as f:
+		for block in iter(lambda: f.read(blockSize), b""):
+			sha.update(block)
+
+	hashes[path] = key + [sha.hexdigest()]
+	with open(hashFile + ".tmp", "w") as h:
+		csv.writer(h, delimiter = '\t').writerows([path] + values for path, values in sorted(hashes.items()))
+	os.replace(hashFile + ".tmp", hashFile)
+	return(sha.hexdigest())
+
+
+def mibigCacheFile(tarball, selOrgs):
+	"""
+	Cache file of the backbone table, addressed by the tarball content and the organism filter.
+	"""
+	orgFilter = "all" if selOrgs == "all" else ",".join(sorted(selOrgs))
+	key = hashlib.sha256((fileHash(tarball) + "\n" + orgFilter).encode("UTF-8")).hexdigest()
+	return(bio.cachePath("mibig", key + ".tsv"))
+
+
+def cachedMibigFormatted(tarball, selOrgs = ["Aspergillus", "Penicillium"], addPath = '', processes = 1):
+	"""
+	Writes mibigDb.fasta and translateBgc.txt like writeMibigFormatted, from a cached table of
+	(gcId, compound, organism, backbone sequence) if the same tarball was processed with the same selOrgs before.
+	On a cache miss the tarball is parsed with processMibig.
+	Returns the backbone tuples.
+	"""
+	cacheFile = mibigCacheFile(tarball, selOrgs)
+
+	if os.path.isfile(cacheFile):
+		print("Using cached mibig backbones %s" % cacheFile)
+		with open(cacheFile) as c:
+			backbones = [tuple(row) for row in csv.reader(c, delimiter = '\t')]
+	else:
+		backbones = mibigBackbones(processMibig(tarball, selOrgs, processes))
+
+		with open(cacheFile + ".tmp", "w") as c:
+			csv.writer(c, delimiter = '\t').writerows(backbones)
+		os.replace(cacheFile + ".tmp", cacheFile)
+
+	writeMibigBackbones(backbones, addPath)
+	return(backbones)
+
+# Columns of -outfmt '6 std qlen slen' and their types
+bheader = ["qseqid", "sseqid", "pident", "length", "mismatch", "gapopen", "qstart", "qend", "sstart", "send","evalue", "bitscore", "qlen", "slen"]
+btypes = {"qseqid": str, "sseqid": str, "pident": "float64", "length": "int32", "mismatch": "int32", "gapopen": "int32",
+	"qstart": "int32", "qend": "int32", "sstart": "int32", "send": "int32", "evalue": "float64", "bitscore": "float32",
+	"qlen": "int32", "slen": "int32"}
+
+def processBlastResult(blastFile, translationFile, pident_cutoff = 95, q_coverage_cutoff = 90, s_coverage_cutoff = 90, aspmineIdsOnly = True, chunkSize = 1000000):
+	"""
+	Processes the blast results of mibig to find the best hit in our data.
+	Needs the name of the blast file and the name of the generated translation table from writeMibigFormatted.
+
+	The blast file is read in typed chunks of chunkSize rows. Cutoffs are applied per chunk and only the
+	best hit (highest pident, first one on ties) per compound is kept between chunks, so memory does not grow with the file.
+	"""
+	# "/home/seth/asptoolbox/secMet/mibig/translateBgc.txt"
+	annotation = pd.read_csv(translationFile, names = ["compound", "org", "gcId"], sep = ";")
+
+	best = None
+
+	try:
+		chunks = pd.read_csv(blastFile, header = None, names = bheader, dtype = btypes, sep = "\t", chunksize = chunkSize)
+		for blast in chunks:
+			blast['q_cov'] =  (blast['qend'] - blast['qstart']) / blast['qlen']*100
+			blast['s_cov'] =  (blast['send'] - blast['sstart']) / blast['slen']*100
+
+			subBlast = blast[(blast.pident > pident_cutoff) & (blast.s_cov > s_coverage_cutoff) & (blast.q_cov > q_coverage_cutoff)]
+
+			subBlastAnnoteted = pd.merge(subBlast, annotation,  how='left', left_on=['qseqid'], right_on = ['gcId'])
+			subBlastAnnoteted = subBlastAnnoteted[subBlastAnnoteted.compound.notna()]
+
+			# Getting the best match, earlier hits come first so ties keep the first one like idxmax
+			candidates = subBlastAnnoteted if best is None else pd.concat([best, subBlastAnnoteted], ignore_index = True)
+			best = candidates.sort_values("pident", ascending = False, kind = "mergesort").drop_duplicates("compound", keep = "first")
+	except Exception as e:
+		print("Check your blast file")
+		raise
+
+	if best is None:
+		best = pd.DataFrame(columns = bheader + ["q_cov", "s_cov"] + list(annotation.columns))
+
+	subBlastFinal = best.sort_values("compound", kind = "mergesort").reset_index(drop = True)
+
+	if aspmineIdsOnly: # Need to do this so I can use the module for ncbi identifiers...
+		ids = subBlastFinal.sseqid.str.split("_", n = 2, expand = True).reindex(columns = [0, 1])
+		subBlastFinal['org_id'] = ids[0]
+		subBlastFinal['protein_id'] = ids[1]
+
+	return(subBlastFinal)
@@ -0,0 +1,268 @@
+"""
+Local store of the protein sequences of the proteins table.
+
+The proteins of an organism are downloaded once into a file of zlib compressed blocks, an sqlite index keeps
+the block and position of every (org_id, protein_id). Stages then read sequences from local disk instead of MySQL:
+
+with ProteinStore() as store:
+	store.ensure(orgIds)
+	seqs = store.fetch([(org_id, protein_id), ...])
+
+The store lives in the config key proteinStore, default <cacheDir>/proteinStore.
+Every organism is stored with a fingerprint of its rows in the proteins table (row count and CRC32 sum, computed on
+the server), ensure downloads an organism again when it changed, e.g. after new gene models were loaded.
+
+From the command line (installed as secmet-seq), writing FASTA to stdout:
+secmet-seq 27:100261 27:100324
+secmet-seq --fill 27 28
+"""
+
+import os
+import sys
+import time
+import zlib
+import uuid
+import sqlite3
+import argparse
+
+from . import bioSlim3 as bio
+
+
+class ProteinStore:
+	'Compressed, indexed local copy of the proteins table'
+
+	def __init__(self, path = None, blockSize = 1 << 18):
+		self.path = path or bio.config.get('proteinStore') or os.path.dirname(bio.cachePath("proteinStore", "index.sqlite"))
+		os.makedirs(self.path, exist_ok = True)
+		self.blockSize = blockSize
+
+		self.index = sqlite3.connect(os.path.join(self.path, "index.sqlite"), timeout = 600, isolation_level = None)
+		self.index.executescript("""
+		PRAGMA journal_mode = WAL;
+		CREATE TABLE IF NOT EXISTS organisms (org_id INTEGER PRIMARY KEY, file TEXT, proteins INTEGER, residues INTEGER, filled TEXT, fingerprint TEXT);
+		CREATE TABLE IF NOT EXISTS blocks (org_id INTEGER, block INTEGER, offset INTEGER, size INTEGER, PRIMARY KEY (org_id, block)) WITHOUT ROWID;
+		CREATE TABLE IF NOT EXISTS proteins (org_id INTEGER, protein_id INTEGER, block INTEGER, start INTEGER, length INTEGER,
+			PRIMARY KEY (org_id, protein_id)) WITHOUT ROWID;
+		""")
+		# Stores from before fingerprints were kept, their organisms are downloaded again once
+		if "fingerprint" not in [column[1] for column in self.index.execute("PRAGMA table_info(organisms)")]:
+			self.index.execute("ALTER TABLE organisms ADD COLUMN fingerprint TEXT")
+
+	def organisms(self):
+		"""
+		Set of the org_ids in the store.
+		"""
+		return(set(org_id for org_id, in self.index.execute("SELECT org_id FROM organisms")))
+
+	def fingerprints(self):
+		"""
+		{org_id: fingerprint} of the organisms in the store.
+		"""
+		return(dict(self.index.execute("SELECT org_id, fingerprint FROM organisms")))
+
+	def fill(self, orgId, chunkSize = 50000, fingerprint = None):
+		"""
+		Downloads all proteins of an organism into a new block file and replaces its index entries in one transaction.
+		A prot_seqkey found more than once is stored once, with its first sequence.
+		fingerprint is the one of proteinFingerprints, taken before the download so changes during it are seen next time.
+		"""
+		orgId = int(orgId)
+		if fingerprint is None:
+			fingerprint = proteinFingerprints([orgId])[orgId]
+		fileName = "org_%s_%s.blk" % (orgId, uuid.uuid4().hex[:8])
+		proteins = []
+		seen = set()
+		blocks = []
+		block = []
+		blockLength = 0
+		offset = 0
+
+		try:
+			with open(os.path.join(self.path, fileName), "wb") as out:
+				def writeBlock():
+					data = zlib.compress(b"".join(block), 6)
+					out.write(data)
+					blocks.append((orgId, len(blocks), offset, len(data)))
+					return(offset + len(data))
+
+				query = "SELECT prot_seqkey, prot_seq FROM proteins WHERE org_id = %s;" % orgId
+				for fields, rows in bio.dbChunks(query, chunkSize):
+					for proteinId, seq in rows:
+						proteinId = int(proteinId)
+						if proteinId in seen:
+							continue
+						seen.add(proteinId)
+						seq = seq if isinstance(seq, bytes) else seq.encode("ascii")
+						proteins.append((orgId, proteinId, len(blocks), blockLength, len(seq)))
+						block.append(seq)
+						blockLength += len(seq)
+						if blockLength >= self.blockSize:
+							offset = writeBlock()
+							block, blockLength = [], 0
+				if block:
+					offset = writeBlock()
+
+			old = self.index.execute("SELECT file FROM organisms WHERE org_id = ?", (orgId,)).fetchone()
+
+			self.index.execute("BEGIN IMMEDIATE")
+			try:
+				self.index.execute("DELETE FROM proteins WHERE org_id = ?", (orgId,))
+				self.index.execute("DELETE FROM blocks WHERE org_id = ?", (orgId,))
+				self.index.executemany("INSERT OR REPLACE INTO proteins VALUES (?, ?, ?, ?, ?)", proteins)
+				self.index.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?)", blocks)
+				self.index.execute("INSERT OR REPLACE INTO organisms (org_id, file, proteins, residues, filled, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+					(orgId, fileName, len(proteins), sum(p[4] for p in proteins), time.strftime("%Y-%m-%d %H:%M:%S"), fingerprint))
+				self.index.execute("COMMIT")
+			except Exception:
+				self.index.execute("ROLLBACK")
+				raise
+		except Exception:
+			# Download or index update failed, the block file is not referenced by the index
+			if os.path.isfile(os.path.join(self.path, fileName)):
+				os.remove(os.path.join(self.path, fileName))
+			raise
+
+		if old and old[0] != fileName and os.path.isfile(os.path.join(self.path, old[0])):
+			os.remove(os.path.join(self.path, old[0]))
+
+		print("Stored %s proteins of organism %s" % (len(proteins), orgId))
+		return(len(proteins))
+
+	def ensure(self, orgIds, refresh = False):
+		"""
+		Downloads the organisms which are not in the store yet or whose proteins changed (see proteinFingerprints),
+		or all of them with refresh.
+		"""
+		orgIds = sorted(set(int(org_id) for org_id in orgIds))
+		stored = {} if refresh else self.fingerprints()
+		current = proteinFingerprints(orgIds)
+		for orgId in orgIds:
+			if orgId in stored and stored[orgId] != current[orgId]:
+				print("Proteins of organism %s changed since they were stored" % orgId)
+			if stored.get(orgId) != current[orgId]:
+				self.fill(orgId, fingerprint = current[orgId])
+
+	def fetch(self, keys):
+		"""
+		Returns {(org_id, protein_id): seq} for a list of keys. Every block is read and decompressed once,
+		keys which are not in the store are left out.
+		"""
+		self.index.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (org_id INTEGER, protein_id INTEGER)")
+		self.index.execute("BEGIN")
+		try:
+			self.index.execute("DELETE FROM wanted")
+			self.index.executemany("INSERT INTO wanted VALUES (?, ?)", ((int(o), int(p)) for o, p in keys))
+			rows = self.index.execute("""
+			SELECT p.org_id, p.protein_id, p.start, p.length, o.file, b.offset, b.size
+			FROM wanted AS w
+			JOIN proteins AS p ON p.org_id = w.org_id AND p.protein_id = w.protein_id
+			JOIN blocks AS b ON b.org_id = p.org_id AND b.block = p.block
+			JOIN organisms AS o ON o.org_id = p.org_id
+			ORDER BY p.org_id, p.block""").fetchall()
+		finally:
+			self.index.execute("COMMIT")
+
+		seqs = {}
+		handles = {}
+		lastBlock = None
+		try:
+			for orgId, proteinId, start, length, fileName, offset, size in rows:
+				if (fileName, offset) != lastBlock:
+					if fileName not in handles:
+						handles[fileName] = open(os.path.join(self.path, fileName), "rb")
+					handles[fileName].seek(offset)
+					data = zlib.decompress(handles[fileName].read(size))
+					lastBlock = (fileName, offset)
+				seqs[(orgId, proteinId)] = data[start:start + length].decode("ascii")
+		finally:
+			for handle in handles.values():
+				handle.close()
+		return(seqs)
+
+	def iterOrganism(self, orgId):
+		"""
+		Yields (protein_id, seq) for all proteins of an organism, block by block.
+		"""
+		rows = self.index.execute("""
+		SELECT p.protein_id, p.start, p.length, o.file, b.offset, b.size FROM proteins AS p
+		JOIN blocks AS b ON b.org_id = p.org_id AND b.block = p.block
+		JOIN organisms AS o ON o.org_id = p.org_id
+		WHERE p.org_id = ? ORDER BY p.block, p.start""", (int(orgId),)).fetchall()
+
+		lastBlock = None
+		if not rows:
+			return
+		with open(os.path.join(self.path, rows[0][3]), "rb") as handle:
+			for proteinId, start, length, fileName, offset, size in rows:
+				if offset != lastBlock:
+					handle.seek(offset)
+					data = zlib.decompress(handle.read(size))
+					lastBlock = offset
+				yield (proteinId, data[start:start + length].decode("ascii"))
+
+	def close(self):
+		self.index.close()
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def proteinFingerprints(orgIds):
+	"""
+	Returns {org_id: "count:checksum"} of the rows of each organism in the proteins table. Like the organism
+	fingerprints of smServerSide the checksum is a sum of row CRC32s computed on the server, here over the sequences too.
+	"""
+	fingerprints = {int(org_id): "0:None" for org_id in orgIds}
+	if fingerprints:
+		for org_id, count, checksum in bio.dbFetch("""SELECT org_id, COUNT(*), SUM(CRC32(CONCAT_WS('_', prot_seqkey, prot_seq)))
+		FROM proteins WHERE org_id IN (%s) GROUP BY org_id""" % ",".join(str(org_id) for org_id in fingerprints), cache = False):
+			fingerprints[int(org_id)] = "%s:%s" % (count, checksum)
+	return(fingerprints)
+
+
+def orgIds(orgSet):
+	"""
+	org_ids of a list of jgi names.
+	"""
+	return([org_id for org_id, in bio.dbFetch("SELECT org_id FROM organism WHERE name IN ('%s');" % "','".join(orgSet))])
+
+
+def main(argv = None):
+	"""
+	Command line lookup of stored sequences, keys are org_id:protein_id. Organisms missing from the store are downloaded.
+	"""
+	parser = argparse.ArgumentParser(description = "Look up protein sequences in the local protein store")
+	parser.add_argument("keys", nargs = "*", help = "Proteins as org_id:protein_id", metavar = "KEY")
+	parser.add_argument("--file", "-f", dest = "keyFile", help = "File with one org_id:protein_id per line", metavar = "FILE")
+	parser.add_argument("--fill", nargs = "+", type = int, default = [], help = "Download these org_ids into the store", metavar = "ORG_ID")
+	parser.add_argument("--refresh", action = "store_true", default = False, help = "Download organisms again even if they are stored")
+	args = parser.parse_args(argv)
+
+	keys = list(args.keys)
+	if args.keyFile:
+		with open(args.keyFile) as keyFile:
+			keys += [line.strip() for line in keyFile if line.strip()]
+
+	try:
+		keys = [tuple(int(part) for part in key.split(":")) for key in keys]
+	except ValueError:
+		parser.error("Keys must be org_id:protein_id")
+	if any(len(key) != 2 for key in keys):
+		parser.error("Keys must be org_id:protein_id")
+
+	with ProteinStore() as store:
+		store.ensure(set(args.fill) | set(org_id for org_id, protein_id in keys), refresh = args.refresh)
+		seqs = store.fetch(keys)
+
+	for key in keys:
+		if key in seqs:
+			sys.stdout.write(">%s_%s\n%s\n" % (key[0], key[1], seqs[key]))
+		else:
+			print("%s:%s is not in the proteins table" % key, file = sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
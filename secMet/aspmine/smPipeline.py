@@ -0,0 +1,271 @@
+"""
+Main secondary metabolism pipeline. Imports modules and processes data to write a dataframe which can later be processed with R.
+
+The pipeline is a graph of stages (see stageRunner.py). Stages whose outputs are newer than their inputs are skipped,
+independent stages (e.g. the MIBiG download and the MySQL table builds) run at the same time.
+The data check runs every time and writes the row fingerprints of the organisms (see smServerSide.mysqlSmChecker) to
+orgFingerprints.json, the stages reading from MySQL are rerun when it changes. The blast options are kept in
+mibigBlast.params the same way.
+Modules are imported by the stages that use them, so e.g. a run where only the table stages are out of date does not load pandas or Biopython.
+
+Installed as the secmet command, or run with python3 main.py from the secMet directory.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import shutil
+
+from . import misc
+from .stageRunner import Stage, StageRunner, writeIfChanged
+
+
+def parseArgs(argv = None):
+	parser=argparse.ArgumentParser(description='''
+	Script to execute the seconary metabolite analysis pipeline. In case you want to leave out some analysis you have to modify the script.\n
+
+	Example:
+
+	secmet -o flavi_orgs.txt -bibase I_Flavi_biblast -biFinal smurf_bidir_hits_flavi -t ingek_tree_JGIname.nwk -l flavi.log -od flavi_test
+	''')
+	parser.add_argument("--orgs", "-o",
+						dest="filename",
+						required=True,
+						help="Input file with jgi names (one per row) of organisms", metavar="FILE")
+	parser.add_argument("--treeFile", "-t",
+						dest="tree",
+						required=True,
+						help="Tree file in newick format",
+						metavar="FILE")
+	parser.add_argument("--biblastTable", "-bibase",
+						dest="bibase",
+						required=True,
+						help="Specify the original biblast table to use as basis for the smurf bidirectional hits table", metavar="CHAR")
+	parser.add_argument("--clusterBiblast", "-biFinal",
+						dest="biFinal",
+						required=True,
+						help="Specify name for smurf bidirectional hits table", metavar="CHAR")
+	parser.add_argument("--log", "-l",
+						dest="logFile",
+						required=True,
+						help="Specify the name for log file", metavar="CHAR")
+	parser.add_argument("--outdir", "-od",
+						dest="sn",
+						required=True,
+						help="Output directory, preferably the name of your set", metavar="CHAR")
+	parser.add_argument("--legacyBlast", "-lb",
+						dest="legacyBlast",
+						action="store_true",
+						default=False,
+						help="Specify the original biblast table to use as basis for the smurf bidirectional hits table")
+	parser.add_argument("--batch", "-b",
+						dest="batch",
+						action="store_true",
+						default=False,
+						help="Run unattended without questions")
+	parser.add_argument("--rebuildTables", "-rt",
+						dest="rebuildTables",
+						action="store_true",
+						default=False,
+						help="Drop the smurf bidir tables and build them again instead of adding the missing organism pairs")
+	parser.add_argument("--force", "-f",
+						dest="force",
+						nargs="*",
+						default=[],
+						help="Stages to run even if they are up to date, or 'all'", metavar="STAGE")
+	parser.add_argument("--workers", "-w",
+						dest="workers",
+						type=int,
+						default=4,
+						help="Number of stages to run at the same time, only with --batch or --rebuildTables", metavar="INT")
+	parser.add_argument("--blastProcesses",
+						dest="blastProcesses",
+						type=int,
+						default=os.cpu_count(),
+						help="Number of blastp processes running on query shards at the same time (default: number of cores)", metavar="INT")
+	parser.add_argument("--kmerPrefilter", "-kp",
+						dest="kmerPrefilter",
+						type=float,
+						default=None,
+						help="Only blast MIBiG backbones against smurf proteins sharing at least this fraction of their 5-mers, e.g. 0.3", metavar="FLOAT")
+	return(parser.parse_args(argv))
+
+
+def main(argv = None):
+	args = parseArgs(argv)
+	config = misc.getConfig()
+
+	from .bioSlim3 import cachePath
+
+	########
+	# LOADING ORGS
+
+	baseDir = os.getcwd()
+	filename = os.path.abspath(args.filename)
+
+	biblastBaseTable = args.bibase
+	smurfBidirHitsName = args.biFinal
+	testLogName = args.logFile
+	treeFile = os.path.abspath(args.tree)
+	setName = args.sn
+
+	setDir = os.path.join(baseDir, setName)
+	mibigDir = os.path.join(setDir, "mibig")
+	mibigTarball = cachePath("mibig", "mibig_gbk_1.3.tar.gz") # Shared by all sets, downloaded once
+
+	with open(filename, "r") as tmp:
+		orgSet = [item.strip() for item in tmp.readlines()]
+
+	if setName not in os.listdir():
+		os.mkdir(setName)
+
+	elif not args.batch:
+		input("A folder for the specified set is already available. If you want to rerun the analysis press Enter, else ctrl+c/d\n")
+
+	if not os.path.isdir(mibigDir):
+		os.mkdir(mibigDir)
+
+	shutil.copy2(treeFile, setName)
+
+	# In batch mode existing tables are extended with missing organism pairs (or rebuilt with -rt), otherwise the user is asked
+	rebuild = args.rebuildTables if args.batch or args.rebuildTables else None
+
+	smIpGfFile = os.path.join(setDir, "smIpGf.pkl")
+	smFile = "sm_data_"+setName+".tsv"
+	smFileClustered = smFile.replace(".tsv","")+"_c.tsv" # File was clustered before, so it will be renamed with a _c extension
+
+	smurfFasta = os.path.join(mibigDir, "smurf.fasta")
+	mibigFasta = os.path.join(mibigDir, "mibigDb.fasta")
+	translationFile = os.path.join(mibigDir, "translateBgc.txt")
+	blastFile = os.path.join(mibigDir, "mibigVsSmurf.txt")
+
+	checkCacheFile = os.path.join(setDir, "smCheckCache.json")
+	fingerprintFile = os.path.join(setDir, "orgFingerprints.json")
+
+	blastArgs = ["-max_target_seqs", "25", "-evalue", "1e-50", "-outfmt", "6 std qlen slen"]
+	blastParamFile = os.path.join(mibigDir, "mibigBlast.params")
+	writeIfChanged(blastParamFile, json.dumps({"program": config.get('blastpPath'), "args": blastArgs, "kmerPrefilter": args.kmerPrefilter},
+		indent = 1, sort_keys = True))
+
+
+	########
+	# STAGES
+
+	def checkData():
+		# Checking data
+		from .smServerSide import mysqlSmChecker, readCheckCache
+		mysqlSmChecker(orgSet, os.path.join(setDir, testLogName), cacheFile = checkCacheFile)
+
+		# Fingerprints of the set, the file only changes when rows of these organisms changed
+		names = set(orgSet)
+		fingerprints = {org_id: entry["fingerprint"] for org_id, entry in readCheckCache(checkCacheFile).items() if entry["name"] in names}
+		if writeIfChanged(fingerprintFile, json.dumps(fingerprints, indent = 1, sort_keys = True)):
+			print("Data of the organisms changed, stages reading from MySQL will be rerun")
+
+	def smBidirTables():
+		# Creating smurf bidir hits table for dataset.
+		from .smServerSide import tmpSmBiTable, createBidirSmurf
+		tmpSmBiTable(smtable = biblastBaseTable, orgSet = orgSet, rebuild = rebuild) # Creating a temporary table
+		createBidirSmurf(smtable = smurfBidirHitsName, orgSet = orgSet, source = biblastBaseTable, rebuild = rebuild) # Creating a sm cluster table
+
+	def smData():
+		# DOWNLOADING SM DATA
+		from .aspSMDl import dlSMdata
+		dlSMdata(orgSet).to_pickle(smIpGfFile)
+
+	def mibigDownload():
+		from .processMibig3 import dlMibig
+		dlMibig(mibigTarball)
+
+	def mibigProcess():
+		from .processMibig3 import cachedMibigFormatted
+		print("processing mibig data")
+		cachedMibigFormatted(mibigTarball, addPath = mibigDir + os.sep, processes = os.cpu_count() or 1)
+
+	def smurfProteins():
+		from .processMibig3 import exportSmurfProteins
+		exportSmurfProteins(orgSet, smurfFasta)
+
+	def smurfBlastDb():
+		print("Formatting smurf database")
+		if args.legacyBlast:
+			subprocess.run([config['formatDbPath'], "-i", smurfFasta], check = True)
+		else:
+			subprocess.run([config['makeblastdbPath'], "-in", smurfFasta, "-dbtype", "prot"], check = True)
+
+	def mibigBlast():
+		print("Running blast of %s against %s" % (mibigFasta, smurfFasta))
+		if args.kmerPrefilter:
+			from .kmerFilter import prefilterBlast
+			prefilterBlast(mibigFasta, smurfFasta, blastFile, minShared = args.kmerPrefilter, makeblastdb = config['makeblastdbPath'],
+				program = config['blastpPath'], processes = args.blastProcesses, args = blastArgs)
+		else:
+			from .blastRunner import runBlast
+			runBlast(mibigFasta, smurfFasta, blastFile, program = config['blastpPath'], processes = args.blastProcesses, args = blastArgs)
+
+	def mergeData():
+		import pandas as pd
+		from .processMibig3 import processBlastResult
+
+		print("Processing mibig blast results")
+		mibigBlast = processBlastResult(blastFile = blastFile, translationFile = translationFile)
+
+		mibigBlast['org_id'] = mibigBlast['org_id'].astype('int64')
+
+		mibigBlast['protein_id'] = mibigBlast['protein_id'].astype('int64')
+
+		print("Joining mibig annotation on sm data")
+		smIpGf = pd.read_pickle(smIpGfFile)
+		smData = pd.merge(smIpGf, mibigBlast[['org_id', 'protein_id', 'compound']], how = "left", left_on=['org_id','protein_id'], right_on = ['org_id','protein_id'])
+
+		smData.to_csv(os.path.join(setDir, smFile), sep = '\t', encoding = "UTF-8", index = False, na_rep='none')
+
+	def clusterFamilies():
+		# Using r scipt to create cluster families
+		cmd = ["Rscript", "clusterData.R", smFile, setName, smurfBidirHitsName]
+		print(" ".join(cmd))
+		print("Calculating cluster families")
+		subprocess.run(cmd, cwd = baseDir, check = True)
+
+	def uniqueClusters():
+		print("Searching for unique secondary metabolic gene clusters in tree")
+		cmd = ["Rscript", "uniquesAtNodes.R", smFileClustered, setName, treeFile]
+		print(" ".join(cmd))
+		subprocess.run(cmd, cwd = baseDir, check = True)
+
+
+	smurfDbFile = smurfFasta + ".pin"
+
+	stages = [
+		Stage("check", checkData, inputs = [filename], outputs = [fingerprintFile], always = True),
+		Stage("smBidirTables", smBidirTables, inputs = [filename], after = ["check"]),
+		Stage("smData", smData, inputs = [filename], outputs = [smIpGfFile], after = ["check"]),
+		Stage("mibigDownload", mibigDownload, outputs = [mibigTarball]),
+		Stage("mibigProcess", mibigProcess, outputs = [mibigFasta, translationFile], after = ["mibigDownload"]),
+		Stage("smurfProteins", smurfProteins, inputs = [filename], outputs = [smurfFasta], after = ["check"]),
+		Stage("smurfBlastDb", smurfBlastDb, outputs = [smurfDbFile], after = ["smurfProteins"]),
+		Stage("mibigBlast", mibigBlast, inputs = [blastParamFile], outputs = [blastFile], after = ["mibigProcess", "smurfBlastDb"]),
+		Stage("merge", mergeData, outputs = [os.path.join(setDir, smFile)], after = ["smData", "mibigBlast"]),
+		Stage("clusterFamilies", clusterFamilies, outputs = [os.path.join(setDir, smFileClustered)], after = ["merge", "smBidirTables"]),
+		Stage("uniqueClusters", uniqueClusters, inputs = [treeFile], after = ["clusterFamilies"])]
+
+	# Stages may ask whether to rebuild tables, questions are only asked with one stage running at a time
+	workers = args.workers if rebuild is not None else 1
+	if workers != args.workers:
+		print("Running one stage at a time because stages may ask questions, use --batch or -rt for parallel stages")
+
+	runner = StageRunner(stages, workers = workers, force = args.force, stampDir = os.path.join(setDir, ".stages"))
+	status = runner.run()
+
+	print("Stage summary:")
+	for name in runner.order:
+		print("%s\t%s" % (name, status[name]))
+
+	if any(s in ("failed", "blocked") for s in status.values()):
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,563 @@
+"""
+Module for pre work with the database.
+
+mysqlSmChecker will check for missing data regarding SM proteins in gff, proteins, protein_has_ipr and smurf tables.
+Organisms whose rows did not change since the last check (per-table row count and checksum) are not checked again.
+
+tmpSmBiTable creates a temporary table of joined blast and smurf for the subsequent createBidirSmurf function/
+
+createBidirSmurf finally creates the bidirectional blast table for smurf entries.
+
+Both only load the organisms of the current set. The organism pairs already loaded into a table are kept in smurf_bidir_pairs,
+so a run on a larger set only adds the new pairs. Organisms whose smurf rows changed (by their fingerprint) are loaded
+into smurfTemp again and their pairs are rebuilt.
+
+
+The check can be run on its own with checkMain (installed as secmet-check):
+secmet-check -o flavi_orgs.txt -l flavi_check.log
+
+Todo:
+* Command line usage for running tables, e.g. python3 createSmBiblastTable blblast_base smurf_bidir_hits_for_set.
+"""
+
+
+import os
+import sys
+import json
+import logging
+from . import bioSlim3 as bio
+import argparse
+
+from . import misc
+
+
+
+#################################
+# Functions to check mysql data integrity
+
+def parseOrgProt(l):
+	"""
+	Creates a dictionary of org_ids (key) and protein_ids (list of values). Handy for our table structure to quickly get all protein ids for each org.
+	"""
+	d = {}
+	for org, prot in l:
+		if str(org) not in d:
+			d[str(org)] = []
+		d[str(org)].append(str(prot))
+	return(d)
+
+
+# Columns that make up the per-organism checksum of each table mysqlSmChecker looks at
+fingerprintColumns = {
+	"smurf": "CONCAT_WS('_', sm_protein_id, sm_short, clust_backbone, clust_size)",
+	"proteins": "prot_seqkey",
+	"protein_has_ipr": "CONCAT_WS('_', protein_id, ipr_id)",
+	"gff": "gff_protein_id"}
+
+
+def orgFingerprints(org_ids, tables = None):
+	"""
+	Returns {org_id: {table: [row count, checksum]}} for the smurf, proteins, protein_has_ipr and gff tables (or the given tables).
+	The checksum is a sum of row CRC32s, so it does not depend on row order and is computed on the server.
+	"""
+	fingerprints = {org_id: {} for org_id in org_ids}
+	for table in tables or fingerprintColumns:
+		columns = fingerprintColumns[table]
+		handle = bio.dbFetch("""SELECT org_id, COUNT(*), SUM(CRC32(%s)) FROM %s WHERE org_id IN ('%s') GROUP BY org_id""" % (columns, table, "','".join(org_ids)), cache = False)
+		for org_id, count, checksum in handle:
+			fingerprints[str(org_id)][table] = [int(count), str(checksum)]
+	return(fingerprints)
+
+
+def readCheckCache(cacheFile):
+	"""
+	Reads the fingerprints and verdicts of the last mysqlSmChecker run. Returns an empty cache if there is none.
+	"""
+	if not cacheFile or not os.path.isfile(cacheFile):
+		return({})
+	try:
+		with open(cacheFile) as c:
+			return(json.load(c))
+	except ValueError:
+		print("Could not read check cache %s, checking all organisms" % cacheFile)
+		return({})
+
+
+def writeCheckCache(cache, cacheFile):
+	with open(cacheFile + ".tmp", "w") as c:
+		json.dump(cache, c, indent = 1, sort_keys = True)
+	os.replace(cacheFile + ".tmp", cacheFile)
+
+
+def checkOrg(name, org_id, smurf, smurfSMonly, smurf_bb, proteins, protein_has_ipr, gff):
+	"""
+	Checks the data of one organism. Returns a list of (level, message) tuples which are logged by mysqlSmChecker.
+	"""
+	messages = []
+
+	try:
+		smurf_bb[str(org_id)]
+		try:
+			smurf_bb[str(org_id)].values()
+			multiBbPerProt = [item for item in smurf_bb[str(org_id)].values() if len(item) >1]
+			if multiBbPerProt:
+				multiBbPerProt = list(set([item for sublist in multiBbPerProt for item in sublist]))
+				messages.append(("WARNING", "%s Identical sm_protein_ids for the following cluster backbones: %s" % (name,",".join(multiBbPerProt))))
+				print("%s Identical sm_protein_ids for the following cluster backbones: %s" % (name,",".join(multiBbPerProt)))
+
+		except Exception as e:
+			messages.append(("INFO", "Smurf data ok for %s" % name))
+
+	except Exception as e:
+		messages.append(("ERROR", "No smurf files for %s" % name))
+
+	try:
+		smurf[org_id]
+		protIdCheck = set(smurf[org_id]) - set(proteins[org_id])
+		try:
+			gffCheck = set(smurf[org_id]) - set(gff[org_id])
+			if gffCheck:
+				messages.append(("WARNING", "Missing gff entries for %s" % name))
+		except Exception as e:
+			messages.append(("ERROR", "Could not get gff files for %s" % name))
+		if protIdCheck:
+			messages.append(("WARNING", "Some SM ids have not been found in proteins"))
+			messages.append(("WARNING", str(protIdCheck)))
+		else:
+			messages.append(("INFO", "%s has correct protein_ids in smurf" % name))
+
+		iprSMCheck= set(smurfSMonly[org_id]) - set(protein_has_ipr[org_id])
+		if iprSMCheck:
+			messages.append(("ERROR", "Interpro entries are missing for major SM proteins"))
+		else:
+			iprAllCheck= set(smurf[org_id]) - set(protein_has_ipr[org_id])
+			messages.append(("INFO", "%s: %s out of %s SM proteins do not have annotations" % (name, len(iprAllCheck), len(set(smurf[org_id])))))
+
+	except Exception as e:
+		messages.append(("WARNING", "Organism: %s, org_id: %s does not contain smurf entries" %(name, org_id)))
+
+	return(messages)
+
+
+def mysqlSmChecker(orgSet, logfile, cacheFile = "smCheckCache.json"):
+	"""
+	Checking tables made easy!
+	Please provide an orgSet and a logfile name to check the gff, proteins, protein_has_ipr and smurf tables for matching protein_ids of your selected organisms.
+
+	Row counts and checksums of each table are kept per organism in cacheFile together with the last verdict,
+	so only organisms whose data changed since the last run are downloaded and checked again.
+	Set cacheFile to None to check everything.
+	Returns a dictionary of organism names and their verdict (INFO, WARNING or ERROR).
+	"""
+
+	logging.basicConfig(filename=logfile,level=logging.DEBUG)
+
+	# Getting org_ids from organism table
+	handle = bio.dbFetch("""SELECT org_id, name, real_name, section  FROM organism WHERE name IN ('%s')""" % "','".join(orgSet))
+
+	orgIds = {}
+	for org_id, name, real_name, section in handle:
+		try:
+			int(org_id)
+			orgIds[name] = str(org_id)
+		except Exception as e:
+			print("Species %s does not have a valid org_id" % name)
+			logging.error("Organism %s does not have a valid org_id" % name)
+
+	set(orgIds.keys())
+	org_ids = set(orgIds.values())
+
+	if not org_ids:
+		print("None of the organisms were found in the organism table")
+		return({})
+
+	# Comparing fingerprints with the last run
+	print("Fingerprinting smurf, proteins, protein_has_ipr and gff data")
+	fingerprints = orgFingerprints(org_ids)
+	cache = readCheckCache(cacheFile)
+
+	changed = {name: org_id for name, org_id in orgIds.items()
+		if org_id not in cache or cache[org_id]["fingerprint"] != fingerprints[org_id]}
+
+	print("%s out of %s organisms changed since the last check" % (len(changed), len(orgIds)))
+
+	if changed:
+		changed_ids = set(changed.values())
+
+		# Getting data from server
+		print("Downloading smurf data")
+		smurfRaw = bio.dbFetch("""SELECT org_id, sm_protein_id, sm_short, clust_backbone
+		FROM smurf
+		WHERE org_id IN ('%s')
+		GROUP BY org_id, clust_backbone, sm_protein_id""" % "','".join(changed_ids) )
+
+		smurf = parseOrgProt([(org, prot) for org, prot, sm, clust_backbone in smurfRaw])
+		smurfSMonly = parseOrgProt([(org, prot) for org, prot, sm, clust_backbone in smurfRaw if sm != "none"])
+
+		# Special part to check sm_proteins per backbone
+
+		smurf_bb = {}
+		for org, prot, sm, clust_backbone in smurfRaw:
+			if str(org) not in smurf_bb:
+				smurf_bb[str(org)] = {}
+			if str(prot) not in smurf_bb[str(org)]:
+				smurf_bb[str(org)][str(prot)] = []
+			smurf_bb[str(org)][str(prot)].append(str(clust_backbone))
+
+		print("Downloading proteins data")
+		proteinsRaw = bio.dbFetch("""SELECT org_id, prot_seqkey FROM proteins WHERE org_id IN ('%s') GROUP BY org_id, prot_seqkey""" % "','".join(changed_ids) )
+
+		proteins = parseOrgProt(proteinsRaw)
+
+		print("Downloading protein has ipr data")
+		protein_has_iprRaw = bio.dbFetch("""SELECT org_id, protein_id FROM protein_has_ipr WHERE org_id IN ('%s') GROUP BY org_id, protein_id""" % "','".join(changed_ids) )
+
+		protein_has_ipr = parseOrgProt(protein_has_iprRaw)
+
+		# gff
+		print("Downloading gff data")
+		gff_raw = bio.dbFetch("""SELECT org_id, gff_protein_id FROM gff WHERE org_id IN ('%s')""" % "','".join(changed_ids) )
+
+		gff = parseOrgProt(gff_raw)
+
+	# Checking data for consistency
+
+	print("Starting data check, see %s for further info" %logfile)
+
+	verdicts = {}
+	for name, org_id in orgIds.items():
+		org_id = str(org_id)
+
+		if name in changed:
+			messages = checkOrg(name, org_id, smurf, smurfSMonly, smurf_bb, proteins, protein_has_ipr, gff)
+			cache[org_id] = {"name": name, "fingerprint": fingerprints[org_id], "messages": messages,
+				"verdict": max([level for level, message in messages], key = logging.getLevelName, default = "INFO")}
+		else:
+			messages = cache[org_id]["messages"]
+			logging.info("%s unchanged since last check, repeating verdict %s" % (name, cache[org_id]["verdict"]))
+
+		for level, message in messages:
+			logging.log(logging.getLevelName(level), message)
+
+		verdicts[name] = cache[org_id]["verdict"]
+
+	if cacheFile:
+		writeCheckCache(cache, cacheFile)
+
+	return(verdicts)
+
+
+##################################
+# FUNCTIONS ON MYSQL TABLE CREATION
+
+def askRebuild(question, rebuild = None):
+	"""
+	Asks whether an existing table should be rebuilt, unless rebuild is already given as True or False (batch runs).
+	"""
+	if rebuild is None:
+		return(input(question).lower().startswith('y'))
+	return(rebuild)
+
+
+def createPairsTable(cursor):
+	cursor.execute("""CREATE TABLE IF NOT EXISTS smurf_bidir_pairs (
+		`tbl` varchar(100) NOT NULL,
+		`source` varchar(100) NOT NULL,
+		`q_org` varchar(100) NOT NULL,
+		`h_org` varchar(100) NOT NULL,
+		PRIMARY KEY (`tbl`, `source`, `q_org`, `h_org`))""")
+
+
+def tableOrgPairs(cursor, table, source):
+	"""
+	Returns the (q_org, h_org) name pairs already loaded into table from source.
+	The pairs are kept in the smurf_bidir_pairs table, so incremental runs only add missing pairs.
+	"""
+	createPairsTable(cursor)
+	cursor.execute("SELECT q_org, h_org FROM smurf_bidir_pairs WHERE tbl = %s AND source = %s", (table, source))
+	return(set(cursor.fetchall()))
+
+
+def reuseTable(cursor, table, tables, source, rebuild = None):
+	"""
+	Decides whether the org pairs of an existing table can be reused. Drops the table otherwise.
+	Returns the set of reusable (q_org, h_org) pairs, empty if the table has to be built from scratch.
+	"""
+	pairs = tableOrgPairs(cursor, table, source)
+
+	if table not in tables:
+		cursor.execute("DELETE FROM smurf_bidir_pairs WHERE tbl = %s", (table,))
+		return(set())
+
+	if not pairs:
+		# Tables from older runs or other sources cannot be extended, batch runs always rebuild them
+		print("Table %s exists but was not built from %s for any organism pair." % (table, source))
+		drop = askRebuild("Delete %s table and generate new one? (y/n)\n" % table, None if rebuild is None else True)
+	else:
+		print("Table %s already holds %s organism pairs built from %s. Only missing pairs will be added." % (table, len(pairs), source))
+		drop = askRebuild("Delete %s table and build all pairs again? (y/n)\n" % table, rebuild)
+
+	if drop:
+		print("Deleting table %s" % table)
+		cursor.execute("DROP TABLE %s;" % table)
+		cursor.execute("DELETE FROM smurf_bidir_pairs WHERE tbl = %s", (table,))
+		return(set())
+	if not pairs:
+		# A table of unknown content is kept as it is
+		return(None)
+	return(pairs)
+
+
+def missingPairs(orgNames, pairs):
+	"""
+	Groups the (q_org, h_org) pairs of orgNames that are not in pairs by q_org.
+	"""
+	missing = {}
+	for q_org in orgNames:
+		h_orgs = [h_org for h_org in orgNames if (q_org, h_org) not in pairs]
+		if h_orgs:
+			missing[q_org] = h_orgs
+	return(missing)
+
+
+def loadPairs(db, cursor, table, source, missing, query, clear, known = None):
+	"""
+	Inserts the missing pairs into table one q_org at a time and records them in smurf_bidir_pairs.
+	query and clear are formatted with the q_org and the quoted list of h_orgs. clear deletes rows of the pairs
+	left by earlier loads that were not recorded, so a pair is never loaded twice.
+	Only pairs in known are recorded if it is given, the others are loaded again on the next run.
+	"""
+	for count, (q_org, h_orgs) in enumerate(sorted(missing.items()), 1):
+		print("%s: adding %s organism pairs (%s of %s)" % (q_org, len(h_orgs), count, len(missing)))
+		cursor.execute(clear % (q_org, "','".join(h_orgs)))
+		cursor.execute(query % (q_org, "','".join(h_orgs)))
+		cursor.executemany("INSERT IGNORE INTO smurf_bidir_pairs (tbl, source, q_org, h_org) VALUES (%s, %s, %s, %s)",
+			[(table, source, q_org, h_org) for h_org in h_orgs if known is None or (q_org, h_org) in known])
+		db.commit()
+
+
+def refreshSmurfTemp(db, cursor, orgSet, tables):
+	"""
+	Loads the smurf rows of the organisms in orgSet that are not in smurfTemp, or whose smurf fingerprint
+	(see orgFingerprints) changed since they were loaded. The fingerprints are kept in smurfTemp_fingerprints.
+	The organism pairs of changed organisms are removed from smurf_bidir_pairs, so their rows are built again.
+	"""
+	cursor.execute("""CREATE TABLE IF NOT EXISTS smurfTemp_fingerprints (
+		`name` varchar(100) NOT NULL PRIMARY KEY,
+		`fingerprint` varchar(100) NOT NULL)""")
+
+	cursor.execute("SELECT org_id, name FROM organism WHERE name IN ('%s')" % "','".join(orgSet))
+	names = {str(org_id): name for org_id, name in cursor.fetchall()}
+	fingerprints = {names[org_id]: json.dumps(tableFingerprints.get("smurf"))
+		for org_id, tableFingerprints in orgFingerprints(set(names), ["smurf"]).items()}
+
+	cursor.execute("SELECT name, fingerprint FROM smurfTemp_fingerprints")
+	known = dict(cursor.fetchall())
+
+	if "smurfTemp" in tables:
+		cursor.execute("SELECT DISTINCT name FROM smurfTemp")
+		loaded = set([item[0] for item in cursor.fetchall()])
+	else:
+		print("Creating new smurfTemp table")
+		cursor.execute("""
+		CREATE TABLE smurfTemp (
+			KEY i_name (name, sm_protein_id),
+			KEY i_protein (sm_protein_id))
+		SELECT smurf.*, organism.name
+		FROM smurf JOIN organism USING(org_id) LIMIT 0;""")
+		loaded = set()
+
+	# Organisms whose rows changed since their pairs were built, loaded ones without a fingerprint are from older runs
+	changed = sorted(name for name, fingerprint in fingerprints.items()
+		if (name in known and known[name] != fingerprint) or (name in loaded and name not in known))
+	stale = sorted(name for name in loaded & set(fingerprints) if known.get(name) != fingerprints[name])
+	newOrgs = sorted(set(orgSet) - loaded)
+
+	if changed:
+		print("Smurf data of %s organisms changed, building their organism pairs again: %s" % (len(changed), ", ".join(changed)))
+		createPairsTable(cursor)
+		cursor.execute("DELETE FROM smurf_bidir_pairs WHERE q_org IN ('%s') OR h_org IN ('%s')" % ("','".join(changed), "','".join(changed)))
+
+	if stale:
+		cursor.execute("DELETE FROM smurfTemp WHERE name IN ('%s')" % "','".join(stale))
+
+	if newOrgs or stale:
+		print("Adding smurf data of %s organisms to smurfTemp" % len(newOrgs + stale))
+		cursor.execute("""
+		INSERT INTO smurfTemp
+		SELECT smurf.*, organism.name
+		FROM smurf JOIN organism USING(org_id)
+		WHERE organism.name IN ('%s');""" % "','".join(newOrgs + stale))
+		cursor.executemany("REPLACE INTO smurfTemp_fingerprints (name, fingerprint) VALUES (%s, %s)",
+			[(name, fingerprints[name]) for name in newOrgs + stale if name in fingerprints])
+	db.commit()
+
+
+def tmpSmBiTable(smtable = "null", orgSet = None, rebuild = None):
+	"""
+	This function creates a smtable of biblast hits between gene clusters.
+	A biblast smtable must exist for the secondary metabolite analysis pipeline
+	in order to run.
+
+	Only the organisms in orgSet are loaded into smurfTemp and smurf_bidir_hits_tmp1.
+	Organisms and organism pairs from earlier runs are reused unless the smurf rows of the organism changed,
+	so adding organisms only processes the new pairs.
+	rebuild = True drops both tables and builds them again, rebuild = False reuses them without asking.
+	"""
+
+	if smtable == "null":
+		raise ValueError("smtable argument needs to be provided. Try e.g. tmpSmBiTable('I_Flavi_biblast')")
+	if not orgSet:
+		raise ValueError("orgSet argument needs to be provided as a list of jgi names")
+
+	db = bio.dbConnect()
+	cursor = db.cursor()
+
+	# Checking if tables are available:
+	query = "SHOW TABLES"
+	cursor.execute(query)
+	tables = [item[0] for item in  cursor.fetchall()] # reminder to self: If I fetch from mysql like this there will always be a tuple returned
+
+
+	if smtable not in tables:
+		db.close()
+		raise ValueError("Requested smtable %s is not available in database" % smtable)
+
+	orgSet = sorted(set(orgSet))
+
+	# smurfTemp holds the smurf entries of every organism loaded so far
+	if "smurfTemp" in tables and askRebuild("Table smurfTemp already exists. Delete it and load the smurf data of all organisms again? (y/n)\n", rebuild):
+		print("Deleting old temporary table 1 (smurfTemp)")
+		cursor.execute("DROP TABLE smurfTemp;")
+		tables.remove("smurfTemp")
+
+	refreshSmurfTemp(db, cursor, orgSet, tables)
+	print("Done\n")
+
+	# smurf_bidir_hits_tmp1 holds the biblast hits of smurf proteins, one q_org/h_org pair at a time
+	pairs = reuseTable(cursor, "smurf_bidir_hits_tmp1", tables, smtable, rebuild)
+
+	if pairs is None:
+		print("Keeping smurf_bidir_hits_tmp1")
+		db.close()
+		return
+
+	if "smurf_bidir_hits_tmp1" not in tables or not pairs:
+		print("Creating new temporary smtable smurf_bidir_hits_tmp1")
+		cursor.execute("""
+		CREATE TABLE IF NOT EXISTS smurf_bidir_hits_tmp1 (
+			KEY i_q_org (q_org),
+			KEY i_h_org_protein (h_org, h_seqkey))
+		SELECT smurfQ.org_id AS q_org, smurfQ.sm_protein_id AS q_protein_id, CONCAT(smurfQ.org_id, '_' , smurfQ.clust_backbone,'_', smurfQ.clust_size) AS q_clust_id, bidir.h_org, bidir.h_seqkey, bidir.pident, bidir.q_cov, bidir.h_cov
+		FROM %s AS bidir
+		JOIN smurfTemp AS smurfQ ON bidir.q_org = smurfQ.name AND bidir.q_seqkey = smurfQ.sm_protein_id LIMIT 0;""" % smtable)
+
+	query = """
+	INSERT INTO smurf_bidir_hits_tmp1
+	SELECT smurfQ.org_id AS q_org, smurfQ.sm_protein_id AS q_protein_id, CONCAT(smurfQ.org_id, '_' , smurfQ.clust_backbone,'_', smurfQ.clust_size) AS q_clust_id, bidir.h_org, bidir.h_seqkey, bidir.pident, bidir.q_cov, bidir.h_cov
+	FROM """ + smtable + """ AS bidir
+	JOIN smurfTemp AS smurfQ ON bidir.q_org = smurfQ.name AND bidir.q_seqkey = smurfQ.sm_protein_id
+	WHERE bidir.q_org = '%s' AND bidir.h_org IN ('%s');"""
+
+	clear = """DELETE FROM smurf_bidir_hits_tmp1 WHERE q_org = (SELECT org_id FROM organism WHERE name = '%s') AND h_org IN ('%s');"""
+
+	loadPairs(db, cursor, "smurf_bidir_hits_tmp1", smtable, missingPairs(orgSet, pairs), query, clear)
+
+	print("Done")
+	db.close()
+	# biblast_ID50_SC130
+
+def bidirExec(db, cursor, smtable, orgSet, source, pairs):
+	"""
+	Adds the missing organism pairs of orgSet to the final smurf bidir hits table.
+	The table is created with all its indexes before the first rows are loaded.
+	Only pairs that smurf_bidir_hits_tmp1 holds from source are recorded as loaded. Pairs of a kept
+	smurf_bidir_hits_tmp1 of unknown content are loaded as well, but built again on the next run.
+	"""
+	if not pairs:
+		query = """CREATE TABLE IF NOT EXISTS %s (
+			KEY i_qorg (q_org),
+			KEY i_horg (h_org),
+			KEY i_qprotein (q_protein_id),
+			KEY i_q_clust_id (q_clust_id),
+			KEY i_h_clust_id (h_clust_id))
+		SELECT bidir.q_org, bidir.q_protein_id, bidir.q_clust_id, smurfH.org_id AS h_org, smurfH.sm_protein_id AS h_protein_id, CONCAT(smurfH.org_id, '_' , smurfH.clust_backbone,'_', smurfH.clust_size) AS h_clust_id, bidir.pident, bidir.q_cov, bidir.h_cov
+		FROM smurf_bidir_hits_tmp1 AS bidir JOIN smurfTemp AS smurfH ON bidir.h_org = smurfH.name AND bidir.h_seqkey = smurfH.sm_protein_id LIMIT 0;""" % smtable
+
+		print("Executing query")
+		print(query)
+		cursor.execute(query)
+
+	cursor.execute("SELECT name FROM organism WHERE name IN ('%s')" % "','".join(orgSet))
+	orgIds = set([item[0] for item in cursor.fetchall()])
+
+	missing = {}
+	for q_org, h_orgs in missingPairs(orgSet, pairs).items():
+		if q_org not in orgIds:
+			print("Organism %s is not in the organism table, skipping it" % q_org)
+			continue
+		missing[q_org] = h_orgs
+
+	query = """INSERT INTO """ + smtable + """
+	SELECT bidir.q_org, bidir.q_protein_id, bidir.q_clust_id, smurfH.org_id AS h_org, smurfH.sm_protein_id AS h_protein_id, CONCAT(smurfH.org_id, '_' , smurfH.clust_backbone,'_', smurfH.clust_size) AS h_clust_id, bidir.pident, bidir.q_cov, bidir.h_cov
+	FROM smurf_bidir_hits_tmp1 AS bidir JOIN smurfTemp AS smurfH ON bidir.h_org = smurfH.name AND bidir.h_seqkey = smurfH.sm_protein_id
+	WHERE bidir.q_org = (SELECT org_id FROM organism WHERE name = '%s') AND bidir.h_org IN ('%s');""" # smurf_bidir_hits_tmp1 stores the q_org as org_id
+
+	clear = """DELETE FROM """ + smtable + """
+	WHERE q_org = (SELECT org_id FROM organism WHERE name = '%s') AND h_org IN (SELECT org_id FROM organism WHERE name IN ('%s'));"""
+
+	loadPairs(db, cursor, smtable, source, missing, query, clear, known = tableOrgPairs(cursor, "smurf_bidir_hits_tmp1", source))
+	print("Done")
+
+
+def createBidirSmurf(smtable = "none", orgSet = None, source = "smurf_bidir_hits_tmp1", rebuild = None):
+	"""
+	Creates the final smurf bidir hits table for the organisms in orgSet from smurf_bidir_hits_tmp1.
+	source names the biblast table smurf_bidir_hits_tmp1 was built from, organism pairs built from another source are not reused.
+	rebuild = True drops the table and builds it again, rebuild = False adds missing pairs without asking.
+	"""
+	if not orgSet:
+		raise ValueError("orgSet argument needs to be provided as a list of jgi names")
+
+	print("Starting function for final smurf_bidir_hits\n")
+	db = bio.dbConnect()
+	cursor = db.cursor()
+
+	query = "SHOW TABLES"
+	cursor.execute(query)
+	tables = [item[0] for item in  cursor.fetchall()]
+
+	pairs = reuseTable(cursor, smtable, tables, source, rebuild)
+
+	if pairs is None:
+		print("Keeping %s \n" % smtable)
+	else:
+		bidirExec(db, cursor, smtable, sorted(set(orgSet)), source, pairs)
+
+	print("Done")
+	db.close()
+
+
+def checkMain(argv = None):
+	"""
+	Command line entry for mysqlSmChecker. Exits with 1 if an organism has errors.
+	"""
+	parser = argparse.ArgumentParser(description = "Check the smurf, proteins, protein_has_ipr and gff data of a set of organisms")
+	parser.add_argument("--orgs", "-o", dest = "filename", required = True, help = "Input file with jgi names (one per row) of organisms", metavar = "FILE")
+	parser.add_argument("--log", "-l", dest = "logFile", default = "smCheck.log", help = "Log file", metavar = "FILE")
+	parser.add_argument("--cache", "-c", dest = "cacheFile", default = "smCheckCache.json", help = "Cache of the last verdicts, 'none' to check everything", metavar = "FILE")
+	args = parser.parse_args(argv)
+
+	with open(args.filename) as tmp:
+		orgSet = [item.strip() for item in tmp.readlines() if item.strip()]
+
+	verdicts = mysqlSmChecker(orgSet, args.logFile, cacheFile = None if args.cacheFile.lower() == "none" else args.cacheFile)
+	for name in sorted(verdicts):
+		print("%s\t%s" % (name, verdicts[name]))
+
+	if "ERROR" in verdicts.values():
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	checkMain()
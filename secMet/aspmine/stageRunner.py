@@ -0,0 +1,168 @@
+"""
+Make-like runner for the stages of the secondary metabolism pipeline.
+
+Every stage declares the files it reads (inputs), the files it writes (outputs) and the stages it has to wait for.
+A stage is skipped if all its outputs exist and are newer than its inputs and than the outputs of the stages it waits for.
+Stages that only change the database get a stamp file as output.
+State that is not a file (database rows, command line options) is written to a file with writeIfChanged, which only
+touches the file when its content changes, and that file is made an input of the stages depending on it.
+Stages whose dependencies are done run concurrently in a thread pool, so stages must not change the working directory.
+"""
+
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def writeIfChanged(path, text):
+	"""
+	Writes text to path unless the file already holds it, so its mtime only changes with its content.
+	Returns True if the file was written.
+	"""
+	if os.path.isfile(path):
+		with open(path) as old:
+			if old.read() == text:
+				return(False)
+	with open(path + ".tmp", "w") as out:
+		out.write(text)
+	os.replace(path + ".tmp", path)
+	return(True)
+
+
+class Stage:
+	'Pipeline step with the files it reads and writes and the stages it waits for'
+
+	def __init__(self, name, func, inputs = (), outputs = (), after = (), always = False):
+		self.name = name
+		self.func = func
+		self.inputs = list(inputs)
+		self.outputs = list(outputs)
+		self.after = list(after)
+		self.always = always # Run on every run, e.g. a check writing the state of the database with writeIfChanged
+
+
+class StageRunner:
+	'Runs a graph of stages, skipping the ones that are up to date'
+
+	def __init__(self, stages, workers = 4, force = (), stampDir = ".stages"):
+		self.stages = {}
+		for stage in stages:
+			if stage.name in self.stages:
+				raise ValueError("Stage %s is declared twice" % stage.name)
+			self.stages[stage.name] = stage
+
+		self.stamps = set()
+		for stage in stages:
+			missing = [name for name in stage.after if name not in self.stages]
+			if missing:
+				raise ValueError("Stage %s waits for unknown stages: %s" % (stage.name, ", ".join(missing)))
+			if not stage.outputs:
+				stage.outputs = [os.path.join(stampDir, stage.name + ".done")]
+				self.stamps.add(stage.outputs[0])
+
+		self.workers = workers
+		self.force = set(self.stages) if "all" in force else set(force)
+		unknown = self.force - set(self.stages)
+		if unknown:
+			raise ValueError("Cannot force unknown stages: %s" % ", ".join(sorted(unknown)))
+
+		self.order = self.topoOrder()
+
+	def topoOrder(self):
+		"""
+		Orders the stages so every stage comes after the stages it waits for. Raises ValueError on cycles.
+		"""
+		order = []
+		state = {}
+
+		def visit(name, path):
+			if state.get(name) == "done":
+				return
+			if state.get(name) == "visiting":
+				raise ValueError("Stage graph has a cycle: %s" % " -> ".join(path + [name]))
+			state[name] = "visiting"
+			for dep in self.stages[name].after:
+				visit(dep, path + [name])
+			state[name] = "done"
+			order.append(name)
+
+		for name in self.stages:
+			visit(name, [])
+		return(order)
+
+	def upToDate(self, stage):
+		"""
+		A stage is up to date if all its outputs exist and are newer than its inputs and the outputs of its dependencies.
+		"""
+		if stage.always or stage.name in self.force:
+			return(False)
+		if not all(os.path.exists(path) for path in stage.outputs):
+			return(False)
+
+		inputs = stage.inputs + [path for dep in stage.after for path in self.stages[dep].outputs]
+		if not all(os.path.exists(path) for path in inputs):
+			return(False)
+
+		oldestOutput = min(os.path.getmtime(path) for path in stage.outputs)
+		return(all(os.path.getmtime(path) <= oldestOutput for path in inputs))
+
+	def runStage(self, stage):
+		start = time.time()
+		print("[%s] Starting" % stage.name)
+		stage.func()
+
+		missing = [path for path in stage.outputs if path not in self.stamps and not os.path.exists(path)]
+		if missing:
+			raise RuntimeError("Stage %s did not write %s" % (stage.name, ", ".join(missing)))
+
+		for path in stage.outputs:
+			if path in self.stamps:
+				os.makedirs(os.path.dirname(path), exist_ok = True)
+				with open(path, "w") as stamp:
+					stamp.write(time.strftime("%Y-%m-%d %H:%M:%S\n"))
+
+		print("[%s] Done in %.1fs" % (stage.name, time.time() - start))
+
+	def run(self):
+		"""
+		Runs all stages that are not up to date. Returns a dictionary of stage names and their status
+		(done, skipped, failed or blocked if a stage it waits for failed).
+		"""
+		status = {}
+		running = {}
+		pending = list(self.order)
+
+		with ThreadPoolExecutor(max_workers = self.workers) as pool:
+			while pending or running:
+				# Submitting every stage whose dependencies are finished
+				for name in list(pending):
+					stage = self.stages[name]
+					depStatus = [status.get(dep) for dep in stage.after]
+					if any(s in ("failed", "blocked") for s in depStatus):
+						status[name] = "blocked"
+						pending.remove(name)
+						print("[%s] Not run, a stage it waits for failed" % name)
+					elif all(s in ("done", "skipped") for s in depStatus):
+						pending.remove(name)
+						if self.upToDate(stage):
+							status[name] = "skipped"
+							print("[%s] Up to date, skipping" % name)
+						else:
+							running[pool.submit(self.runStage, stage)] = name
+
+				if not running:
+					continue
+
+				finished, _ = wait(list(running), return_when = FIRST_COMPLETED)
+				for future in finished:
+					name = running.pop(future)
+					try:
+						future.result()
+						status[name] = "done"
+					except Exception:
+						status[name] = "failed"
+						print("[%s] Failed" % name)
+						traceback.print_exc()
+
+		return(status)